@@ -0,0 +1,219 @@
+# analytics.py
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import db_utils
+import log_utils
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# تنظیمات لاگ‌گیری
+log_utils.setup_logging()
+
+# گزارش سود/زیان و کیفیت اجرای معاملات از view trade_signals_all (داغ + بایگانی).
+# ردیف‌ها با db_utils.stream_query دسته به دسته خوانده و با pandas/numpy به صورت برداری محاسبه
+# می‌شوند؛ هر دسته بلافاصله در خروجی نوشته و فقط جمع‌های جزئی هر دارایی/استراتژی نگه داشته
+# می‌شوند، پس حافظه مصرفی به تعداد کل ردیف‌ها بستگی ندارد.
+#
+# اجرا:
+#     python analytics.py --days 30 --output-dir reports            # Parquet اگر pyarrow نصب باشد، وگرنه CSV
+#     python analytics.py --since 2026-10-01 --until 2026-10-15 --format csv
+#
+# محاسبات با float64 انجام می‌شود (برای تحلیل کافی است؛ مقادیر حسابداری دقیق در دیتابیس هستند).
+
+COLUMNS = (
+    "id", "asset_name", "strategy_name", "status", "entry_price", "exit_price",
+    "buy_executed_quantity", "buy_fee", "buy_executed_price",
+    "sell_executed_quantity", "sell_fee", "sell_executed_price",
+    "created_at", "buy_filled_at", "sell_filled_at",
+)
+NUMERIC_COLUMNS = COLUMNS[4:12]
+TEXT_COLUMNS = ("asset_name", "strategy_name", "status")
+TIME_COLUMNS = ("created_at", "buy_filled_at", "sell_filled_at")
+
+GROUPS = ("asset_name", "strategy_name")
+COUNT_FIELDS = ("trades", "round_trips", "wins", "buy_slippage_count", "sell_slippage_count")
+
+
+def to_frame(rows):
+    """یک دسته ردیف دیتابیس را به DataFrame با انواع ثابت (float64، string، datetime) تبدیل می‌کند."""
+    frame = pd.DataFrame.from_records(rows, columns=COLUMNS)
+    for column in NUMERIC_COLUMNS:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").astype("float64")
+    for column in TEXT_COLUMNS:
+        frame[column] = frame[column].astype("string").fillna("-")
+    for column in TIME_COLUMNS:
+        frame[column] = pd.to_datetime(frame[column])
+    return frame
+
+
+def compute_trades(frame):
+    """
+    ستون‌های محاسبه شده هر معامله را (به صورت برداری) اضافه می‌کند:
+    - buy_cost: (مقدار خالص + کارمزد خرید) × قیمت اجرای خرید (کارمزد خرید به واحد دارایی کسر می‌شود)
+    - realized_pnl: فروش × قیمت اجرای فروش − کارمزد فروش − buy_cost (فقط معاملات بسته شده)
+    - fees: کارمزد خرید (به تومان) + کارمزد فروش
+    - buy/sell_slippage_bps: فاصله قیمت اجرا شده از قیمت سیگنال؛ مثبت یعنی به ضرر ما
+    ردیف‌های قدیمی بدون قیمت اجرا شده (پیش از مایگریشن 006) با قیمت سیگنال محاسبه و در لغزش شمرده نمی‌شوند.
+    """
+    buy_price = frame["buy_executed_price"].fillna(frame["entry_price"])
+    sell_price = frame["sell_executed_price"].fillna(frame["exit_price"])
+    buy_fee = frame["buy_fee"].fillna(0)
+    sell_fee = frame["sell_fee"].fillna(0)
+    closed = (frame["status"] == "SELL_ORDER_FILLED").to_numpy()
+
+    frame["buy_cost"] = (frame["buy_executed_quantity"].fillna(0) + buy_fee) * buy_price
+    proceeds = frame["sell_executed_quantity"].fillna(0) * sell_price - sell_fee
+    frame["realized_pnl"] = np.where(closed, proceeds - frame["buy_cost"], np.nan)
+    frame["return_pct"] = frame["realized_pnl"] / frame["buy_cost"].replace(0, np.nan) * 100
+    frame["fees"] = buy_fee * buy_price + np.where(closed, sell_fee, 0)
+    frame["buy_slippage_bps"] = (frame["buy_executed_price"] - frame["entry_price"]) / frame["entry_price"] * 10_000
+    frame["sell_slippage_bps"] = (frame["exit_price"] - frame["sell_executed_price"]) / frame["exit_price"] * 10_000
+    frame["holding_seconds"] = (frame["sell_filled_at"] - frame["buy_filled_at"]).dt.total_seconds()
+    return frame
+
+
+def partial_aggregates(frame, group):
+    """جمع‌های جزئی یک دسته به تفکیک 'group' (قابل جمع شدن با دسته‌های بعدی)."""
+    parts = pd.DataFrame({
+        group: frame[group],
+        "trades": 1,
+        "round_trips": frame["realized_pnl"].notna().astype("int64"),
+        "wins": (frame["realized_pnl"] > 0).astype("int64"),
+        "buy_volume": frame["buy_cost"],
+        "realized_pnl": frame["realized_pnl"].fillna(0),
+        "fees": frame["fees"],
+        "buy_slippage_bps_sum": frame["buy_slippage_bps"].fillna(0),
+        "buy_slippage_count": frame["buy_slippage_bps"].notna().astype("int64"),
+        "sell_slippage_bps_sum": frame["sell_slippage_bps"].fillna(0),
+        "sell_slippage_count": frame["sell_slippage_bps"].notna().astype("int64"),
+    })
+    return parts.groupby(group, sort=False).sum()
+
+
+def finalize_aggregates(totals):
+    """نرخ برد و میانگین‌ها را از جمع‌های نهایی محاسبه می‌کند."""
+    # جمع با fill_value ستون‌های شمارشی را float می‌کند
+    result = totals.astype({field: "int64" for field in COUNT_FIELDS})
+    result["win_rate"] = result["wins"] / result["round_trips"].replace(0, np.nan)
+    result["avg_pnl"] = result["realized_pnl"] / result["round_trips"].replace(0, np.nan)
+    result["avg_buy_slippage_bps"] = result["buy_slippage_bps_sum"] / result["buy_slippage_count"].replace(0, np.nan)
+    result["avg_sell_slippage_bps"] = result["sell_slippage_bps_sum"] / result["sell_slippage_count"].replace(0, np.nan)
+    result = result.drop(columns=["buy_slippage_bps_sum", "sell_slippage_bps_sum"])
+    return result.sort_values("realized_pnl", ascending=False)
+
+
+class TradesWriter:
+    """ردیف‌های محاسبه شده را دسته به دسته در یک فایل Parquet یا CSV می‌نویسد."""
+
+    def __init__(self, path, file_format):
+        self.path = path
+        self.file_format = file_format
+        self._parquet = None
+        self._header_written = False
+
+    def write(self, frame):
+        if self.file_format == "parquet":
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        else:
+            frame.to_csv(self.path, mode="a" if self._header_written else "w", header=not self._header_written, index=False)
+            self._header_written = True
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def run_export(since, until, output_dir, file_format, chunk_size):
+    """
+    معاملات خریداری شده بین 'since' و 'until' (بر اساس created_at) را پردازش و خروجی‌ها را ذخیره می‌کند.
+    :return: خلاصه کلی (دیکشنری)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    extension = "parquet" if file_format == "parquet" else "csv"
+    trades_path = os.path.join(output_dir, f"trades.{extension}")
+    writer = TradesWriter(trades_path, file_format)
+    totals = {group: None for group in GROUPS}
+    rows_read = 0
+
+    query = (
+        f"SELECT {', '.join(COLUMNS)} FROM trade_signals_all "
+        "WHERE buy_filled_at IS NOT NULL AND created_at >= %s AND created_at < %s"
+    )
+    try:
+        for rows in db_utils.stream_query(query, (since, until), chunk_size=chunk_size):
+            frame = compute_trades(to_frame(rows))
+            writer.write(frame)
+            for group in GROUPS:
+                partial = partial_aggregates(frame, group)
+                totals[group] = partial if totals[group] is None else totals[group].add(partial, fill_value=0)
+            rows_read += len(frame)
+            logging.info(f"{rows_read} معامله پردازش شد...")
+    finally:
+        writer.close()
+
+    summary = {"since": since.isoformat(), "until": until.isoformat(), "trades": rows_read, "trades_file": trades_path}
+    for group in GROUPS:
+        if totals[group] is None:
+            continue
+        path = os.path.join(output_dir, f"by_{group.split('_')[0]}.{extension}")
+        table = finalize_aggregates(totals[group]).reset_index()
+        if file_format == "parquet":
+            table.to_parquet(path, index=False)
+        else:
+            table.to_csv(path, index=False)
+        summary[f"by_{group.split('_')[0]}_file"] = path
+
+    overall = totals[GROUPS[0]]
+    if overall is not None:
+        overall = overall.sum()
+        summary.update({
+            "round_trips": int(overall["round_trips"]),
+            "realized_pnl": float(overall["realized_pnl"]),
+            "fees": float(overall["fees"]),
+            "win_rate": float(overall["wins"] / overall["round_trips"]) if overall["round_trips"] else None,
+        })
+    return summary
+
+
+def _parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="خروجی سود/زیان و کیفیت اجرای معاملات")
+    parser.add_argument("--since", type=_parse_date, help="از تاریخ (UTC، YYYY-MM-DD)")
+    parser.add_argument("--until", type=_parse_date, help="تا تاریخ (UTC، YYYY-MM-DD، بدون خود روز)")
+    parser.add_argument("--days", type=int, default=30, help="اگر --since داده نشود: تعداد روزهای گذشته")
+    parser.add_argument("--output-dir", default="reports", help="پوشه فایل‌های خروجی")
+    parser.add_argument("--format", choices=("auto", "parquet", "csv"), default="auto",
+                        help="قالب خروجی (auto: Parquet اگر pyarrow نصب باشد)")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="تعداد ردیف در هر دسته")
+    args = parser.parse_args()
+
+    file_format = args.format
+    if file_format == "auto":
+        file_format = "parquet" if pq is not None else "csv"
+    if file_format == "parquet" and pq is None:
+        parser.error("برای خروجی Parquet کتابخانه pyarrow لازم است (pip install pyarrow).")
+
+    until = args.until or db_utils.utcnow()
+    since = args.since or until - timedelta(days=args.days)
+    summary = run_export(since, until, args.output_dir, file_format, args.chunk_size)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    log_utils.stop_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# archiver.py
+import logging
+import time
+from datetime import timedelta
+import config
+import db_utils
+import log_utils
+import metrics
+import profiler
+
+# تنظیمات لاگ‌گیری
+log_utils.setup_logging()
+
+# انتقال معاملات تمام شده از جدول داغ trade_signals به trade_signals_history.
+# هر دسته در یک تراکنش کپی و حذف می‌شود، پس یک ردیف هرگز در هر دو جدول یا هیچ‌کدام نیست.
+# اسکن‌های وضعیت در حلقه‌های ingestor/executor/cleanup فقط روی پوزیشن‌های فعال انجام می‌شوند.
+
+ARCHIVED_TOTAL = metrics.Counter(
+    "trade_signals_archived_total", "Finished trade_signals rows moved to trade_signals_history")
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    یک دسته از معاملات تمام شده قبل از 'cutoff' را بایگانی می‌کند.
+    :return: تعداد ردیف‌های منتقل شده، یا None در صورت خطا
+    """
+    status_placeholders = ", ".join(["%s"] * len(db_utils.TERMINAL_STATUSES))
+    # ردیفی که هنوز در اجاره یک اجراکننده است (مثلاً همین الان به ERROR رفته) در دور بعد منتقل می‌شود
+    rows = db_utils.query_db(
+        f"SELECT id FROM trade_signals WHERE status IN ({status_placeholders}) "
+        "AND COALESCE(sell_filled_at, canceled_at, created_at) < %s "
+        "AND (lease_owner IS NULL OR lease_expires_at < %s) ORDER BY id LIMIT %s",
+        (*db_utils.TERMINAL_STATUSES, cutoff, db_utils.utcnow(), batch_size),
+        fetch='all'
+    )
+    if rows is None:
+        return None
+    if not rows:
+        return 0
+
+    row_ids = [row['id'] for row in rows]
+    id_placeholders = ", ".join(["%s"] * len(row_ids))
+    rowcounts = db_utils.run_in_transaction([
+        (f"INSERT INTO trade_signals_history SELECT * FROM trade_signals WHERE id IN ({id_placeholders})", row_ids),
+        (f"DELETE FROM trade_signals WHERE id IN ({id_placeholders})", row_ids),
+    ])
+    if rowcounts is None:
+        return None
+    ARCHIVED_TOTAL.inc(rowcounts[1])
+    return rowcounts[1]
+
+
+def archive_finished_trades():
+    """
+    یک چرخه بایگانی: تا وقتی دسته‌های کامل وجود دارند ادامه می‌دهد.
+    :return: تعداد کل ردیف‌های منتقل شده
+    """
+    after_minutes = config.BOT.get("ARCHIVE_AFTER_MINUTES", 60)
+    batch_size = config.BOT.get("ARCHIVE_BATCH_SIZE", 500)
+    cutoff = db_utils.utcnow() - timedelta(minutes=after_minutes)
+
+    total = 0
+    while True:
+        moved = archive_batch(cutoff, batch_size)
+        if not moved:
+            break
+        total += moved
+        if moved < batch_size:
+            break
+
+    if total:
+        logging.info(f"{total} معامله تمام شده به trade_signals_history منتقل شد.", extra=log_utils.log_fields("archiver.moved"))
+    return total
+
+
+def archive_loop():
+    """حلقه اصلی بایگانی معاملات تمام شده."""
+    logging.info("ماژول بایگانی (Archiver) شروع به کار کرد.")
+
+    loop_timer = metrics.LoopTimer("archiver", config.BOT["ARCHIVE_INTERVAL_SECONDS"])
+    while True:
+        loop_timer.tick()
+        try:
+            with profiler.profile_cycle("archiver"):
+                archive_finished_trades()
+
+        except Exception as e:
+            logging.error(f"خطای پیش‌بینی نشده در حلقه بایگانی: {e}")
+
+        time.sleep(config.BOT["ARCHIVE_INTERVAL_SECONDS"])
+
+
+if __name__ == "__main__":
+    archive_loop()
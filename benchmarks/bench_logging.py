@@ -0,0 +1,97 @@
+# benchmarks/bench_logging.py
+"""
+مقایسه هزینه لاگ‌گیری روی رشته معامله در یک چرخه شلوغ:
+- قدیمی: basicConfig با نوشتن همزمان (Synchronous) روی فایل، همه پیام‌ها در سطح INFO
+- جدید: log_utils.setup_logging با صف پس‌زمینه، محدودسازی نرخ و پیام‌های جزئی در سطح DEBUG
+
+اجرا:
+    python benchmarks/bench_logging.py --orders 500 --cycles 20
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_utils  # noqa: E402
+
+
+def _reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def legacy_cycle(orders):
+    """پیام‌های یک چرخه مجری سفارش مثل قبل: همه در سطح INFO و بدون کلید."""
+    for order_id in range(orders):
+        logging.info("قیمت خرید برای BTCTMN: 1000 (خام: 1000.123)")
+        logging.info("مقدار محاسبه شده برای BTCTMN: 0.06 (خام: 0.0600012)")
+        logging.info(f"سفارش خرید {order_id} هنوز باز است (وضعیت: NEW).")
+        logging.info(f"سفارش {order_id} تازه است (عمر: 0:01:00). نادیده گرفته شد.")
+    logging.info("--- پایان چرخه اجرا. خواب به مدت 5 ثانیه... ---")
+
+
+def structured_cycle(orders):
+    """همان پیام‌ها با سطح و کلیدهای جدید (مطابق order_executor و cleanup_manager)."""
+    for order_id in range(orders):
+        fields = log_utils.log_fields(trade_id=order_id, symbol="BTCTMN", stage="process_new_signals")
+        logging.debug("قیمت خرید برای BTCTMN: 1000 (خام: 1000.123)", extra=fields)
+        logging.debug("مقدار محاسبه شده برای BTCTMN: 0.06 (خام: 0.0600012)", extra=fields)
+        logging.info(f"سفارش خرید {order_id} هنوز باز است (وضعیت: NEW).",
+                     extra=log_utils.log_fields("executor.buy_open", trade_id=order_id, stage="check_filled_buys"))
+        logging.debug(f"سفارش {order_id} تازه است (عمر: 0:01:00). نادیده گرفته شد.",
+                      extra=log_utils.log_fields("cleanup.fresh", trade_id=order_id))
+    logging.info("--- پایان چرخه اجرا. خواب به مدت 5 ثانیه... ---", extra=log_utils.log_fields("executor.sleep"))
+
+
+def measure(cycle, orders, cycles):
+    """میانگین و بیشینه زمان هر چرخه روی رشته فراخوان (میلی‌ثانیه)."""
+    timings = []
+    for _ in range(cycles):
+        started = time.perf_counter()
+        cycle(orders)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"mean_ms": sum(timings) / len(timings), "max_ms": max(timings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="بنچمارک سربار لاگ‌گیری در چرخه‌های داغ")
+    parser.add_argument("--orders", type=int, default=500, help="تعداد سفارش در هر چرخه")
+    parser.add_argument("--cycles", type=int, default=20, help="تعداد چرخه‌های اندازه‌گیری")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.log")
+        _reset_root()
+        logging.basicConfig(level=logging.INFO, filename=legacy_path, encoding="utf-8", format=log_utils.LOG_FORMAT)
+        legacy = measure(legacy_cycle, args.orders, args.cycles)
+        _reset_root()
+
+        queued_path = os.path.join(tmp, "queued.log")
+        file_handler = logging.FileHandler(queued_path, encoding="utf-8")
+        file_handler.setFormatter(log_utils.StructuredFormatter(log_utils.LOG_FORMAT))
+        log_utils.setup_logging(level=logging.INFO, handlers=[file_handler])
+        queued = measure(structured_cycle, args.orders, args.cycles)
+        log_utils.stop_logging()
+
+        result = {
+            "benchmark": "logging_cycle_overhead",
+            "orders_per_cycle": args.orders,
+            "cycles": args.cycles,
+            "legacy": legacy,
+            "queued": queued,
+            "speedup": legacy["mean_ms"] / queued["mean_ms"] if queued["mean_ms"] else None,
+            "legacy_log_bytes": os.path.getsize(legacy_path),
+            "queued_log_bytes": os.path.getsize(queued_path),
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/bench_telegram_login.py
+"""
+آزمون بار لاگین‌های همزمان ربات تلگرام.
+
+N نشست /login همزمان (جستجوی نام کاربری + بررسی پسورد) اجرا می‌شود و همزمان یک
+ضربان (heartbeat) هر 10 میلی‌ثانیه تاخیر حلقه رویداد را اندازه می‌گیرد؛ این تاخیر همان
+تاخیری است که هر پیام دیگر تلگرام در صف حلقه رویداد تجربه می‌کند.
+
+دو حالت مقایسه می‌شوند:
+- inline: فراخوانی مستقیم توابع مسدودکننده (رفتار قبلی telegram_bot)
+- offloaded: از طریق user_store (استخرهای رشته محدود)
+
+هزینه دیتابیس و هش با time.sleep شبیه‌سازی می‌شود (bcrypt و MySQL هر دو GIL را آزاد می‌کنند).
+
+اجرا:
+    python benchmarks/bench_telegram_login.py --sessions 50 --hash-ms 250 --db-ms 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import security_utils  # noqa: E402
+except ModuleNotFoundError:
+    # security_utils در این مخزن نیست و check_password به هر حال با نسخه جعلی جایگزین می‌شود
+    security_utils = types.ModuleType("security_utils")
+    security_utils.hash_password = lambda plain_password: plain_password
+    security_utils.check_password = lambda plain_password, hashed_password: plain_password == hashed_password
+    sys.modules["security_utils"] = security_utils
+
+import db_utils  # noqa: E402
+import user_store  # noqa: E402
+
+HEARTBEAT_SECONDS = 0.01
+
+
+def _install_fakes(db_ms, hash_ms):
+    """کوئری دیتابیس و بررسی پسورد را با تاخیر ثابت جایگزین می‌کند."""
+    def fake_query_db(query, params=None, fetch=None):
+        time.sleep(db_ms / 1000)
+        return {"id": 1, "hashed_password": "x", "is_admin": True, "count": 1}
+
+    def fake_check_password(plain_password, hashed_password):
+        time.sleep(hash_ms / 1000)
+        return True
+
+    db_utils.query_db = fake_query_db
+    security_utils.check_password = fake_check_password
+
+
+async def _login_inline(username):
+    record = db_utils.query_db("SELECT id, hashed_password FROM bot_users WHERE username = %s", (username,), fetch='one')
+    return security_utils.check_password("password", record["hashed_password"])
+
+
+async def _login_offloaded(username):
+    record = await user_store.get_user_by_username(username)
+    return await user_store.check_password("password", record["hashed_password"])
+
+
+async def _heartbeat(lags, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        lags.append((time.perf_counter() - started - HEARTBEAT_SECONDS) * 1000)
+
+
+async def _run(login, sessions):
+    lags = []
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(lags, stop))
+    await asyncio.sleep(HEARTBEAT_SECONDS * 2)
+    started = time.perf_counter()
+    await asyncio.gather(*(login(f"user{i}") for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await heartbeat
+    lags.sort()
+    return {
+        "total_seconds": elapsed,
+        "loop_lag_p50_ms": statistics.median(lags),
+        "loop_lag_p99_ms": lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[-1],
+        "loop_lag_max_ms": lags[-1],
+        "heartbeats": len(lags),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="آزمون بار لاگین همزمان ربات تلگرام")
+    parser.add_argument("--sessions", type=int, default=50, help="تعداد نشست‌های همزمان /login")
+    parser.add_argument("--hash-ms", type=float, default=250, help="هزینه شبیه‌سازی شده بررسی پسورد (میلی‌ثانیه)")
+    parser.add_argument("--db-ms", type=float, default=5, help="هزینه شبیه‌سازی شده هر کوئری (میلی‌ثانیه)")
+    args = parser.parse_args()
+
+    _install_fakes(args.db_ms, args.hash_ms)
+    result = {
+        "benchmark": "telegram_concurrent_login",
+        "sessions": args.sessions,
+        "hash_ms": args.hash_ms,
+        "db_ms": args.db_ms,
+        "inline": asyncio.run(_run(_login_inline, args.sessions)),
+        "offloaded": asyncio.run(_run(_login_offloaded, args.sessions)),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
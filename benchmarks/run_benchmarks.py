@@ -0,0 +1,301 @@
+# benchmarks/run_benchmarks.py
+"""
+مجموعه بنچمارک مسیرهای داغ ربات معامله‌گر.
+
+موارد:
+- format_price / format_quantity در wallex_api
+- یک چرخه کامل main_executor_loop (run_executor_cycle) با صرافی شبیه‌سازی شده و دیتابیس محلی
+- ingest_signals روی یک پاسخ بزرگ از فرصت‌ها (اولین بار، و تکرار همان پاسخ با کش اثر انگشت فرصت‌ها)
+- cleanup_stale_orders با هزاران سفارش خرید باز
+
+موارد دیتابیسی به صورت پیش‌فرض روی یک فایل SQLite موقت (بدون نیاز به هیچ سرویس خارجی) اجرا
+می‌شوند. با --backend mysql روی دیتابیس MySQL جداگانه (پیش‌فرض: trade_internal_bench) با همان
+اسکیما و مایگریشن‌های پوشه migrations اجرا می‌شوند. جدول trade_signals آن پاک می‌شود.
+
+اجرا:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json   # خروج با کد 1 در صورت افت عملکرد
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import log_utils  # noqa: E402
+import db_utils  # noqa: E402
+import wallex_api  # noqa: E402
+import order_executor  # noqa: E402
+import signal_ingestor  # noqa: E402
+import cleanup_manager  # noqa: E402
+from simulated_exchange import SimulatedExchange  # noqa: E402
+
+QUOTE = config.TRADING["QUOTE_ASSET"]
+
+
+def _assets(count):
+    return [f"AS{i:05d}" for i in range(count)]
+
+
+def _precisions(assets):
+    symbols = [f"{asset}{QUOTE}" for asset in assets]
+    return {symbol: 2 for symbol in symbols}, {symbol: 0 for symbol in symbols}
+
+
+def _reset_table():
+    db_utils.query_db("DELETE FROM trade_signals")
+
+
+def _seed_rows(rows, chunk_size=500):
+    """ردیف‌های آزمایشی را به صورت دسته‌ای در trade_signals درج می‌کند."""
+    columns = ("asset_name", "pair", "entry_price", "exit_price", "strategy_name", "status", "buy_client_order_id", "created_at")
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(chunk))
+        params = [row.get(column) for row in chunk for column in columns]
+        db_utils.query_db(f"INSERT INTO trade_signals ({', '.join(columns)}) VALUES {placeholders}", params)
+
+
+# ==============================================================================
+# موارد بنچمارک: هر مورد (setup، run، تعداد عملیات در هر اجرا) برمی‌گرداند
+# ==============================================================================
+
+def case_format_price(args):
+    rng = random.Random(1)
+    prices = [Decimal(str(rng.uniform(1, 5_000_000))) for _ in range(10_000)]
+
+    def run():
+        for price in prices:
+            wallex_api.format_price(price, 2)
+    return None, run, len(prices)
+
+
+def case_format_quantity(args):
+    rng = random.Random(2)
+    quantities = [Decimal(str(rng.uniform(0.00001, 1000))) for _ in range(10_000)]
+
+    def run():
+        for quantity in quantities:
+            wallex_api.format_quantity(quantity, 6)
+    return None, run, len(quantities)
+
+
+def case_executor_cycle(args):
+    assets = _assets(args.orders)
+    exchange = SimulatedExchange()
+
+    def setup():
+        exchange.install(*_precisions(assets))
+        _reset_table()
+        _seed_rows([
+            {"asset_name": asset, "pair": f"{asset}/{QUOTE}", "entry_price": 1000, "exit_price": 1010,
+             "strategy_name": "bench", "status": "NEW_SIGNAL", "created_at": db_utils.utcnow()}
+            for asset in assets
+        ])
+
+    def run():
+        # با صرافی شبیه‌سازی شده هر سیگنال در یک چرخه هر ۴ مرحله را طی می‌کند
+        try:
+            order_executor.run_executor_cycle()
+        finally:
+            exchange.uninstall()
+    return setup, run, len(assets)
+
+
+def case_ingest_signals(args):
+    assets = _assets(args.opportunities)
+    # نیمی از فرصت‌ها پوزیشن باز دارند تا هر دو مسیر (تکراری/جدید) سنجیده شوند
+    payload = [
+        {"asset_name": asset, "pair": f"{asset}/{QUOTE}", "entry_price": 1000, "exit_price": 1010, "strategy_name": "bench"}
+        for asset in assets
+    ]
+
+    def setup():
+        _reset_table()
+        signal_ingestor.reset_change_detection()
+        _seed_rows([
+            {"asset_name": asset, "pair": f"{asset}/{QUOTE}", "entry_price": 1000, "exit_price": 1010,
+             "strategy_name": "bench", "status": "BUY_ORDER_PLACED", "created_at": db_utils.utcnow()}
+            for asset in assets[::2]
+        ])
+
+    def run():
+        signal_ingestor.ingest_signals(payload)
+    return setup, run, len(payload)
+
+
+def case_ingest_signals_repeated(args):
+    # همان پاسخ در چرخه بعدی: فرصت‌های ذخیره شده پیش از هر کوئری دیتابیس رد می‌شوند و
+    # فرصت‌های دارای پوزیشن باز (نیمی از آن‌ها) دوباره بررسی می‌شوند
+    setup_first, run_first, ops = case_ingest_signals(args)
+
+    def setup():
+        setup_first()
+        run_first()
+    return setup, run_first, ops
+
+
+def case_cleanup(args):
+    exchange = SimulatedExchange(fill_immediately=False)
+    count = args.open_orders
+    timeout_minutes = config.BOT.get("STALE_ORDER_TIMEOUT_MINUTES", 5)
+
+    def setup():
+        exchange.install()
+        _reset_table()
+        now = db_utils.utcnow()
+        rows = []
+        for i in range(count):
+            client_order_id = exchange.place_order(f"AS{i:05d}{QUOTE}", 1000, 1, "buy")["result"]["clientOrderId"]
+            # نیمی از سفارش‌ها قدیمی و باید لغو شوند
+            age = timedelta(minutes=timeout_minutes * 2) if i % 2 else timedelta(seconds=30)
+            rows.append({"asset_name": f"AS{i:05d}", "pair": f"AS{i:05d}/{QUOTE}", "entry_price": 1000, "exit_price": 1010,
+                         "strategy_name": "bench", "status": "BUY_ORDER_PLACED",
+                         "buy_client_order_id": client_order_id, "created_at": now - age})
+        _seed_rows(rows)
+
+    def run():
+        try:
+            cleanup_manager.cleanup_stale_orders()
+        finally:
+            exchange.uninstall()
+    return setup, run, count // 2
+
+
+CASES = {
+    "format_price": (case_format_price, False),
+    "format_quantity": (case_format_quantity, False),
+    "executor_cycle": (case_executor_cycle, True),
+    "ingest_signals": (case_ingest_signals, True),
+    "ingest_signals_repeated": (case_ingest_signals_repeated, True),
+    "cleanup_stale_orders": (case_cleanup, True),
+}
+
+
+def run_case(name, args):
+    factory, _ = CASES[name]
+    timings = []
+    ops = 0
+    for _ in range(args.repeat):
+        setup, run, ops = factory(args)
+        if setup:
+            setup()
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "runs": len(timings),
+        "ops_per_run": ops,
+        "median_ms": statistics.median(timings) * 1000,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "min_ms": timings[0] * 1000,
+        "max_ms": timings[-1] * 1000,
+        "per_op_us": statistics.median(timings) * 1e6 / ops if ops else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    نتایج را با خط پایه مقایسه می‌کند (بر اساس میانه).
+    :return: لیست مواردی که بیش از 'tolerance' کندتر شده‌اند
+    """
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        reference = baseline.get("benchmarks", {}).get(name)
+        if not reference or not reference.get("median_ms"):
+            continue
+        ratio = current["median_ms"] / reference["median_ms"]
+        current["baseline_median_ms"] = reference["median_ms"]
+        current["ratio"] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="بنچمارک مسیرهای داغ ربات معامله‌گر")
+    parser.add_argument("--only", help="اجرای موارد مشخص (با کاما جدا شوند)")
+    parser.add_argument("--skip-db", action="store_true", help="موارد نیازمند دیتابیس اجرا نشوند")
+    parser.add_argument("--backend", choices=("sqlite", "mysql"), default=os.getenv("BENCH_BACKEND", "sqlite"), help="بک‌اند دیتابیس بنچمارک")
+    parser.add_argument("--database", default=os.getenv("BENCH_DATABASE"), help="مسیر فایل SQLite یا نام دیتابیس MySQL بنچمارک")
+    parser.add_argument("--repeat", type=int, default=5, help="تعداد تکرار هر مورد")
+    parser.add_argument("--orders", type=int, default=200, help="تعداد سیگنال در چرخه مجری سفارش")
+    parser.add_argument("--opportunities", type=int, default=2000, help="تعداد فرصت در پاسخ منبع سیگنال")
+    parser.add_argument("--open-orders", type=int, default=5000, help="تعداد سفارش باز برای پاکسازی")
+    parser.add_argument("--output", help="مسیر فایل JSON نتایج (پیش‌فرض: چاپ روی خروجی)")
+    parser.add_argument("--compare", help="مسیر فایل خط پایه برای مقایسه")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="حداکثر کندی مجاز نسبت به خط پایه (0.25 = 25٪)")
+    parser.add_argument("--save-baseline", help="ذخیره نتایج به عنوان خط پایه در این مسیر")
+    args = parser.parse_args()
+
+    # لاگ‌های چرخه‌ها نباید در زمان‌سنجی دخیل باشند
+    logging.getLogger().setLevel(logging.WARNING)
+    if not args.database:
+        args.database = (os.path.join(tempfile.gettempdir(), "trade_internal_bench.sqlite3")
+                         if args.backend == "sqlite" else "trade_internal_bench")
+    db_utils.use_database(args.backend, args.database)
+    # دفترچه سفارش‌های ربات اصلی نباید با تغییرات بنچمارک مخلوط شود
+    config.JOURNAL["ENABLED"] = False
+    # هر مرحله باید کل داده‌های بنچمارک را در یک چرخه بردارد
+    config.BOT["CLAIM_BATCH_SIZE"] = max(args.orders, args.open_orders)
+
+    names = args.only.split(",") if args.only else list(CASES)
+    needs_db = any(CASES.get(name, (None, False))[1] for name in names) and not args.skip_db
+    if needs_db and not db_utils.database_available():
+        parser.error(f"دیتابیس بنچمارک '{args.database}' در دسترس نیست (یا از --skip-db استفاده کنید).")
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": db_utils.utcnow().isoformat(),
+            "repeat": args.repeat,
+            "backend": args.backend,
+        },
+        "benchmarks": {},
+    }
+    for name in names:
+        if name not in CASES:
+            parser.error(f"مورد ناشناخته: {name}")
+        if args.skip_db and CASES[name][1]:
+            continue
+        results["benchmarks"][name] = run_case(name, args)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+        if regressions:
+            exit_code = 1
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+    if exit_code:
+        print(f"افت عملکرد نسبت به خط پایه: {', '.join(results['regressions'])}", file=sys.stderr)
+    log_utils.stop_logging()
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
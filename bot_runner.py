@@ -3,16 +3,26 @@ import threading
 import logging
 import time
 import sys
+from dotenv import load_dotenv
 
 # ایمپورت کردن حلقه‌های اصلی از فایل‌های دیگر
 import signal_ingestor
 import order_executor
 import cleanup_manager
+import archiver
 import wallex_api
+import metrics
+import notifier
+import order_journal
+import profiler
 import config
+import log_utils
+
+# متغیرهای محیطی (مثل TELEGRAM_BOT_TOKEN برای notifier) از فایل .env
+load_dotenv()
 
 # تنظیمات لاگ‌گیری اصلی
-logging.basicConfig(level=config.BOT["LOG_LEVEL"], format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+log_utils.setup_logging()
 
 if __name__ == "__main__":
     logging.info("=============================================")
@@ -26,6 +36,21 @@ if __name__ == "__main__":
         sys.exit("خطای بحرانی: عدم بارگذاری قوانین بازار.")
     logging.info("قوانین بازار با موفقیت بارگذاری شد.")
 
+    # --- سرور متریک (Prometheus) ---
+    if config.METRICS.get("ENABLED"):
+        metrics.start_metrics_server()
+
+    # --- پروفایلر در لحظه (بدون توقف معاملات) ---
+    if config.PROFILING.get("ENABLED"):
+        profiler.install_signal_handler()
+        profiler.start_control_server()
+
+    # --- دفترچه تغییر وضعیت سفارش‌ها: اعمال تغییرات باقی‌مانده از اجرای قبلی پیش از شروع حلقه‌ها ---
+    order_journal.start_journal()
+
+    # --- اعلان معاملات به ادمین‌های تلگرام ---
+    notifier.start_notifier()
+
     # --- ساختن Thread ها ---
     # هر ماژول در یک رشته (Thread) جداگانه اجرا می‌شود
     
@@ -47,6 +72,12 @@ if __name__ == "__main__":
         name="CleanupManager"
     )
 
+    # ۴. رشته بایگانی معاملات تمام شده
+    archiver_thread = threading.Thread(
+        target=archiver.archive_loop, 
+        name="Archiver"
+    )
+
     # --- شروع به کار Thread ها ---
     logging.info("در حال فعال‌سازی ماژول‌ها...")
     signal_thread.start()
@@ -54,6 +85,8 @@ if __name__ == "__main__":
     executor_thread.start()
     time.sleep(1)
     cleanup_thread.start()
+    time.sleep(1)
+    archiver_thread.start()
 
     logging.info("--- تمام ماژول‌ها فعال شدند. ربات در حال اجرا است ---")
 
@@ -61,5 +94,6 @@ if __name__ == "__main__":
     signal_thread.join()
     executor_thread.join()
     cleanup_thread.join()
+    archiver_thread.join()
 
     logging.info("--- ربات متوقف شد ---")
\ No newline at end of file
@@ -0,0 +1,59 @@
+# cache_utils.py
+import threading
+import time
+from collections import OrderedDict
+
+# نشانگر "در کش نیست" (تا مقدار None هم قابل کش کردن باشد)
+MISSING = object()
+
+
+class LRUCache:
+    """
+    کش LRU با انقضای زمانی و امن برای چند رشته.
+    مقدار None هم کش می‌شود (برای کش نتایج منفی مثل "کاربر وجود ندارد").
+    'clock' تابع زمان (ثانیه) برای انقضاست؛ مثلاً ساعت شبیه‌سازی شده replay.
+    """
+
+    def __init__(self, maxsize=1024, ttl_seconds=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """مقدار کلید را برمی‌گرداند یا MISSING اگر وجود نداشته یا منقضی شده باشد."""
+        now = self.clock()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[1] is not None and entry[1] < now):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = self.clock() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -1,14 +1,67 @@
 # cleanup_manager.py
 import logging
 import time
-from datetime import datetime, timedelta
-import pytz
+from datetime import timedelta
 import config
 import db_utils
+import log_utils
+import metrics
+import notifier
+import order_journal
+import profiler
 import wallex_api
 
 # تنظیمات لاگ‌گیری
-logging.basicConfig(level=config.BOT["LOG_LEVEL"], format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+log_utils.setup_logging()
+
+MARK_CANCELED = db_utils.register_statement(
+    "cleanup.mark_canceled",
+    "UPDATE trade_signals SET status = 'CANCELED_TIMEOUT', canceled_at = %s, notes = %s WHERE id = %s"
+)
+
+def cleanup_stale_orders():
+    """
+    یک چرخه پاکسازی: سفارشات خرید بازی که قدیمی شده‌اند را در والکس لغو و در دیتابیس آپدیت می‌کند.
+    """
+    timeout_minutes = config.BOT.get("STALE_ORDER_TIMEOUT_MINUTES", 5)
+
+    logging.info(f"در حال جستجو برای سفارشات خرید باز مانده (قدیمی‌تر از {timeout_minutes} دقیقه)...", extra=log_utils.log_fields("cleanup.scan"))
+    
+    # فقط سفارشات خرید بازِ قدیمی را اجاره می‌کنیم تا با مرحله ۲ مجری سفارش تداخل نداشته باشیم
+    now = db_utils.utcnow()
+    stale_cutoff = now - timedelta(minutes=timeout_minutes)
+    claimed = 0
+    for open_buy_orders in order_journal.claimed_batches(
+        'BUY_ORDER_PLACED',
+        "id, buy_client_order_id, created_at",
+        extra_where="AND created_at < %s",
+        extra_params=(stale_cutoff,)
+    ):
+        claimed += len(open_buy_orders)
+        for order in open_buy_orders:
+            # created_at به وقت UTC ذخیره می‌شود (هم‌قالب db_utils.utcnow که replay آن را با ساعت شبیه‌سازی جایگزین می‌کند)
+            age = now - order['created_at']
+            
+            if age.total_seconds() > (timeout_minutes * 60):
+                logging.warning(f"سفارش {order['buy_client_order_id']} (ID: {order['id']}) قدیمی است (عمر: {age}). در حال لغو...")
+                
+                # ۱. لغو سفارش در والکس
+                if wallex_api.cancel_wallex_order(order['buy_client_order_id']):
+                    # ۲. در صورت موفقیت، آپدیت دیتابیس
+                    order_journal.record(
+                        order['id'],
+                        MARK_CANCELED,
+                        (now, f"Buy order canceled after {timeout_minutes} min timeout", order['id'])
+                    )
+                    notifier.notify("canceled", order['id'], f"Buy order canceled after {timeout_minutes} min timeout")
+                    logging.info(f"سفارش {order['buy_client_order_id']} با موفقیت لغو و در دیتابیس آپدیت شد.", extra=log_utils.log_fields(trade_id=order['id'], stage="cleanup"))
+                else:
+                    logging.error(f"تلاش برای لغو سفارش {order['buy_client_order_id']} در والکس ناموفق بود. در چرخه بعدی دوباره تلاش می‌شود.")
+            else:
+                logging.debug(f"سفارش {order['buy_client_order_id']} تازه است (عمر: {age}). نادیده گرفته شد.", extra=log_utils.log_fields("cleanup.fresh", trade_id=order['id']))
+
+    if not claimed:
+        logging.info("هیچ سفارش خرید بازی برای پاکسازی یافت نشد.", extra=log_utils.log_fields("cleanup.empty"))
 
 def cleanup_loop():
     """
@@ -16,50 +69,17 @@ def cleanup_loop():
     """
     logging.info("ماژول پاکسازی (Cleanup Manager) شروع به کار کرد.")
     
-    tehran_tz = pytz.timezone("Asia/Tehran")
-    timeout_minutes = config.BOT.get("STALE_ORDER_TIMEOUT_MINUTES", 5)
-    
+    loop_timer = metrics.LoopTimer("cleanup", config.BOT["CLEANUP_INTERVAL_SECONDS"])
     while True:
+        loop_timer.tick()
         try:
-            logging.info(f"در حال جستجو برای سفارشات خرید باز مانده (قدیمی‌تر از {timeout_minutes} دقیقه)...")
-            
-            # فقط سفارشات خرید باز را بررسی می‌کنیم
-            open_buy_orders = db_utils.query_db(
-                "SELECT id, buy_client_order_id, created_at FROM trade_signals WHERE status = 'BUY_ORDER_PLACED'",
-                fetch='all'
-            )
-            
-            if not open_buy_orders:
-                logging.info("هیچ سفارش خرید بازی برای پاکسازی یافت نشد.")
-            else:
-                now_in_tehran = datetime.now(tehran_tz)
-                
-                for order in open_buy_orders:
-                    # زمان در دیتابیس معمولا به صورت UTC ذخیره می‌شود
-                    # .replace(tzinfo=pytz.utc) آن را Timezone-aware می‌کند
-                    order_time_utc = order['created_at'].replace(tzinfo=pytz.utc)
-                    age = now_in_tehran - order_time_utc
-                    
-                    if age.total_seconds() > (timeout_minutes * 60):
-                        logging.warning(f"سفارش {order['buy_client_order_id']} (ID: {order['id']}) قدیمی است (عمر: {age}). در حال لغو...")
-                        
-                        # ۱. لغو سفارش در والکس
-                        if wallex_api.cancel_wallex_order(order['buy_client_order_id']):
-                            # ۲. در صورت موفقیت، آپدیت دیتابیس
-                            db_utils.query_db(
-                                "UPDATE trade_signals SET status = 'CANCELED_TIMEOUT', notes = %s WHERE id = %s",
-                                (f"Buy order canceled after {timeout_minutes} min timeout", order['id'])
-                            )
-                            logging.info(f"سفارش {order['buy_client_order_id']} با موفقیت لغو و در دیتابیس آپدیت شد.")
-                        else:
-                            logging.error(f"تلاش برای لغو سفارش {order['buy_client_order_id']} در والکس ناموفق بود. در چرخه بعدی دوباره تلاش می‌شود.")
-                    else:
-                        logging.info(f"سفارش {order['buy_client_order_id']} تازه است (عمر: {age}). نادیده گرفته شد.")
+            with profiler.profile_cycle("cleanup"):
+                cleanup_stale_orders()
 
         except Exception as e:
             logging.error(f"خطای پیش‌بینی نشده در حلقه پاکسازی: {e}")
             
-        logging.info(f"خواب به مدت {config.BOT['CLEANUP_INTERVAL_SECONDS']} ثانیه...")
+        logging.info(f"خواب به مدت {config.BOT['CLEANUP_INTERVAL_SECONDS']} ثانیه...", extra=log_utils.log_fields("cleanup.sleep"))
         time.sleep(config.BOT["CLEANUP_INTERVAL_SECONDS"])
 
 
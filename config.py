@@ -10,7 +10,14 @@ STRATEGY_API = {
     # ما فقط یک منبع داریم، اما ساختار برای آینده آماده است
     "SOURCES": {
         "Internal_Arbitrage": "http://103.75.198.172:5005/Internal/arbitrage"
-    }
+    },
+    # تشخیص تغییر: فرصت‌هایی که ذخیره یا رد شده‌اند پیش از هر کار دیتابیسی کنار گذاشته می‌شوند و
+    # پاسخ تکراری یک منبع (ETag/If-None-Match یا هش محتوا) فقط وقتی همه فرصت‌هایش چنین باشند.
+    # فرصتی که به خاطر پوزیشن باز کنار گذاشته شده به خاطر سپرده نمی‌شود و در هر چرخه دوباره بررسی می‌شود.
+    "CHANGE_DETECTION": True,
+    "UNCHANGED_PAYLOAD_TTL_SECONDS": 900,   # حداکثر مدت نادیده گرفتن پاسخ بدون تغییر یک منبع
+    "FINGERPRINT_TTL_SECONDS": 900,         # مدت به خاطر سپردن هر فرصت بررسی شده
+    "FINGERPRINT_CACHE_SIZE": 10000
 }
 
 # ==============================================================================
@@ -23,7 +30,8 @@ WALLEX_API = {
         "ALL_MARKETS": "/hector/web/v1/markets",
         "ACCOUNT_BALANCES": "/v1/account/balances",
         "ORDERS": "/v1/account/orders",          # POST (New Order), DELETE (Cancel Order)
-        "GET_ORDER": "/v1/account/orders/"  # GET (Get Order Status) - e.g., /v1/account/orders/CLIENT_ID_123
+        "GET_ORDER": "/v1/account/orders/",  # GET (Get Order Status) - e.g., /v1/account/orders/CLIENT_ID_123
+        "MARKET_STATS": "/v1/markets"       # GET (bid/ask همه بازارها در یک درخواست)
     }
 }
 
@@ -43,7 +51,20 @@ BOT = {
     "ORDER_MANAGEMENT_INTERVAL_SECONDS": 5,# بررسی وضعیت سفارشات هر 30 ثانیه
     "CLEANUP_INTERVAL_SECONDS": 5,         # بررسی سفارشات قدیمی هر 60 ثانیه
     "LOG_LEVEL": logging.INFO,
-    "STALE_ORDER_TIMEOUT_MINUTES": 5        # سفارش خرید بعد از 5 دقیقه لغو می‌شود
+    "LOG_FILE": None,                       # مسیر فایل لاگ (None = فقط کنسول)
+    "LOG_QUEUE_SIZE": 10000,                # ظرفیت صف لاگ؛ در صورت پر شدن، لاگ دور ریخته می‌شود نه معامله
+    "LOG_RATE_LIMIT_SECONDS": 60,           # پیام‌های تکراری با یک کلید حداکثر یک بار در این بازه نوشته می‌شوند
+    "STALE_ORDER_TIMEOUT_MINUTES": 5,       # سفارش خرید بعد از 5 دقیقه لغو می‌شود
+    "CLAIM_BATCH_SIZE": 50,                 # اندازه هر دسته اجاره؛ هر مرحله در یک چرخه دسته‌ها را تا خالی شدن برمی‌دارد
+    "LEASE_SECONDS": 300,                   # اجاره ردیف‌های یک اجراکننده از کار افتاده پس از این مدت آزاد می‌شود
+    # محدودیت: اجاره تنها محافظ ردیف‌هایی است که تغییرشان هنوز در order_journal اعمال نشده. اگر قطعی
+    # دیتابیس از LEASE_SECONDS طولانی‌تر شود، اجاره منقضی می‌شود؛ دفترچه پس از وصل شدن دیتابیس ابتدا
+    # اجاره‌ها را تمدید و سپس تغییرات را اعمال می‌کند، ولی در فاصله کوتاه تا اولین flush (حداکثر
+    # JOURNAL.FLUSH_INTERVAL_SECONDS) اجراکننده دیگری ممکن است همان ردیف را بردارد. LEASE_SECONDS را
+    # بیشتر از طولانی‌ترین قطعی قابل تحمل تنظیم کنید.
+    "ARCHIVE_INTERVAL_SECONDS": 60,         # فاصله اجرای بایگانی معاملات تمام شده
+    "ARCHIVE_AFTER_MINUTES": 60,            # معاملات تمام شده پس از این مدت به trade_signals_history منتقل می‌شوند
+    "ARCHIVE_BATCH_SIZE": 500               # حداکثر ردیف‌های منتقل شده در هر تراکنش
 }
 
 # ==============================================================================
@@ -56,3 +77,94 @@ DATABASE = {
     "database": "trade_internal"
 
 }
+
+# ==============================================================================
+# 6. METRICS (PROMETHEUS) CONFIGURATION
+# ==============================================================================
+METRICS = {
+    "ENABLED": True,
+    "HOST": "127.0.0.1",   # فقط روی localhost؛ برای Prometheus خارجی تغییر دهید
+    "PORT": 9108
+}
+
+# ==============================================================================
+# 7. ON-DEMAND PROFILING
+# ==============================================================================
+PROFILING = {
+    "ENABLED": True,
+    "CONTROL_HOST": "127.0.0.1",        # سوکت کنترل فقط روی localhost
+    "CONTROL_PORT": 9109,               # echo "profile executor 20" | nc 127.0.0.1 9109
+    "DEFAULT_CYCLES": 10,               # تعداد چرخه‌ها برای SIGUSR1 یا درخواست بدون عدد
+    "SAMPLE_INTERVAL_SECONDS": 0.005,   # فاصله نمونه‌برداری پشته برای flamegraph
+    "TOP_FUNCTIONS": 40,                # تعداد توابع در خلاصه متنی
+    "OUTPUT_DIR": "profiles"
+}
+
+# ==============================================================================
+# 8. TELEGRAM BOT
+# ==============================================================================
+TELEGRAM_BOT = {
+    "DB_WORKERS": 4,     # رشته‌های اجرای کوئری‌های bot_users خارج از حلقه رویداد
+    "HASH_WORKERS": 2,   # رشته‌های هش/بررسی پسورد (کند عمداً)؛ لاگین‌های بیشتر در صف می‌مانند
+    "SESSION_TTL_HOURS": 168,           # انقضای نشست لاگین (یک هفته)
+    "SESSION_CACHE_SECONDS": 30,        # کش محلی نشست‌ها؛ خروج در ورکرهای دیگر حداکثر با این تاخیر اعمال می‌شود
+    "SESSION_CACHE_SIZE": 4096,
+    "USER_CACHE_SIZE": 1024,            # کش LRU جستجوهای bot_users
+    "USER_CACHE_TTL_SECONDS": 300,
+    "USER_NEGATIVE_CACHE_SECONDS": 30,  # نتایج "کاربر وجود ندارد" کوتاه‌تر کش می‌شوند
+    "DASHBOARD_TTL_SECONDS": 15,        # حداکثر عمر خلاصه /status و /positions
+    "DASHBOARD_MAX_POSITIONS": 30       # حداکثر تعداد پوزیشن در /positions
+}
+
+# ==============================================================================
+# 9. TRADE NOTIFICATIONS
+# ==============================================================================
+NOTIFICATIONS = {
+    "ENABLED": True,                    # نیاز به TELEGRAM_BOT_TOKEN در محیط دارد
+    "QUEUE_SIZE": 1000,                 # صف محدود رویدادها؛ در صورت پر بودن رویداد دور ریخته می‌شود
+    "FLUSH_INTERVAL_SECONDS": 5,        # رویدادهای هر بازه در یک پیام خلاصه ارسال می‌شوند
+    "DIGEST_MAX_LINES": 15,             # حداکثر خطوط جزئیات در هر پیام خلاصه
+    "MIN_CHAT_INTERVAL_SECONDS": 3,     # حداقل فاصله دو پیام به یک چت (محدودیت نرخ تلگرام)
+    "CHATS_REFRESH_SECONDS": 60         # بازخوانی فهرست چت‌های ادمین از bot_sessions
+}
+
+# ==============================================================================
+# 10. SIGNAL RECORDING (برای replay.py)
+# ==============================================================================
+SIGNAL_RECORDING = {
+    "ENABLED": False,                   # ضبط پاسخ خام منابع سیگنال در فایل‌های JSONL روزانه
+    "DIR": "recordings"                 # recordings/signals-YYYYMMDD.jsonl
+}
+
+# ==============================================================================
+# 11. ORDER JOURNAL (Write-Ahead)
+# ==============================================================================
+JOURNAL = {
+    "ENABLED": True,                    # تغییر وضعیت سفارش‌ها ابتدا در فایل محلی fsync می‌شود
+    "PATH": "journal/order_journal.jsonl",
+    "FLUSH_INTERVAL_SECONDS": 1,        # فاصله اعمال دسته‌ای تغییرات به MySQL
+    "FLUSH_BATCH_SIZE": 200             # حداکثر تغییرات در هر تراکنش (پر شدن دسته، flush را زودتر شروع می‌کند)
+}
+
+# ==============================================================================
+# 12. STORAGE BACKEND
+# ==============================================================================
+STORAGE = {
+    "BACKEND": "mysql",                 # "mysql" (تنظیمات DATABASE) یا "sqlite" (فایل محلی، بدون سرور)
+    "SQLITE_PATH": "trade_internal.sqlite3",   # اسکیما در اولین اتصال از migrations/sqlite_schema.sql ساخته می‌شود
+    "SQLITE_TIMEOUT_SECONDS": 30,       # حداکثر انتظار برای قفل نوشتن
+    "MYSQL_POOL_SIZE": 8,               # حداکثر اتصال‌های بیکار نگه داشته شده در مخزن
+    "MYSQL_POOL_PING_AFTER_SECONDS": 30,    # اتصال بیکارتر از این مقدار پیش از استفاده ping می‌شود
+    "MYSQL_PREPARED_PER_CONNECTION": 64     # حداکثر کرسرهای آماده هر اتصال (قدیمی‌ترین بسته می‌شود)
+}
+
+# ==============================================================================
+# 13. MARKET DATA (بررسی سیگنال پیش از ثبت خرید)
+# ==============================================================================
+MARKET_DATA = {
+    "ENABLED": True,                    # بررسی سیگنال‌های جدید با بهترین قیمت فروش (ask) فعلی بازار
+    "REFRESH_SECONDS": 5,               # حداقل فاصله دریافت دسته‌ای قیمت همه بازارها
+    "MAX_QUOTE_AGE_SECONDS": 30,        # قیمت قدیمی‌تر معتبر نیست و سیگنال بدون بررسی اجرا می‌شود
+    "MIN_EDGE_BPS": 20,                 # حداقل سود ناخالص (خروج نسبت به قیمت خرید) به واحد bps
+    "REPRICE": True                     # اگر ask بالاتر از قیمت ورود ولی سود کافی باقی است، خرید با قیمت ask
+}
@@ -0,0 +1,117 @@
+# dashboard.py
+import asyncio
+import time
+from datetime import datetime, time as dt_time
+from decimal import Decimal
+import pytz
+import config
+import db_utils
+import user_store
+
+# خلاصه وضعیت معاملات برای دستورات /status و /positions ربات تلگرام.
+# سفارشات باز از جدول داغ trade_signals و معاملات تکمیل شده از view trade_signals_all
+# (شامل معاملات بایگانی شده) خوانده می‌شوند.
+# خلاصه با یک TTL کوتاه در حافظه نگهداری می‌شود و فقط یک بازخوانی همزمان مجاز است،
+# پس هر تعداد ادمین که /status بزنند، در هر TTL حداکثر یک بار کوئری‌های تجمیعی اجرا می‌شوند.
+
+_summary = None
+_summary_loaded_at = 0.0
+_refresh_lock = asyncio.Lock()
+
+
+def _today_start_utc():
+    """شروع امروز به وقت تهران، به صورت UTC بدون tzinfo (هم‌قالب ستون‌های دیتابیس)."""
+    tehran_tz = pytz.timezone("Asia/Tehran")
+    today = datetime.now(tehran_tz).date()
+    start = tehran_tz.localize(datetime.combine(today, dt_time.min))
+    return start.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def _realized_pnl(row):
+    """
+    سود/زیان محقق شده یک معامله رفت و برگشت به تومان:
+    (مقدار فروخته شده × قیمت فروش) − کارمزد فروش − (مقدار خریداری شده × قیمت خرید)
+    کارمزد خرید از قبل از مقدار خالص دریافتی (buy_executed_quantity) کم شده است.
+    قیمت خرید، قیمت سفارش ثبت شده (buy_limit_price، پس از قیمت‌گذاری دوباره) یا قیمت سیگنال است.
+    """
+    sold = Decimal(row['sell_executed_quantity'] or 0) * Decimal(row['exit_price'] or 0)
+    bought = Decimal(row['buy_quantity_formatted'] or 0) * Decimal(row['buy_limit_price'] or row['entry_price'] or 0)
+    return sold - Decimal(row['sell_fee'] or 0) - bought
+
+
+def _load_summary():
+    placeholders = ", ".join(["%s"] * len(db_utils.TERMINAL_STATUSES))
+    by_status = db_utils.query_db(
+        f"SELECT status, COUNT(*) AS count FROM trade_signals WHERE status NOT IN ({placeholders}) GROUP BY status",
+        db_utils.TERMINAL_STATUSES,
+        fetch='all'
+    )
+    positions = db_utils.query_db(
+        f"SELECT id, asset_name, status, entry_price, exit_price, buy_quantity_formatted, created_at FROM trade_signals "
+        f"WHERE status NOT IN ({placeholders}) ORDER BY id LIMIT %s",
+        (*db_utils.TERMINAL_STATUSES, config.TELEGRAM_BOT.get("DASHBOARD_MAX_POSITIONS", 30)),
+        fetch='all'
+    )
+    filled_today = db_utils.query_db(
+        "SELECT entry_price, buy_limit_price, exit_price, buy_quantity_formatted, sell_executed_quantity, sell_fee FROM trade_signals_all "
+        "WHERE status = 'SELL_ORDER_FILLED' AND sell_filled_at >= %s",
+        (_today_start_utc(),),
+        fetch='all'
+    )
+    if by_status is None or positions is None or filled_today is None:
+        return None
+    return {
+        'open_by_status': {row['status']: row['count'] for row in by_status},
+        'positions': positions,
+        'round_trips_today': len(filled_today),
+        'realized_pnl_today': sum((_realized_pnl(row) for row in filled_today), Decimal(0)),
+        'loaded_at': db_utils.utcnow(),
+    }
+
+
+async def get_summary():
+    """
+    خلاصه کش شده را برمی‌گرداند و در صورت انقضا (فقط یک بار، حتی با درخواست‌های همزمان) بازخوانی می‌کند.
+    :return: دیکشنری خلاصه یا None اگر دیتابیس در دسترس نباشد و خلاصه قبلی هم وجود نداشته باشد
+    """
+    global _summary, _summary_loaded_at
+    ttl = config.TELEGRAM_BOT.get("DASHBOARD_TTL_SECONDS", 15)
+    if _summary is not None and time.monotonic() - _summary_loaded_at < ttl:
+        return _summary
+    async with _refresh_lock:
+        # ممکن است درخواست دیگری در همین فاصله بازخوانی کرده باشد
+        if _summary is not None and time.monotonic() - _summary_loaded_at < ttl:
+            return _summary
+        summary = await user_store.run_db(_load_summary)
+        if summary is not None:
+            _summary, _summary_loaded_at = summary, time.monotonic()
+        # در صورت خطای دیتابیس، آخرین خلاصه موجود (هرچند قدیمی) نمایش داده می‌شود
+        return _summary
+
+
+def format_status(summary):
+    lines = ["📊 **وضعیت معاملات**", ""]
+    if summary['open_by_status']:
+        lines.append("سفارشات باز:")
+        for status, count in sorted(summary['open_by_status'].items()):
+            lines.append(f"  {status}: {count}")
+    else:
+        lines.append("هیچ سفارش بازی وجود ندارد.")
+    lines.append("")
+    lines.append(f"معاملات تکمیل شده امروز: {summary['round_trips_today']}")
+    lines.append(f"سود/زیان محقق شده امروز: {summary['realized_pnl_today']:,.0f} {config.TRADING['QUOTE_ASSET']}")
+    lines.append(f"\nبه‌روزرسانی: {summary['loaded_at']:%H:%M:%S} UTC")
+    return "\n".join(lines)
+
+
+def format_positions(summary):
+    if not summary['positions']:
+        return "هیچ پوزیشن بازی وجود ندارد."
+    lines = ["📈 **پوزیشن‌های باز**", ""]
+    for row in summary['positions']:
+        lines.append(
+            f"#{row['id']} {row['asset_name']} [{row['status']}] "
+            f"ورود: {row['entry_price']} خروج: {row['exit_price']} مقدار: {row['buy_quantity_formatted'] or '-'}"
+        )
+    lines.append(f"\nبه‌روزرسانی: {summary['loaded_at']:%H:%M:%S} UTC")
+    return "\n".join(lines)
@@ -1,50 +1,664 @@
 # db_utils.py
-import mysql.connector
+import itertools
 import logging
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from functools import lru_cache
 import config
+import log_utils
+import metrics
+
+try:
+    import mysql.connector
+except ImportError:
+    # با بک‌اند SQLite نیازی به mysql-connector نیست
+    mysql = None
 
 # تنظیمات لاگ‌گیری
-logging.basicConfig(level=config.BOT["LOG_LEVEL"], format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+log_utils.setup_logging()
+
+# خطاهای پایگاه داده هر دو بک‌اند (در except ها استفاده می‌شود)
+DB_ERRORS = (sqlite3.Error,) + ((mysql.connector.Error,) if mysql else ())
+
+# خطاهای گذرای MySQL: 1205 (Lock wait timeout) و 1213 (Deadlock)
+_MYSQL_RETRYABLE_ERRNOS = {1205, 1213}
+# کدهای اصلی خطاهای گذرای SQLite: BUSY، LOCKED، IOERR، FULL، CANTOPEN
+_SQLITE_RETRYABLE_CODES = {5, 6, 10, 13, 14}
+
+def is_retryable_error(error):
+    """
+    آیا خطای دیتابیس گذراست (قطع اتصال، بن‌بست، انتظار قفل) و تکرار همان دستور بعداً موفق می‌شود؟
+    خطاهای نحو و داده (ستون ناموجود، نقض محدودیت و ...) گذرا نیستند.
+    """
+    if isinstance(error, sqlite3.Error):
+        code = getattr(error, "sqlite_errorcode", None)
+        if code is None:
+            # پایتون قدیمی‌تر از 3.11 کد خطا را ندارد
+            return "locked" in str(error)
+        return code & 0xff in _SQLITE_RETRYABLE_CODES
+    if mysql is not None and isinstance(error, mysql.connector.Error):
+        return (isinstance(error, (mysql.connector.OperationalError, mysql.connector.InterfaceError))
+                or error.errno in _MYSQL_RETRYABLE_ERRNOS)
+    return False
+
+def is_sqlite():
+    return config.STORAGE.get("BACKEND", "mysql") == "sqlite"
+
+def current_database():
+    """نام دیتابیس MySQL یا مسیر فایل SQLite که در حال استفاده است."""
+    if is_sqlite():
+        return os.path.abspath(config.STORAGE.get("SQLITE_PATH", "trade_internal.sqlite3"))
+    return config.DATABASE.get("database")
+
+def use_database(backend, name):
+    """
+    ابزارها (replay، بنچمارک) را به یک دیتابیس جداگانه هدایت می‌کند.
+    :param backend: "mysql" یا "sqlite"
+    :param name: نام دیتابیس MySQL یا مسیر فایل SQLite
+    """
+    config.STORAGE["BACKEND"] = backend
+    if backend == "sqlite":
+        config.STORAGE["SQLITE_PATH"] = name
+    else:
+        config.DATABASE["database"] = name
+    # اتصال‌های مخزن به دیتابیس قبلی وصل هستند
+    _clear_pool()
 
 def create_db_connection():
-    """یک اتصال جدید به پایگاه داده ایجاد می‌کند."""
+    """
+    یک اتصال به پایگاه داده (بر اساس config.STORAGE["BACKEND"]) برمی‌گرداند.
+    close() اتصال را به مخزن برمی‌گرداند (MySQL) یا فقط تراکنش نیمه‌کاره را برمی‌گرداند (SQLite).
+    """
+    if is_sqlite():
+        return _sqlite_connection()
+    if mysql is None:
+        logging.error("mysql-connector-python نصب نیست (یا از بک‌اند sqlite استفاده کنید).")
+        return None
+    return _mysql_connection()
+
+def database_available():
+    """با یک ping واقعی بررسی می‌کند که دیتابیس در دسترس است (اتصال‌های مخزن بدون ping برگردانده می‌شوند)."""
+    connection = create_db_connection()
+    if connection is None:
+        return False
+    available = connection.is_connected()
+    connection.close(failed=not available)
+    return available
+
+
+# ==============================================================================
+# مخزن اتصال MySQL و دستورات آماده (Prepared Statements)
+# ==============================================================================
+# باز کردن اتصال جدید برای هر کوئری (TCP + احراز هویت) از خود کوئری گران‌تر است؛ اتصال‌ها پس از
+# close() در یک مخزن LIFO نگه داشته می‌شوند. هر اتصال برای کوئری‌های ثبت شده در register_statement
+# یک کرسر آماده (prepared) نگه می‌دارد، پس متن آن‌ها فقط یک بار در هر اتصال parse می‌شود.
+# اتصال‌های مخزن در حالت autocommit هستند تا یک SELECT بدون commit، snapshot قدیمی را
+# (REPEATABLE READ) برای استفاده بعدی اتصال نگه ندارد؛ run_in_transaction تراکنش را صریحاً شروع می‌کند.
+
+_pool = []
+_pool_lock = threading.Lock()
+
+class _PooledConnection:
+    def __init__(self, connection):
+        self._connection = connection
+        self._prepared = OrderedDict()
+        self.released_at = time.monotonic()
+
+    def cursor(self, dictionary=False, buffered=None):
+        return self._connection.cursor(dictionary=dictionary, buffered=buffered)
+
+    def prepared_cursor(self, query):
+        """کرسر آماده این اتصال برای 'query' (در اولین استفاده ساخته و prepare می‌شود)."""
+        cursor = self._prepared.pop(query, None)
+        if cursor is None:
+            cursor = self._connection.cursor(prepared=True)
+            if len(self._prepared) >= config.STORAGE.get("MYSQL_PREPARED_PER_CONNECTION", 64):
+                _, oldest = self._prepared.popitem(last=False)
+                oldest.close()
+        self._prepared[query] = cursor
+        return cursor
+
+    def start_transaction(self):
+        self._connection.start_transaction()
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def is_connected(self):
+        # در mysql.connector این یک ping واقعی است
+        return self._connection.is_connected()
+
+    def close(self, failed=False):
+        """
+        اتصال را به مخزن برمی‌گرداند.
+        :param failed: پس از خطای دیتابیس اتصال دور ریخته می‌شود (ممکن است قطع شده یا نتیجه خوانده نشده داشته باشد)
+        """
+        if not failed and self._connection.in_transaction:
+            try:
+                self._connection.rollback()
+            except DB_ERRORS:
+                failed = True
+        if not failed:
+            self.released_at = time.monotonic()
+            with _pool_lock:
+                if len(_pool) < config.STORAGE.get("MYSQL_POOL_SIZE", 8):
+                    _pool.append(self)
+                    return
+        self.discard()
+
+    def discard(self):
+        try:
+            self._connection.close()
+        except DB_ERRORS:
+            pass
+
+def _mysql_connection():
+    ping_after = config.STORAGE.get("MYSQL_POOL_PING_AFTER_SECONDS", 30)
+    while True:
+        with _pool_lock:
+            pooled = _pool.pop() if _pool else None
+        if pooled is None:
+            break
+        # اتصالی که مدتی بیکار مانده ممکن است توسط سرور (wait_timeout) بسته شده باشد
+        if time.monotonic() - pooled.released_at < ping_after or pooled.is_connected():
+            return pooled
+        pooled.discard()
     try:
-        connection = mysql.connector.connect(**config.DATABASE)
-        return connection
+        return _PooledConnection(mysql.connector.connect(**{**config.DATABASE, "autocommit": True}))
     except mysql.connector.Error as e:
         logging.error(f"خطا در اتصال به پایگاه داده MySQL: {e}")
         return None
 
-def query_db(query, params=None, fetch=None):
+def _clear_pool():
+    with _pool_lock:
+        pooled, _pool[:] = list(_pool), []
+    for connection in pooled:
+        connection.discard()
+
+# {نام: متن کوئری} و برعکس
+_statements = {}
+_statement_names = {}
+
+def register_statement(name, query):
+    """
+    یک کوئری پرتکرار با متن ثابت را با یک نام ثبت می‌کند. هر جا این متن اجرا شود (query_db،
+    execute_named، run_in_transaction و تغییرات order_journal)، روی هر اتصال فقط یک بار prepare
+    می‌شود و متریک‌های زمان و تعداد ردیف آن با همین نام ثبت می‌شوند.
+    :return: متن کوئری (فاصله‌های اضافه حذف شده) برای استفاده مستقیم
+    """
+    query = " ".join(query.split())
+    if _statements.get(name, query) != query or _statement_names.get(query, name) != name:
+        raise ValueError(f"دستور '{name}' قبلاً با متن دیگری ثبت شده است.")
+    _statements[name] = query
+    _statement_names[query] = name
+    return query
+
+def execute_named(name, params=None, fetch=None):
+    """یک دستور ثبت شده را با نامش اجرا می‌کند (همان خروجی query_db)."""
+    return query_db(_statements[name], params, fetch)
+
+def _prepared_rows(cursor):
+    """ردیف‌های کرسر آماده (tuple) را به دیکشنری تبدیل می‌کند؛ همه ردیف‌ها خوانده می‌شوند."""
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+# ==============================================================================
+# بک‌اند SQLite (تک‌نود، توسعه، تست و بنچمارک)
+# ==============================================================================
+# هر رشته یک اتصال ماندگار به فایل دیتابیس دارد (حالت WAL: خواننده‌ها نویسنده را مسدود نمی‌کنند).
+# کلاس‌های زیر همان بخشی از رابط mysql.connector را که query_db و بقیه استفاده می‌کنند
+# پیاده می‌کنند: پارامترهای %s به ? تبدیل و ردیف‌ها در صورت نیاز به دیکشنری تبدیل می‌شوند.
+
+_SQLITE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations", "sqlite_schema.sql")
+_sqlite_local = threading.local()
+_sqlite_schema_ready = set()
+_sqlite_schema_lock = threading.Lock()
+# ستون‌هایی که پس از ساخت اولیه به sqlite_schema.sql اضافه شده‌اند؛ CREATE TABLE IF NOT EXISTS آن‌ها را
+# به فایل‌های دیتابیس موجود اضافه نمی‌کند (معادل مایگریشن‌های MySQL برای SQLite)
+_SQLITE_ADDED_COLUMNS = (
+    ("trade_signals", "buy_limit_price", "DECIMAL_TEXT"),
+    ("trade_signals_history", "buy_limit_price", "DECIMAL_TEXT"),
+)
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" ", timespec="microseconds"))
+sqlite3.register_converter("DECIMAL_TEXT", lambda value: Decimal(value.decode()))
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("BOOLEAN", lambda value: bool(int(value)))
+
+@lru_cache(maxsize=1024)
+def _sqlite_query(query):
+    """تبدیل paramstyle از format (%s) به qmark (?)."""
+    return query.replace("%s", "?")
+
+class _SQLiteCursor:
+    def __init__(self, cursor, dictionary):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query, params=()):
+        self._cursor.execute(_sqlite_query(query), tuple(params))
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((column[0] for column in self._cursor.description), row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def close(self):
+        self._cursor.close()
+
+class _SQLiteConnection:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, dictionary=False, buffered=None):
+        return _SQLiteCursor(self._connection.cursor(), dictionary)
+
+    def prepared_cursor(self, query):
+        # sqlite3 دستورات کامپایل شده هر اتصال را خودش کش می‌کند (cached_statements)
+        return self.cursor()
+
+    def start_transaction(self):
+        # IMMEDIATE: قفل نوشتن از ابتدا گرفته می‌شود تا دو تراکنش همزمان به بن‌بست نرسند
+        self._connection.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def is_connected(self):
+        return True
+
+    def close(self, failed=False):
+        # اتصال رشته ماندگار است؛ فقط تراکنش نیمه‌کاره (کوئری ناموفق) برگشت داده می‌شود
+        if self._connection.in_transaction:
+            self._connection.rollback()
+
+def _add_sqlite_columns(connection):
+    for table, column, column_type in _SQLITE_ADDED_COLUMNS:
+        if column not in {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}:
+            connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+def _sqlite_connection():
+    path = config.STORAGE.get("SQLITE_PATH", "trade_internal.sqlite3")
+    cached = getattr(_sqlite_local, "connection", None)
+    if cached is not None and cached[0] == path:
+        return cached[1]
+    try:
+        connection = sqlite3.connect(
+            path, timeout=config.STORAGE.get("SQLITE_TIMEOUT_SECONDS", 30), detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=256)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with _sqlite_schema_lock:
+            if path not in _sqlite_schema_ready:
+                with open(_SQLITE_SCHEMA, encoding="utf-8") as f:
+                    connection.executescript(f.read())
+                _add_sqlite_columns(connection)
+                _sqlite_schema_ready.add(path)
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"خطا در اتصال به پایگاه داده SQLite ({path}): {e}")
+        return None
+    _sqlite_local.connection = (path, _SQLiteConnection(connection))
+    return _sqlite_local.connection[1]
+
+_IN_LIST_RE = re.compile(r"\(\s*%s(\s*,\s*%s)*\s*\)")
+
+def statement_label(query):
+    """
+    یک برچسب پایدار برای کوئری (برای متریک‌ها) می‌سازد: نام دستورات ثبت شده، یا متن کوئری
+    با حذف فاصله‌های اضافه و یکسان کردن لیست‌های IN با طول متغیر.
+    """
+    name = _statement_names.get(query)
+    if name is not None:
+        return name
+    return _IN_LIST_RE.sub("(...)", " ".join(query.split()))[:200]
+
+def query_db(query, params=None, fetch=None, prepare=False):
     """
     یک تابع عمومی برای اجرای کوئری روی پایگاه داده.
     :param query: رشته کوئری SQL
     :param params: پارامترهای جایگزین در کوئری (برای جلوگیری از SQL Injection)
     :param fetch: 'one' (برای یک ردیف)، 'all' (برای همه ردیف‌ها)، None (برای INSERT/UPDATE/DELETE)
+    :param prepare: اجرا با کرسر آماده حتی اگر کوئری ثبت نشده باشد (برای کوئری‌های پرتکرار با چند شکل محدود)
     :return: نتیجه کوئری یا True/False
     """
+    started = time.perf_counter()
+    label = statement_label(query)
+    prepare = prepare or query in _statement_names
     connection = create_db_connection()
     if not connection:
         return None
-    
+
+    cursor = None
+    failed = False
     try:
-        # dictionary=True باعث می‌شود نتایج به صورت دیکشنری (dict) برگردند
-        cursor = connection.cursor(dictionary=(fetch is not None))
+        if prepare:
+            # کرسر آماده متعلق به اتصال است و بسته نمی‌شود
+            cursor = connection.prepared_cursor(query)
+        else:
+            # dictionary=True باعث می‌شود نتایج به صورت دیکشنری (dict) برگردند
+            cursor = connection.cursor(dictionary=(fetch is not None), buffered=True)
         cursor.execute(query, params or ())
-        
-        if fetch == 'one':
+
+        if fetch is None:
+            connection.commit() # اجرای دستورات INSERT, UPDATE, DELETE
+            metrics.DB_STATEMENT_ROWS.inc(max(cursor.rowcount, 0), statement=label)
+            return True
+        if prepare:
+            rows = _prepared_rows(cursor)
+            result = (rows[0] if rows else None) if fetch == 'one' else rows
+        elif fetch == 'one':
             result = cursor.fetchone()
-        elif fetch == 'all':
-            result = cursor.fetchall()
         else:
-            connection.commit() # اجرای دستورات INSERT, UPDATE, DELETE
-            result = True
-            
+            result = cursor.fetchall()
+        metrics.DB_STATEMENT_ROWS.inc(len(result) if fetch == 'all' else int(result is not None), statement=label)
         return result
-    except mysql.connector.Error as e:
+    except DB_ERRORS as e:
+        failed = True
         logging.error(f"خطای کوئری پایگاه داده: {e} | کوئری: {query} | پارامترها: {params}")
         return None
     finally:
-        if connection and connection.is_connected():
+        if cursor is not None and not prepare:
+            cursor.close()
+        connection.close(failed=failed)
+        metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement=label)
+
+def execute_statement(query, params=None):
+    """
+    یک دستور تغییر (INSERT/UPDATE/DELETE) را اجرا و commit می‌کند. برخلاف query_db خطای دیتابیس
+    را بالا می‌برد تا فراخواننده بتواند خطای گذرا را از خطای دائمی (is_retryable_error) جدا کند.
+    :return: تعداد ردیف‌های تغییر یافته، یا None اگر اتصال برقرار نشد
+    """
+    started = time.perf_counter()
+    label = statement_label(query)
+    prepare = query in _statement_names
+    connection = create_db_connection()
+    if not connection:
+        return None
+
+    cursor = None
+    failed = False
+    try:
+        cursor = connection.prepared_cursor(query) if prepare else connection.cursor()
+        cursor.execute(query, params or ())
+        connection.commit()
+        metrics.DB_STATEMENT_ROWS.inc(max(cursor.rowcount, 0), statement=label)
+        return cursor.rowcount
+    except DB_ERRORS:
+        failed = True
+        raise
+    finally:
+        if cursor is not None and not prepare:
+            cursor.close()
+        connection.close(failed=failed)
+        metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement=label)
+
+def run_in_transaction(statements):
+    """
+    چند دستور را در یک تراکنش اجرا می‌کند: یا همه اعمال می‌شوند یا هیچ‌کدام.
+    دستورات ثبت شده با register_statement با کرسر آماده اجرا می‌شوند.
+    :param statements: لیست (query, params)
+    :return: لیست تعداد ردیف‌های تغییر یافته هر دستور، یا None در صورت خطا (تراکنش برگشت داده می‌شود)
+    """
+    started = time.perf_counter()
+    connection = create_db_connection()
+    if not connection:
+        return None
+
+    cursor = None
+    failed = False
+    try:
+        connection.start_transaction()
+        rowcounts = []
+        for query, params in statements:
+            if query in _statement_names:
+                statement_cursor = connection.prepared_cursor(query)
+            else:
+                cursor = cursor or connection.cursor()
+                statement_cursor = cursor
+            statement_cursor.execute(query, params or ())
+            rowcounts.append(statement_cursor.rowcount)
+        connection.commit()
+        for (query, _), rowcount in zip(statements, rowcounts):
+            metrics.DB_STATEMENT_ROWS.inc(max(rowcount, 0), statement=statement_label(query))
+        return rowcounts
+    except DB_ERRORS as e:
+        failed = True
+        logging.error(f"خطای تراکنش پایگاه داده (برگشت داده شد): {e}")
+        try:
+            connection.rollback()
+        except DB_ERRORS:
+            pass
+        return None
+    finally:
+        if cursor is not None:
             cursor.close()
-            connection.close()
\ No newline at end of file
+        connection.close(failed=failed)
+        metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement="transaction")
+
+def stream_query(query, params=None, chunk_size=10000):
+    """
+    نتیجه یک کوئری بزرگ را به صورت دسته‌ای (لیست‌هایی از دیکشنری) برمی‌گرداند.
+    از کرسر بدون بافر (سمت سرور) و fetchmany استفاده می‌شود، پس حافظه مصرفی فقط به اندازه
+    یک دسته است نه کل نتیجه. اتصال تا پایان پیمایش (یا بسته شدن generator) باز می‌ماند.
+    """
+    started = time.perf_counter()
+    connection = create_db_connection()
+    if not connection:
+        return
+
+    cursor = None
+    # اتصالی که نتیجه‌اش تا آخر خوانده نشده به مخزن برنمی‌گردد
+    exhausted = False
+    try:
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        cursor.execute(query, params or ())
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                exhausted = True
+                break
+            metrics.DB_STATEMENT_ROWS.inc(len(rows), statement=statement_label(query))
+            yield rows
+    except DB_ERRORS as e:
+        logging.error(f"خطای کوئری پایگاه داده (stream): {e} | کوئری: {query} | پارامترها: {params}")
+        raise
+    finally:
+        if cursor is not None:
+            try:
+                cursor.close()
+            except DB_ERRORS:
+                # بستن کرسر بدون بافر پیش از خواندن همه ردیف‌ها
+                pass
+        connection.close(failed=not exhausted)
+        metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement=statement_label(query))
+
+# وضعیت‌های پایانی یک معامله؛ این ردیف‌ها دیگر توسط هیچ حلقه‌ای پردازش نمی‌شوند
+# و پس از مدتی توسط archiver به trade_signals_history منتقل می‌شوند.
+# SKIPPED_NO_EDGE: سیگنالی که پیش از ثبت خرید، بازار از آن عبور کرده بود (market_data)
+TERMINAL_STATUSES = ('SELL_ORDER_FILLED', 'CANCELED_TIMEOUT', 'ERROR', 'SKIPPED_NO_EDGE')
+
+
+# ==============================================================================
+# قفل اجاره‌ای (Lease) روی ردیف‌های trade_signals
+# ==============================================================================
+# هر اجراکننده قبل از کار روی یک ردیف، آن را با نام خود و یک زمان انقضا علامت می‌زند.
+# اگر اجراکننده‌ای از کار بیفتد، پس از انقضای اجاره ردیف‌هایش دوباره قابل برداشت می‌شوند.
+
+def utcnow():
+    """زمان فعلی به وقت UTC (بدون tzinfo، هم‌قالب ستون‌های DATETIME دیتابیس)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def get_worker_id():
+    """شناسه یکتای این اجراکننده: میزبان:پردازه:رشته."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+_claim_numbers = itertools.count(1)
+
+def _claim_token():
+    """
+    مالک اجاره یک برداشت: شناسه اجراکننده + شماره برداشت.
+    ردیف‌های برداشت قبلی همین اجراکننده که هنوز آزاد نشده‌اند (مثلاً آزادسازی در انتظار
+    order_journal) مالک دیگری دارند و در برداشت بعدی دوباره برگردانده نمی‌شوند.
+    """
+    return f"{get_worker_id()}#{next(_claim_numbers)}"
+
+def claim_rows(status, columns="*", extra_where="", extra_params=(), batch_size=None, lease_seconds=None, exclude_ids=()):
+    """
+    یک دسته از ردیف‌های آزاد با وضعیت مشخص را به صورت اتمیک به نام این اجراکننده اجاره می‌کند.
+    ردیف‌هایی که اجاره‌شان منقضی شده (اجراکننده از کار افتاده) هم دوباره برداشته می‌شوند.
+    :param status: وضعیت ردیف‌هایی که باید برداشته شوند
+    :param columns: ستون‌هایی که برگردانده می‌شوند
+    :param extra_where: شرط اضافه (مثلاً "AND created_at < %s")
+    :param extra_params: پارامترهای شرط اضافه
+    :param exclude_ids: ردیف‌هایی که نباید برداشته شوند (مثلاً تغییرات در انتظار order_journal)
+    :return: لیست ردیف‌هایی که همین برداشت اجاره کرده (ممکن است خالی باشد)؛ ستون lease_owner همیشه برگردانده می‌شود
+    """
+    lease_owner = _claim_token()
+    batch_size = batch_size or config.BOT.get("CLAIM_BATCH_SIZE", 50)
+    lease_seconds = lease_seconds or config.BOT.get("LEASE_SECONDS", 300)
+    now = utcnow()
+    expires_at = now + timedelta(seconds=lease_seconds)
+    if exclude_ids:
+        exclude_ids = _padded(exclude_ids)
+        extra_where += f" AND id NOT IN ({', '.join(['%s'] * len(exclude_ids))})"
+        extra_params = (*extra_params, *exclude_ids)
+
+    # یک UPDATE واحد اتمیک است؛ دو اجراکننده هرگز یک ردیف را همزمان برنمی‌دارند
+    if is_sqlite():
+        # SQLite از UPDATE ... LIMIT پشتیبانی نمی‌کند؛ نوشتن‌ها سریالی هستند پس زیرکوئری هم اتمیک است
+        claim_query = (
+            "UPDATE trade_signals SET lease_owner = %s, lease_expires_at = %s WHERE id IN ("
+            "SELECT id FROM trade_signals WHERE status = %s AND (lease_owner IS NULL OR lease_expires_at < %s) " + extra_where +
+            " ORDER BY id LIMIT %s)"
+        )
+    else:
+        claim_query = (
+            "UPDATE trade_signals SET lease_owner = %s, lease_expires_at = %s "
+            "WHERE status = %s AND (lease_owner IS NULL OR lease_expires_at < %s) " + extra_where +
+            " ORDER BY id LIMIT %s"
+        )
+    claimed = query_db(claim_query, (lease_owner, expires_at, status, now, *extra_params, batch_size), prepare=True)
+    if not claimed:
+        return []
+
+    if columns != "*":
+        columns += ", lease_owner"
+    rows = query_db(
+        f"SELECT {columns} FROM trade_signals WHERE lease_owner = %s AND status = %s",
+        (lease_owner, status),
+        fetch='all',
+        prepare=True
+    )
+    return rows or []
+
+def _padded(values):
+    """
+    لیست IN را با تکرار آخرین مقدار تا توان بعدی ۲ بلند می‌کند (نتیجه کوئری تغییر نمی‌کند)،
+    تا کوئری‌های آماده با لیست‌های متغیر فقط چند شکل محدود داشته باشند.
+    """
+    values = tuple(values)
+    size = 1 << (len(values) - 1).bit_length()
+    return values + values[-1:] * (size - len(values))
+
+def release_statement(lease_owner, row_ids):
+    """کوئری و پارامترهای آزادسازی اجاره ردیف‌های یک برداشت."""
+    row_ids = _padded(row_ids)
+    placeholders = ", ".join(["%s"] * len(row_ids))
+    return (
+        f"UPDATE trade_signals SET lease_owner = NULL, lease_expires_at = NULL WHERE lease_owner = %s AND id IN ({placeholders})",
+        (lease_owner, *row_ids)
+    )
+
+def release_rows(lease_owner, row_ids):
+    """اجاره ردیف‌های داده شده را (فقط اگر هنوز متعلق به همان برداشت باشند) آزاد می‌کند."""
+    if not row_ids:
+        return True
+    return query_db(*release_statement(lease_owner, row_ids), prepare=True)
+
+def extend_leases(row_ids, lease_seconds=None, chunk_size=500):
+    """
+    اجاره ردیف‌هایی را که هنوز به نام یکی از برداشت‌های همین پردازه هستند تمدید می‌کند
+    (order_journal: ردیف‌های دارای تغییر اعمال نشده، پس از قطعی دیتابیس).
+    :return: True اگر همه دستورات اجرا شدند
+    """
+    lease_seconds = lease_seconds or config.BOT.get("LEASE_SECONDS", 300)
+    expires_at = utcnow() + timedelta(seconds=lease_seconds)
+    # توکن برداشت‌ها با شناسه اجراکننده (میزبان:پردازه:رشته) شروع می‌شود
+    prefix = f"{socket.gethostname()}:{os.getpid()}:"
+    row_ids = list(row_ids)
+    ok = True
+    for start in range(0, len(row_ids), chunk_size):
+        chunk = _padded(row_ids[start:start + chunk_size])
+        placeholders = ", ".join(["%s"] * len(chunk))
+        ok = query_db(
+            f"UPDATE trade_signals SET lease_expires_at = %s WHERE SUBSTR(lease_owner, 1, %s) = %s AND id IN ({placeholders})",
+            (expires_at, len(prefix), prefix, *chunk),
+            prepare=True
+        ) and ok
+    return ok
+
+def renew_lease(row, lease_seconds=None):
+    """
+    اجاره یک ردیف برداشت شده را تمدید و مالکیت آن را بررسی می‌کند؛ پیش از هر اقدام غیرقابل برگشت
+    (ثبت سفارش در والکس) فراخوانی می‌شود. اگر دسته کند بوده و اجاره منقضی شده و ردیف به اجراکننده
+    دیگری رسیده باشد، این برداشت دیگر مالک آن نیست و ردیف نباید پردازش شود.
+    :param row: ردیف برگردانده شده از claim_rows (با ستون lease_owner)
+    :return: True اگر ردیف هنوز متعلق به همین برداشت است (اجاره‌اش تا lease_seconds دیگر تمدید شد)
+    """
+    lease_seconds = lease_seconds or config.BOT.get("LEASE_SECONDS", 300)
+    params = (row['id'], row['lease_owner'])
+    query_db(
+        "UPDATE trade_signals SET lease_expires_at = %s WHERE id = %s AND lease_owner = %s",
+        (utcnow() + timedelta(seconds=lease_seconds), *params),
+        prepare=True
+    )
+    # rowcount قابل اتکا نیست (MySQL ردیفی که مقدارش تغییر نکرده را نمی‌شمارد)؛ مالکیت جداگانه خوانده می‌شود
+    owned = query_db("SELECT id FROM trade_signals WHERE id = %s AND lease_owner = %s", params, fetch='one', prepare=True)
+    return owned is not None
+
+@contextmanager
+def claimed_rows(status, columns="*", extra_where="", extra_params=(), exclude_ids=(), release=None):
+    """
+    یک دسته ردیف را اجاره می‌کند و پس از پایان پردازش (حتی در صورت خطا) آزاد می‌کند.
+    استفاده: with db_utils.claimed_rows('NEW_SIGNAL') as signals: ...
+    :param release: تابع آزادسازی (پیش‌فرض release_rows؛ order_journal.release_rows برای آزادسازی پس از اعمال تغییرات)
+    """
+    rows = claim_rows(status, columns, extra_where, extra_params, exclude_ids=exclude_ids)
+    try:
+        yield rows
+    finally:
+        if rows:
+            (release or release_rows)(rows[0]['lease_owner'], [row['id'] for row in rows])
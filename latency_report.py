@@ -0,0 +1,118 @@
+# latency_report.py
+import argparse
+import json
+from datetime import timedelta
+import db_utils
+import log_utils
+
+# تنظیمات لاگ‌گیری
+log_utils.setup_logging()
+
+# مراحل چرخه معامله: (نام مرحله، ستون شروع، ستون پایان)
+STAGES = (
+    ("signal_to_buy_placed", "created_at", "buy_placed_at"),
+    ("buy_fill", "buy_placed_at", "buy_filled_at"),
+    ("buy_filled_to_sell_placed", "buy_filled_at", "sell_placed_at"),
+    ("sell_fill", "sell_placed_at", "sell_filled_at"),
+    ("buy_placed_to_canceled", "buy_placed_at", "canceled_at"),
+    ("end_to_end", "created_at", "sell_filled_at"),
+)
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    """صدک pct را با درون‌یابی خطی از یک لیست مرتب شده محاسبه می‌کند."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def fetch_timelines(hours):
+    """زمان‌بندی معاملاتی که در 'hours' ساعت گذشته ایجاد شده‌اند را از دیتابیس می‌خواند."""
+    since = db_utils.utcnow() - timedelta(hours=hours)
+    rows = db_utils.query_db(
+        "SELECT id, asset_name, status, created_at, buy_placed_at, buy_filled_at, sell_placed_at, sell_filled_at, canceled_at "
+        "FROM trade_signals_all WHERE created_at >= %s",
+        (since,),
+        fetch='all'
+    )
+    return rows or []
+
+
+def build_report(rows, top=10):
+    """
+    برای هر مرحله p50/p95/p99 (ثانیه) را محاسبه و کندترین معاملات را فهرست می‌کند.
+    :return: دیکشنری {'stages': {...}, 'slowest': [...]}
+    """
+    durations = {name: [] for name, _, _ in STAGES}
+    trades = []
+    for row in rows:
+        trade_stages = {}
+        for name, start_col, end_col in STAGES:
+            start, end = row.get(start_col), row.get(end_col)
+            if start and end:
+                seconds = (end - start).total_seconds()
+                durations[name].append(seconds)
+                trade_stages[name] = seconds
+        # کل عمر معامله تا آخرین رویداد ثبت شده
+        finished_at = row.get("sell_filled_at") or row.get("canceled_at")
+        if finished_at and row.get("created_at"):
+            trades.append({
+                "id": row["id"],
+                "asset_name": row["asset_name"],
+                "status": row["status"],
+                "total_seconds": (finished_at - row["created_at"]).total_seconds(),
+                "stages": trade_stages,
+            })
+
+    stages = {}
+    for name, values in durations.items():
+        values.sort()
+        stages[name] = {"count": len(values)}
+        for pct in PERCENTILES:
+            stages[name][f"p{pct}"] = percentile(values, pct)
+
+    trades.sort(key=lambda trade: trade["total_seconds"], reverse=True)
+    return {"stages": stages, "slowest": trades[:top]}
+
+
+def _format_seconds(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+def print_report(report, hours):
+    print(f"گزارش تاخیر معاملات در {hours} ساعت گذشته")
+    print()
+    header = f"{'stage':<28}{'count':>8}" + "".join(f"{'p' + str(pct):>12}" for pct in PERCENTILES)
+    print(header)
+    print("-" * len(header))
+    for name, stats in report["stages"].items():
+        print(f"{name:<28}{stats['count']:>8}" + "".join(f"{_format_seconds(stats['p' + str(pct)]):>12}" for pct in PERCENTILES))
+
+    print()
+    print("کندترین معاملات:")
+    for trade in report["slowest"]:
+        stages = ", ".join(f"{name}={seconds:.1f}s" for name, seconds in trade["stages"].items())
+        print(f"  ID {trade['id']} {trade['asset_name']} [{trade['status']}] total={trade['total_seconds']:.1f}s ({stages})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="گزارش تاخیر هر مرحله از چرخه معامله (p50/p95/p99) و کندترین معاملات")
+    parser.add_argument("--hours", type=float, default=24, help="بازه زمانی گزارش به ساعت (پیش‌فرض: 24)")
+    parser.add_argument("--top", type=int, default=10, help="تعداد کندترین معاملات (پیش‌فرض: 10)")
+    parser.add_argument("--json", action="store_true", help="خروجی به صورت JSON")
+    args = parser.parse_args()
+
+    report = build_report(fetch_timelines(args.hours), args.top)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report, args.hours)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# log_utils.py
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import config
+
+LOG_FORMAT = '%(asctime)s - %(threadName)s - %(levelname)s - %(message)s'
+
+# فیلدهای ساختاریافته‌ای که در صورت وجود به انتهای هر خط لاگ اضافه می‌شوند
+STRUCTURED_FIELDS = ("trade_id", "symbol", "stage")
+
+_setup_lock = threading.Lock()
+_listener = None
+
+
+def log_fields(key=None, **fields):
+    """
+    دیکشنری extra برای فراخوانی‌های لاگ می‌سازد.
+    :param key: کلید پیام برای محدودسازی نرخ (پیام‌های تکراری با یک کلید حداکثر یک بار در هر بازه نوشته می‌شوند)
+    :param fields: فیلدهای ساختاریافته مثل trade_id، symbol و stage
+    مثال: logging.info("...", extra=log_fields("executor.buy_open", trade_id=12, symbol="BTCTMN"))
+    """
+    extra = {name: value for name, value in fields.items() if value is not None}
+    if key:
+        extra["log_key"] = key
+    return extra
+
+
+class StructuredFormatter(logging.Formatter):
+    """قالب‌بندی استاندارد پروژه به همراه فیلدهای ساختاریافته: ... | trade_id=12 symbol=BTCTMN"""
+
+    def format(self, record):
+        line = super().format(record)
+        fields = [f"{name}={getattr(record, name)}" for name in STRUCTURED_FIELDS if getattr(record, name, None) is not None]
+        if fields:
+            line = f"{line} | {' '.join(fields)}"
+        return line
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    پیام‌هایی که log_key دارند حداکثر یک بار در هر 'interval_seconds' عبور می‌کنند.
+    تعداد پیام‌های حذف شده به پیام بعدی همان کلید اضافه می‌شود.
+    هشدارها و خطاها هرگز حذف نمی‌شوند.
+    """
+
+    def __init__(self, interval_seconds):
+        super().__init__()
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._last_emitted = {}
+        self._suppressed = {}
+
+    def filter(self, record):
+        key = getattr(record, "log_key", None)
+        if key is None or record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_emitted.get(key)
+            if last is not None and now - last < self.interval_seconds:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            self._last_emitted[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} پیام مشابه در {self.interval_seconds} ثانیه گذشته حذف شد)"
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """اگر صف لاگ پر باشد، به جای مسدود کردن رشته معامله، رکورد را دور می‌ریزد و می‌شمارد."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def build_handlers():
+    """هندلرهای نهایی (کنسول و در صورت تنظیم، فایل) که در رشته پس‌زمینه اجرا می‌شوند."""
+    formatter = StructuredFormatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    log_file = config.BOT.get("LOG_FILE")
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def setup_logging(level=None, handlers=None):
+    """
+    لاگ‌گیری مرکزی پروژه را یک بار راه‌اندازی می‌کند (فراخوانی‌های بعدی اثری ندارند).
+    رشته‌های اصلی فقط رکورد را در صف می‌گذارند؛ نوشتن روی کنسول/فایل در رشته پس‌زمینه انجام می‌شود.
+    :return: شیء QueueListener
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        log_queue = queue.Queue(maxsize=config.BOT.get("LOG_QUEUE_SIZE", 10000))
+        queue_handler = DroppingQueueHandler(log_queue)
+        # محدودسازی نرخ قبل از صف انجام می‌شود تا پیام‌های حذف شده هزینه‌ای نداشته باشند
+        queue_handler.addFilter(RateLimitFilter(config.BOT.get("LOG_RATE_LIMIT_SECONDS", 60)))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level if level is not None else config.BOT["LOG_LEVEL"])
+
+        _listener = logging.handlers.QueueListener(log_queue, *(handlers or build_handlers()), respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        return _listener
+
+
+def stop_logging():
+    """رشته پس‌زمینه لاگ را متوقف و رکوردهای باقی‌مانده در صف را می‌نویسد."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -0,0 +1,84 @@
+# market_data.py
+import logging
+import threading
+import config
+import db_utils
+import metrics
+import wallex_api
+
+# کش بهترین قیمت خرید/فروش (bid/ask) هر نماد برای بررسی سیگنال‌ها پیش از ثبت سفارش خرید.
+# قیمت همه بازارها با یک درخواست دریافت و حداکثر هر REFRESH_SECONDS یک بار بازخوانی می‌شود؛
+# بررسی هر سیگنال فقط یک جستجوی دیکشنری است. سیگنالی که بازار از آن عبور کرده و دیگر سودی
+# ندارد ثبت نمی‌شود (به جای ثبت خرید، انتظار و لغو پس از STALE_ORDER_TIMEOUT_MINUTES).
+#
+# زمان‌ها با db_utils.utcnow سنجیده می‌شوند تا replay با ساعت شبیه‌سازی شده هم درست کار کند.
+
+MARKET_CHECKS_TOTAL = metrics.Counter(
+    "trade_market_checks_total", "Pre-trade market checks of new signals by decision (place/reprice/skip/no_quote)", ("decision",))
+
+_lock = threading.Lock()
+# {symbol: (bid, ask)}
+_quotes = {}
+_refreshed_at = None
+
+
+def refresh(force=False):
+    """
+    قیمت همه بازارها را (اگر از آخرین دریافت REFRESH_SECONDS گذشته باشد یا با force) بازخوانی می‌کند.
+    در صورت خطا قیمت‌های قبلی نگه داشته می‌شوند تا با گذشت MAX_QUOTE_AGE_SECONDS نامعتبر شوند.
+    :return: True اگر قیمت‌ها بازخوانی شدند
+    """
+    global _quotes, _refreshed_at
+    if not config.MARKET_DATA.get("ENABLED"):
+        return False
+    now = db_utils.utcnow()
+    if not force and _refreshed_at is not None and (now - _refreshed_at).total_seconds() < config.MARKET_DATA.get("REFRESH_SECONDS", 5):
+        return False
+    quotes = wallex_api.get_market_quotes()
+    if quotes is None:
+        return False
+    with _lock:
+        _quotes, _refreshed_at = quotes, now
+    logging.debug(f"قیمت {len(quotes)} بازار بازخوانی شد.")
+    return True
+
+
+def get_quote(symbol):
+    """:return: (bid, ask) نماد یا None اگر قیمتی نباشد یا قدیمی‌تر از MAX_QUOTE_AGE_SECONDS باشد"""
+    with _lock:
+        quotes, refreshed_at = _quotes, _refreshed_at
+    if refreshed_at is None:
+        return None
+    if (db_utils.utcnow() - refreshed_at).total_seconds() > config.MARKET_DATA.get("MAX_QUOTE_AGE_SECONDS", 30):
+        return None
+    return quotes.get(symbol)
+
+
+def check_entry(symbol, entry_price, exit_price):
+    """
+    یک سیگنال خرید را با بهترین قیمت فروش (ask) فعلی بازار مقایسه می‌کند.
+    - ask <= قیمت ورود: سفارش با قیمت سیگنال ثبت می‌شود (place)
+    - ask بالاتر ولی سود تا قیمت خروج هنوز >= MIN_EDGE_BPS: خرید با قیمت ask (reprice، اگر فعال باشد)
+    - سود باقی‌مانده کمتر از MIN_EDGE_BPS: سیگنال کنار گذاشته می‌شود (skip)
+    بدون قیمت معتبر، سیگنال مثل قبل با قیمت خودش اجرا می‌شود (no_quote).
+    :return: (decision، قیمت خرید، توضیح برای notes)
+    """
+    quote = get_quote(symbol) if config.MARKET_DATA.get("ENABLED") else None
+    if quote is None:
+        MARKET_CHECKS_TOTAL.inc(decision="no_quote")
+        return "no_quote", entry_price, None
+
+    ask = quote[1]
+    if ask <= entry_price:
+        MARKET_CHECKS_TOTAL.inc(decision="place")
+        return "place", entry_price, None
+
+    edge_bps = (exit_price - ask) / ask * 10_000
+    if edge_bps < config.MARKET_DATA.get("MIN_EDGE_BPS", 20):
+        MARKET_CHECKS_TOTAL.inc(decision="skip")
+        return "skip", None, f"No edge left: ask {ask} vs entry {entry_price}, exit {exit_price} ({edge_bps:.0f} bps)"
+    if config.MARKET_DATA.get("REPRICE"):
+        MARKET_CHECKS_TOTAL.inc(decision="reprice")
+        return "reprice", ask, f"Repriced from {entry_price} to ask {ask} ({edge_bps:.0f} bps to exit)"
+    MARKET_CHECKS_TOTAL.inc(decision="place")
+    return "place", entry_price, None
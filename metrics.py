@@ -0,0 +1,211 @@
+# metrics.py
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config
+
+# مرزهای پیش‌فرض هیستوگرام‌ها (ثانیه)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# همه متریک‌های تعریف شده برای خروجی گرفتن در /metrics
+_registry = []
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    """برچسب‌ها را به قالب متنی Prometheus تبدیل می‌کند: {a="1",b="2"}"""
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Metric:
+    """پایه مشترک متریک‌ها: نام، توضیح، برچسب‌ها و قفل."""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"برچسب‌های متریک {self.name} باید {self.labelnames} باشند، نه {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    """شمارنده‌ای که فقط افزایش می‌یابد."""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """مقداری که می‌تواند بالا و پایین برود."""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def replace_all(self, values_by_label):
+        """
+        همه مقادیر را یکجا جایگزین می‌کند (برای برچسب‌هایی که ممکن است ناپدید شوند).
+        :param values_by_label: دیکشنری {مقدار برچسب اول: مقدار}
+        """
+        with self._lock:
+            self._values = {(str(label),): value for label, value in values_by_label.items()}
+
+
+class Histogram(_Metric):
+    """هیستوگرام تجمعی با مرزهای ثابت (سازگار با Prometheus)."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [شمارش هر باکت..., مجموع، تعداد]
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key, state):
+        bucket_counts, total, count = state
+        lines = []
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {bucket_count}")
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """مدت اجرای بلوک را در هیستوگرام داده شده ثبت می‌کند."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+class LoopTimer:
+    """
+    تاخیر حلقه‌ها را اندازه می‌گیرد: فاصله واقعی بین دو شروع چرخه منهای فاصله تنظیم شده.
+    در ابتدای هر چرخه tick() صدا زده می‌شود.
+    """
+
+    def __init__(self, loop_name, interval_seconds):
+        self.loop_name = loop_name
+        self.interval_seconds = interval_seconds
+        self._last_start = None
+
+    def tick(self):
+        now = time.monotonic()
+        if self._last_start is not None:
+            lag = (now - self._last_start) - self.interval_seconds
+            LOOP_LAG_SECONDS.observe(max(lag, 0.0), loop=self.loop_name)
+            LOOP_LAST_LAG_SECONDS.set(lag, loop=self.loop_name)
+        self._last_start = now
+
+
+# ==============================================================================
+# متریک‌های خط لوله معاملات
+# ==============================================================================
+DB_QUERY_SECONDS = Histogram(
+    "trade_db_query_seconds", "Latency of db_utils.query_db by statement", ("statement",))
+DB_STATEMENT_ROWS = Counter(
+    "trade_db_statement_rows_total", "Rows returned or affected by statement", ("statement",))
+WALLEX_REQUEST_SECONDS = Histogram(
+    "trade_wallex_request_seconds", "Latency of Wallex API calls by endpoint and HTTP status", ("endpoint", "status"))
+EXECUTOR_STAGE_SECONDS = Histogram(
+    "trade_executor_stage_seconds", "Duration of each order executor stage", ("stage",))
+SIGNALS_TOTAL = Counter(
+    "trade_signals_total", "Signals seen by the ingestor by result (ingested/deduplicated/rejected/seen)", ("result",))
+OPEN_ORDERS = Gauge(
+    "trade_open_orders", "Non-terminal trade_signals rows by status", ("status",))
+LOOP_LAG_SECONDS = Histogram(
+    "trade_loop_lag_seconds", "Actual minus configured interval between loop cycles", ("loop",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+LOOP_LAST_LAG_SECONDS = Gauge(
+    "trade_loop_last_lag_seconds", "Lag of the most recent loop cycle", ("loop",))
+
+
+def render_metrics():
+    """همه متریک‌ها را به قالب متنی Prometheus برمی‌گرداند."""
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # درخواست‌های Prometheus نباید لاگ‌ها را پر کنند
+        pass
+
+
+def start_metrics_server(host=None, port=None):
+    """
+    سرور HTTP متریک‌ها را در یک رشته پس‌زمینه (Daemon) راه‌اندازی می‌کند.
+    :return: شیء سرور یا None در صورت خطا
+    """
+    host = host or config.METRICS.get("HOST", "127.0.0.1")
+    port = port if port is not None else config.METRICS.get("PORT", 9108)
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logging.error(f"امکان راه‌اندازی سرور متریک روی {host}:{port} وجود ندارد: {e}")
+        return None
+    thread = threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True)
+    thread.start()
+    logging.info(f"سرور متریک روی http://{host}:{server.server_address[1]}/metrics فعال شد.")
+    return server
@@ -0,0 +1,9 @@
+-- 001: قفل اجاره‌ای ردیف‌ها برای اجرای همزمان چند اجراکننده (Executor)
+-- lease_owner: شناسه اجراکننده‌ای که ردیف را برداشته (میزبان:پردازه:رشته)
+-- lease_expires_at: زمان انقضای اجاره به وقت UTC؛ پس از آن ردیف دوباره قابل برداشت است
+
+ALTER TABLE trade_signals
+    ADD COLUMN lease_owner VARCHAR(128) NULL DEFAULT NULL,
+    ADD COLUMN lease_expires_at DATETIME NULL DEFAULT NULL;
+
+CREATE INDEX idx_trade_signals_status_lease ON trade_signals (status, lease_owner, lease_expires_at);
@@ -0,0 +1,11 @@
+-- 002: زمان‌بندی هر مرحله از چرخه معامله (همه به وقت UTC)
+-- زمان دریافت سیگنال همان created_at است
+
+ALTER TABLE trade_signals
+    ADD COLUMN buy_placed_at DATETIME(3) NULL DEFAULT NULL,
+    ADD COLUMN buy_filled_at DATETIME(3) NULL DEFAULT NULL,
+    ADD COLUMN sell_placed_at DATETIME(3) NULL DEFAULT NULL,
+    ADD COLUMN sell_filled_at DATETIME(3) NULL DEFAULT NULL,
+    ADD COLUMN canceled_at DATETIME(3) NULL DEFAULT NULL;
+
+CREATE INDEX idx_trade_signals_created_at ON trade_signals (created_at);
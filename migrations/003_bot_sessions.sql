@@ -0,0 +1,12 @@
+-- 003: نشست‌های ماندگار لاگین ربات تلگرام (جایگزین دیکشنری LOGGED_IN_USERS در حافظه)
+-- expires_at به وقت UTC است؛ نشست‌های منقضی شده در شروع ربات پاک می‌شوند
+
+CREATE TABLE IF NOT EXISTS bot_sessions (
+    telegram_user_id BIGINT NOT NULL PRIMARY KEY,
+    user_id INT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    is_admin BOOLEAN NOT NULL DEFAULT FALSE,
+    expires_at DATETIME NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_bot_sessions_expires_at (expires_at)
+);
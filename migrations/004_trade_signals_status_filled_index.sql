@@ -0,0 +1,3 @@
+-- 004: ایندکس برای خلاصه داشبورد تلگرام (معاملات تکمیل شده امروز)
+
+CREATE INDEX idx_trade_signals_status_sell_filled_at ON trade_signals (status, sell_filled_at);
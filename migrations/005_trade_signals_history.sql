@@ -0,0 +1,15 @@
+-- 005: تفکیک داغ/سرد جدول trade_signals
+-- معاملات تمام شده (SELL_ORDER_FILLED, CANCELED_TIMEOUT, ERROR) توسط archiver.py در دسته‌های
+-- تراکنشی به trade_signals_history منتقل می‌شوند تا جدول داغ فقط پوزیشن‌های فعال را نگه دارد.
+-- گزارش‌ها (latency_report، داشبورد تلگرام) از view trade_signals_all می‌خوانند.
+--
+-- توجه: ستون‌های دو جدول باید یکسان بمانند؛ هر مایگریشن بعدی که ستونی به trade_signals اضافه
+-- می‌کند باید همان ستون را به trade_signals_history اضافه کرده و view را دوباره بسازد.
+
+-- ساختار و ایندکس‌ها از جدول داغ کپی می‌شوند؛ id ها همان id های جدول داغ هستند
+CREATE TABLE IF NOT EXISTS trade_signals_history LIKE trade_signals;
+
+CREATE OR REPLACE VIEW trade_signals_all AS
+    SELECT * FROM trade_signals
+    UNION ALL
+    SELECT * FROM trade_signals_history;
@@ -0,0 +1,16 @@
+-- 006: میانگین قیمت اجرا شده سفارش خرید و فروش (executedSum / executedQty والکس)
+-- برای محاسبه لغزش قیمت (slippage) نسبت به entry_price / exit_price در analytics.py
+-- طبق 005، ستون‌ها به trade_signals_history هم اضافه و view دوباره ساخته می‌شود.
+
+ALTER TABLE trade_signals
+    ADD COLUMN buy_executed_price DECIMAL(30, 10) NULL DEFAULT NULL,
+    ADD COLUMN sell_executed_price DECIMAL(30, 10) NULL DEFAULT NULL;
+
+ALTER TABLE trade_signals_history
+    ADD COLUMN buy_executed_price DECIMAL(30, 10) NULL DEFAULT NULL,
+    ADD COLUMN sell_executed_price DECIMAL(30, 10) NULL DEFAULT NULL;
+
+CREATE OR REPLACE VIEW trade_signals_all AS
+    SELECT * FROM trade_signals
+    UNION ALL
+    SELECT * FROM trade_signals_history;
@@ -0,0 +1,15 @@
+-- 007: قیمت محدود (limit) سفارش خرید ثبت شده در والکس
+-- وقتی market_data سیگنال را با قیمت ask فعلی دوباره قیمت‌گذاری می‌کند، قیمت خرید با entry_price سیگنال
+-- فرق دارد؛ entry_price دست نخورده می‌ماند (مبنای لغزش قیمت در analytics.py) و قیمت سفارش اینجا ذخیره می‌شود.
+-- طبق 005، ستون به trade_signals_history هم اضافه و view دوباره ساخته می‌شود.
+
+ALTER TABLE trade_signals
+    ADD COLUMN buy_limit_price DECIMAL(30, 10) NULL DEFAULT NULL;
+
+ALTER TABLE trade_signals_history
+    ADD COLUMN buy_limit_price DECIMAL(30, 10) NULL DEFAULT NULL;
+
+CREATE OR REPLACE VIEW trade_signals_all AS
+    SELECT * FROM trade_signals
+    UNION ALL
+    SELECT * FROM trade_signals_history;
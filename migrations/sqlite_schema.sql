@@ -0,0 +1,101 @@
+-- اسکیمای کامل برای بک‌اند SQLite (config.STORAGE["BACKEND"] = "sqlite")
+-- معادل جداول MySQL به همراه مایگریشن‌های 001 تا 007؛ هر مایگریشن جدید MySQL باید اینجا هم اعمال شود
+-- (ستون‌های جدید برای فایل‌های موجود در db_utils._SQLITE_ADDED_COLUMNS هم اضافه می‌شوند).
+-- db_utils این فایل را در اولین اتصال هر پردازه اجرا می‌کند (همه دستورات IF NOT EXISTS هستند).
+--
+-- انواع ستون‌ها برای مبدل‌های db_utils انتخاب شده‌اند:
+-- DECIMAL_TEXT: مقادیر Decimal به صورت متن ذخیره می‌شوند (بدون از دست رفتن دقت در REAL) و Decimal برمی‌گردند
+-- DATETIME: زمان UTC به صورت متن ISO ذخیره می‌شود و datetime برمی‌گردد
+
+CREATE TABLE IF NOT EXISTS trade_signals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    asset_name VARCHAR(64) NOT NULL,
+    pair VARCHAR(64),
+    entry_price DECIMAL_TEXT,
+    exit_price DECIMAL_TEXT,
+    strategy_name VARCHAR(128),
+    status VARCHAR(32) NOT NULL,
+    notes TEXT,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    buy_client_order_id VARCHAR(128),
+    buy_quantity_raw DECIMAL_TEXT,
+    buy_quantity_formatted DECIMAL_TEXT,
+    buy_executed_quantity DECIMAL_TEXT,
+    buy_fee DECIMAL_TEXT,
+    sell_client_order_id VARCHAR(128),
+    sell_executed_quantity DECIMAL_TEXT,
+    sell_fee DECIMAL_TEXT,
+    lease_owner VARCHAR(128),
+    lease_expires_at DATETIME,
+    buy_placed_at DATETIME,
+    buy_filled_at DATETIME,
+    sell_placed_at DATETIME,
+    sell_filled_at DATETIME,
+    canceled_at DATETIME,
+    buy_executed_price DECIMAL_TEXT,
+    sell_executed_price DECIMAL_TEXT,
+    buy_limit_price DECIMAL_TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_trade_signals_status_lease ON trade_signals (status, lease_owner, lease_expires_at);
+CREATE INDEX IF NOT EXISTS idx_trade_signals_created_at ON trade_signals (created_at);
+CREATE INDEX IF NOT EXISTS idx_trade_signals_status_sell_filled_at ON trade_signals (status, sell_filled_at);
+CREATE INDEX IF NOT EXISTS idx_trade_signals_asset_status ON trade_signals (asset_name, status);
+
+CREATE TABLE IF NOT EXISTS trade_signals_history (
+    id INTEGER PRIMARY KEY,
+    asset_name VARCHAR(64) NOT NULL,
+    pair VARCHAR(64),
+    entry_price DECIMAL_TEXT,
+    exit_price DECIMAL_TEXT,
+    strategy_name VARCHAR(128),
+    status VARCHAR(32) NOT NULL,
+    notes TEXT,
+    created_at DATETIME NOT NULL,
+    buy_client_order_id VARCHAR(128),
+    buy_quantity_raw DECIMAL_TEXT,
+    buy_quantity_formatted DECIMAL_TEXT,
+    buy_executed_quantity DECIMAL_TEXT,
+    buy_fee DECIMAL_TEXT,
+    sell_client_order_id VARCHAR(128),
+    sell_executed_quantity DECIMAL_TEXT,
+    sell_fee DECIMAL_TEXT,
+    lease_owner VARCHAR(128),
+    lease_expires_at DATETIME,
+    buy_placed_at DATETIME,
+    buy_filled_at DATETIME,
+    sell_placed_at DATETIME,
+    sell_filled_at DATETIME,
+    canceled_at DATETIME,
+    buy_executed_price DECIMAL_TEXT,
+    sell_executed_price DECIMAL_TEXT,
+    buy_limit_price DECIMAL_TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_trade_signals_history_created_at ON trade_signals_history (created_at);
+CREATE INDEX IF NOT EXISTS idx_trade_signals_history_status_sell_filled_at ON trade_signals_history (status, sell_filled_at);
+
+CREATE VIEW IF NOT EXISTS trade_signals_all AS
+    SELECT * FROM trade_signals
+    UNION ALL
+    SELECT * FROM trade_signals_history;
+
+CREATE TABLE IF NOT EXISTS bot_users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    telegram_user_id BIGINT UNIQUE,
+    username VARCHAR(64) NOT NULL UNIQUE,
+    hashed_password VARCHAR(255) NOT NULL,
+    is_admin BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS bot_sessions (
+    telegram_user_id BIGINT NOT NULL PRIMARY KEY,
+    user_id INT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    is_admin BOOLEAN NOT NULL DEFAULT FALSE,
+    expires_at DATETIME NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_bot_sessions_expires_at ON bot_sessions (expires_at);
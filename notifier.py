@@ -0,0 +1,161 @@
+# notifier.py
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+import requests
+import config
+import db_utils
+import metrics
+
+# ارسال رویدادهای معامله (ثبت خرید، پر شدن، فروش، لغو، خطا) به ادمین‌های لاگین کرده در ربات تلگرام.
+# مسیر سفارش فقط رویداد را در یک صف محدود می‌گذارد (بدون انتظار)؛ اگر صف پر باشد رویداد دور ریخته می‌شود.
+# یک رشته پس‌زمینه رویدادهای هر بازه را در یک پیام خلاصه (Digest) جمع می‌کند تا از
+# محدودیت نرخ تلگرام برای هر چت عبور نکنیم.
+
+EVENT_TITLES = {
+    "buy_placed": "🟦 خرید ثبت شد",
+    "buy_filled": "🟩 خرید پر شد",
+    "sell_placed": "🟨 فروش ثبت شد",
+    "sold": "💰 فروش پر شد",
+    "canceled": "⬜️ لغو شد",
+    "error": "🟥 خطا",
+}
+
+NOTIFICATIONS_TOTAL = metrics.Counter(
+    "trade_notifications_total", "Trade notifications by result (queued/dropped/sent/failed)", ("result",))
+
+_queue = queue.Queue(maxsize=config.NOTIFICATIONS.get("QUEUE_SIZE", 1000))
+_started = threading.Event()
+
+
+def notify(event, trade_id, text=""):
+    """
+    یک رویداد معامله را برای ارسال به ادمین‌ها در صف می‌گذارد. هرگز مسدود نمی‌شود و خطا نمی‌دهد.
+    :param event: یکی از کلیدهای EVENT_TITLES
+    """
+    if not _started.is_set():
+        return
+    try:
+        _queue.put_nowait((event, trade_id, text, time.time()))
+        NOTIFICATIONS_TOTAL.inc(result="queued")
+    except queue.Full:
+        NOTIFICATIONS_TOTAL.inc(result="dropped")
+
+
+def build_digest(events, max_lines):
+    """
+    رویدادهای یک بازه را در یک پیام خلاصه می‌کند:
+    شمارش هر نوع رویداد و حداکثر 'max_lines' خط جزئیات.
+    """
+    counts = Counter(event for event, _, _, _ in events)
+    lines = ["📣 " + " | ".join(f"{EVENT_TITLES.get(event, event)}: {count}" for event, count in counts.items())]
+    for event, trade_id, text, _ in events[:max_lines]:
+        lines.append(f"{EVENT_TITLES.get(event, event)} #{trade_id} {text}".rstrip())
+    if len(events) > max_lines:
+        lines.append(f"... و {len(events) - max_lines} رویداد دیگر")
+    return "\n".join(lines)
+
+
+class _Sender:
+    """ارسال پیام به چت‌های ادمین از طریق Bot API تلگرام با رعایت فاصله حداقل برای هر چت."""
+
+    def __init__(self, token):
+        self.url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self._chats = []
+        self._chats_loaded_at = 0.0
+        self._next_allowed = {}
+
+    def admin_chats(self):
+        """چت‌های ادمین‌های لاگین کرده (از bot_sessions، با کش کوتاه‌مدت)."""
+        if time.monotonic() - self._chats_loaded_at > config.NOTIFICATIONS.get("CHATS_REFRESH_SECONDS", 60):
+            rows = db_utils.query_db(
+                "SELECT DISTINCT chat_id FROM bot_sessions WHERE is_admin = TRUE AND expires_at > %s",
+                (db_utils.utcnow(),),
+                fetch='all'
+            )
+            if rows is not None:
+                self._chats = [row['chat_id'] for row in rows]
+                self._chats_loaded_at = time.monotonic()
+        return self._chats
+
+    def ready(self, chat_id):
+        return time.monotonic() >= self._next_allowed.get(chat_id, 0)
+
+    def send(self, chat_id, text):
+        try:
+            response = requests.post(self.url, json={"chat_id": chat_id, "text": text}, timeout=10)
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"خطا در ارسال اعلان تلگرام به چت {chat_id}: {e}")
+            NOTIFICATIONS_TOTAL.inc(result="failed")
+            return False
+        if response.status_code == 429:
+            # تلگرام مدت انتظار را در retry_after اعلام می‌کند
+            retry_after = response.json().get("parameters", {}).get("retry_after", 5)
+            self._next_allowed[chat_id] = time.monotonic() + retry_after
+            NOTIFICATIONS_TOTAL.inc(result="failed")
+            return False
+        self._next_allowed[chat_id] = time.monotonic() + config.NOTIFICATIONS.get("MIN_CHAT_INTERVAL_SECONDS", 3)
+        if response.status_code != 200:
+            logging.warning(f"ارسال اعلان به چت {chat_id} ناموفق بود. وضعیت: {response.status_code}")
+            NOTIFICATIONS_TOTAL.inc(result="failed")
+            return False
+        NOTIFICATIONS_TOTAL.inc(result="sent")
+        return True
+
+
+def _run(sender):
+    flush_interval = config.NOTIFICATIONS.get("FLUSH_INTERVAL_SECONDS", 5)
+    max_lines = config.NOTIFICATIONS.get("DIGEST_MAX_LINES", 15)
+    # رویدادهایی که هنوز به هر چت نرسیده‌اند (چت‌های محدود شده منتظر نوبت بعدی می‌مانند)
+    backlog = {}
+    while True:
+        events = []
+        try:
+            # اگر پیامی منتظر نوبت است، بیش از یک بازه منتظر رویداد جدید نمی‌مانیم
+            events.append(_queue.get(timeout=flush_interval if backlog else None))
+        except queue.Empty:
+            pass
+        deadline = time.monotonic() + flush_interval
+        while events:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                events.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            chats = sender.admin_chats()
+            for chat_id in chats:
+                backlog.setdefault(chat_id, []).extend(events)
+            for chat_id in list(backlog):
+                if chat_id not in chats:
+                    del backlog[chat_id]
+                elif sender.ready(chat_id) and sender.send(chat_id, build_digest(backlog[chat_id], max_lines)):
+                    del backlog[chat_id]
+                else:
+                    # رویدادهای خیلی قدیمی حذف می‌شوند تا حافظه محدود بماند
+                    backlog[chat_id] = backlog[chat_id][-config.NOTIFICATIONS.get("QUEUE_SIZE", 1000):]
+        except Exception as e:
+            logging.error(f"خطای پیش‌بینی نشده در ارسال اعلان‌ها: {e}")
+
+
+def start_notifier():
+    """
+    رشته ارسال اعلان‌ها را راه‌اندازی می‌کند (در صورت فعال بودن و وجود توکن تلگرام).
+    تا قبل از آن، notify() هیچ کاری انجام نمی‌دهد.
+    """
+    if not config.NOTIFICATIONS.get("ENABLED"):
+        return False
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    if not token:
+        logging.warning("TELEGRAM_BOT_TOKEN تنظیم نشده است؛ اعلان‌های معامله ارسال نمی‌شوند.")
+        return False
+    threading.Thread(target=_run, args=(_Sender(token),), name="Notifier", daemon=True).start()
+    _started.set()
+    logging.info("ارسال اعلان‌های معامله به ادمین‌های تلگرام فعال شد.")
+    return True
@@ -4,230 +4,341 @@ import time
 from decimal import Decimal
 import config
 import db_utils
+import log_utils
+import market_data
+import metrics
+import notifier
+import order_journal
+import profiler
 import wallex_api
 
 # تنظیمات لاگ‌گیری
-logging.basicConfig(level=config.BOT["LOG_LEVEL"], format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+log_utils.setup_logging()
+
+# کوئری‌های تغییر وضعیت؛ با ثبت در db_utils روی هر اتصال فقط یک بار prepare می‌شوند
+MARK_ERROR = db_utils.register_statement(
+    "executor.mark_error", "UPDATE trade_signals SET status = 'ERROR', notes = %s WHERE id = %s")
+MARK_SKIPPED = db_utils.register_statement(
+    "executor.mark_skipped", "UPDATE trade_signals SET status = 'SKIPPED_NO_EDGE', notes = %s WHERE id = %s")
+MARK_REPRICED = db_utils.register_statement(
+    "executor.mark_repriced", "UPDATE trade_signals SET notes = %s WHERE id = %s")
+MARK_BUY_PLACED = db_utils.register_statement(
+    "executor.buy_placed",
+    "UPDATE trade_signals SET status = 'BUY_ORDER_PLACED', buy_client_order_id = %s, buy_limit_price = %s, buy_quantity_raw = %s, buy_quantity_formatted = %s, buy_placed_at = %s WHERE id = %s"
+)
+MARK_BUY_FILLED = db_utils.register_statement(
+    "executor.buy_filled",
+    "UPDATE trade_signals SET status = 'BUY_ORDER_FILLED', buy_executed_quantity = %s, buy_fee = %s, buy_executed_price = %s, buy_filled_at = %s WHERE id = %s"
+)
+MARK_SELL_PLACED = db_utils.register_statement(
+    "executor.sell_placed",
+    "UPDATE trade_signals SET status = 'SELL_ORDER_PLACED', sell_client_order_id = %s, sell_placed_at = %s WHERE id = %s"
+)
+MARK_SOLD = db_utils.register_statement(
+    "executor.sell_filled",
+    "UPDATE trade_signals SET status = 'SELL_ORDER_FILLED', sell_executed_quantity = %s, sell_fee = %s, sell_executed_price = %s, sell_filled_at = %s, notes = 'Trade completed successfully' WHERE id = %s"
+)
+
+def executed_price(wallex_order):
+    """میانگین قیمت اجرا شده یک سفارش (executedSum / executedQty) یا None اگر چیزی اجرا نشده باشد."""
+    executed_qty = Decimal(wallex_order.get("executedQty") or "0")
+    executed_sum = wallex_order.get("executedSum")
+    if executed_qty <= 0 or executed_sum is None:
+        return None
+    return Decimal(executed_sum) / executed_qty
 
 def process_new_signals():
     """
     مرحله ۱: سیگنال‌های 'NEW_SIGNAL' را از دیتابیس خوانده و برایشان سفارش خرید ثبت می‌کند.
     """
-    logging.info("[مرحله ۱] در حال بررسی سیگنال‌های جدید برای ثبت سفارش خرید...")
-    signals = db_utils.query_db("SELECT * FROM trade_signals WHERE status = 'NEW_SIGNAL'", fetch='all')
-    
-    if not signals:
-        logging.info("[مرحله ۱] هیچ سیگنال جدیدی برای اجرا یافت نشد.")
-        return
-
-    for signal in signals:
-        try:
-            symbol = f"{signal['asset_name']}{config.TRADING['QUOTE_ASSET']}"
+    logging.debug("[مرحله ۱] در حال بررسی سیگنال‌های جدید برای ثبت سفارش خرید...")
+    # فقط ردیف‌هایی که به نام همین اجراکننده اجاره شده‌اند پردازش می‌شوند
+    claimed = 0
+    for signals in order_journal.claimed_batches('NEW_SIGNAL'):
+        claimed += len(signals)
+
+        # یک درخواست برای قیمت همه بازارها (در صورت قدیمی بودن کش)، نه یکی برای هر سیگنال
+        market_data.refresh()
+
+        for signal in signals:
+            try:
+                symbol = f"{signal['asset_name']}{config.TRADING['QUOTE_ASSET']}"
             
-            # --- فیکس جدید: گرفتن هر دو قانون دقت اعشار ---
-            amount_precision = wallex_api.market_amount_precisions.get(symbol)
-            price_precision = wallex_api.market_price_precisions.get(symbol)
+                # --- فیکس جدید: گرفتن هر دو قانون دقت اعشار ---
+                amount_precision = wallex_api.market_amount_precisions.get(symbol)
+                price_precision = wallex_api.market_price_precisions.get(symbol)
             
-            if amount_precision is None or price_precision is None:
-                logging.warning(f"قوانین دقت اعشار (amount یا price) برای نماد '{symbol}' یافت نشد.")
-                db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = %s WHERE id = %s", (f"Precision rules not found for {symbol}", signal['id']))
-                continue
-
-            # استفاده از Decimal برای دقت بالا
-            entry_price_raw = Decimal(signal['entry_price'])
-            trade_amount = Decimal(config.TRADING["TRADE_AMOUNT_TMN"])
+                if amount_precision is None or price_precision is None:
+                    logging.warning(f"قوانین دقت اعشار (amount یا price) برای نماد '{symbol}' یافت نشد.")
+                    order_journal.record(signal['id'], MARK_ERROR, (f"Precision rules not found for {symbol}", signal['id']))
+                    notifier.notify("error", signal['id'], f"Precision rules not found for {symbol}")
+                    continue
+
+                # استفاده از Decimal برای دقت بالا
+                entry_price_raw = Decimal(signal['entry_price'])
+                trade_amount = Decimal(config.TRADING["TRADE_AMOUNT_TMN"])
             
-            if entry_price_raw <= 0:
-                 logging.error(f"قیمت ورودی نامعتبر (صفر) برای {symbol}. نادیده گرفته شد.")
-                 db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = 'Invalid entry price (zero)' WHERE id = %s", (signal['id'],))
-                 continue
+                if entry_price_raw <= 0:
+                     logging.error(f"قیمت ورودی نامعتبر (صفر) برای {symbol}. نادیده گرفته شد.")
+                     order_journal.record(signal['id'], MARK_ERROR, ("Invalid entry price (zero)", signal['id']))
+                     notifier.notify("error", signal['id'], "Invalid entry price (zero)")
+                     continue
+
+                # --- بررسی سیگنال با قیمت فعلی بازار: سیگنالی که دیگر سودی ندارد ثبت نمی‌شود ---
+                decision, buy_price, market_note = market_data.check_entry(symbol, entry_price_raw, Decimal(signal['exit_price'] or 0))
+                if decision == "skip":
+                    logging.info(f"سیگنال {symbol} (ID: {signal['id']}) دیگر سودی ندارد و کنار گذاشته شد: {market_note}", extra=log_utils.log_fields("executor.no_edge", trade_id=signal['id'], symbol=symbol, stage="process_new_signals"))
+                    order_journal.record(signal['id'], MARK_SKIPPED, (market_note, signal['id']))
+                    continue
+                if decision == "reprice":
+                    logging.info(f"قیمت خرید {symbol} (ID: {signal['id']}) اصلاح شد: {market_note}", extra=log_utils.log_fields(trade_id=signal['id'], symbol=symbol, stage="process_new_signals"))
+                    # entry_price سیگنال تغییر نمی‌کند؛ قیمت سفارش در buy_limit_price ذخیره می‌شود
+                    order_journal.record(signal['id'], MARK_REPRICED, (market_note, signal['id']))
+                    entry_price_raw = buy_price
             
-            # --- فیکس جدید: گرد کردن قیمت ورودی ---
-            formatted_entry_price = wallex_api.format_price(entry_price_raw, price_precision)
-            logging.info(f"قیمت خرید برای {symbol}: {formatted_entry_price} (خام: {entry_price_raw})")
-
-            if formatted_entry_price <= 0:
-                logging.error(f"قیمت ورودی پس از گرد کردن 0 شد. (خام: {entry_price_raw}).")
-                db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = 'Entry price 0 after formatting' WHERE id = %s", (signal['id'],))
-                continue
-
-            # گرد کردن مقدار
-            quantity_to_buy_raw = trade_amount / formatted_entry_price # محاسبه با قیمت گرد شده
-            formatted_quantity = wallex_api.format_quantity(quantity_to_buy_raw, amount_precision)
-            logging.info(f"مقدار محاسبه شده برای {symbol}: {formatted_quantity} (خام: {quantity_to_buy_raw})")
-
-            if formatted_quantity <= 0:
-                logging.warning(f"مقدار محاسبه شده برای {symbol} (0) برای معامله بسیار کوچک است.")
-                db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = 'Calculated quantity is zero' WHERE id = %s", (signal['id'],))
-                continue
-
-            # ثبت سفارش خرید در والکس با قیمت و مقدار گرد شده
-            order_response = wallex_api.place_wallex_order(symbol, formatted_entry_price, formatted_quantity, "buy")
+                # --- فیکس جدید: گرد کردن قیمت ورودی ---
+                formatted_entry_price = wallex_api.format_price(entry_price_raw, price_precision)
+                logging.debug(f"قیمت خرید برای {symbol}: {formatted_entry_price} (خام: {entry_price_raw})", extra=log_utils.log_fields(trade_id=signal['id'], symbol=symbol, stage="process_new_signals"))
+
+                if formatted_entry_price <= 0:
+                    logging.error(f"قیمت ورودی پس از گرد کردن 0 شد. (خام: {entry_price_raw}).")
+                    order_journal.record(signal['id'], MARK_ERROR, ("Entry price 0 after formatting", signal['id']))
+                    notifier.notify("error", signal['id'], "Entry price 0 after formatting")
+                    continue
+
+                # گرد کردن مقدار
+                quantity_to_buy_raw = trade_amount / formatted_entry_price # محاسبه با قیمت گرد شده
+                formatted_quantity = wallex_api.format_quantity(quantity_to_buy_raw, amount_precision)
+                logging.debug(f"مقدار محاسبه شده برای {symbol}: {formatted_quantity} (خام: {quantity_to_buy_raw})", extra=log_utils.log_fields(trade_id=signal['id'], symbol=symbol, stage="process_new_signals"))
+
+                if formatted_quantity <= 0:
+                    logging.warning(f"مقدار محاسبه شده برای {symbol} (0) برای معامله بسیار کوچک است.")
+                    order_journal.record(signal['id'], MARK_ERROR, ("Calculated quantity is zero", signal['id']))
+                    notifier.notify("error", signal['id'], "Calculated quantity is zero")
+                    continue
+
+                if not db_utils.renew_lease(signal):
+                    logging.warning(f"اجاره سیگنال {symbol} (ID: {signal['id']}) منقضی شده و در اختیار اجراکننده دیگری است؛ سفارش خرید ثبت نشد.", extra=log_utils.log_fields(trade_id=signal['id'], symbol=symbol, stage="process_new_signals"))
+                    continue
+
+                # ثبت سفارش خرید در والکس با قیمت و مقدار گرد شده
+                order_response = wallex_api.place_wallex_order(symbol, formatted_entry_price, formatted_quantity, "buy")
             
-            if order_response:
-                client_order_id = order_response.get("result", {}).get("clientOrderId")
-                db_utils.query_db(
-                    "UPDATE trade_signals SET status = 'BUY_ORDER_PLACED', buy_client_order_id = %s, buy_quantity_raw = %s, buy_quantity_formatted = %s WHERE id = %s",
-                    (client_order_id, quantity_to_buy_raw, formatted_quantity, signal['id'])
-                )
-                logging.info(f"سفارش خرید برای {symbol} با ID: {client_order_id} ثبت شد.")
-            else:
-                logging.error(f"خطا در ثبت سفارش خرید برای {symbol}.")
-                db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = 'Failed to place buy order on Wallex' WHERE id = %s", (signal['id'],))
-
-        except Exception as e:
-            logging.error(f"خطای پیش‌بینی نشده در process_new_signals برای ID {signal['id']}: {e}")
-            db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = %s WHERE id = %s", (str(e), signal['id']))
+                if order_response:
+                    client_order_id = order_response.get("result", {}).get("clientOrderId")
+                    order_journal.record(
+                        signal['id'],
+                        MARK_BUY_PLACED,
+                        (client_order_id, formatted_entry_price, quantity_to_buy_raw, formatted_quantity, db_utils.utcnow(), signal['id'])
+                    )
+                    notifier.notify("buy_placed", signal['id'], f"{symbol} {formatted_quantity} @ {formatted_entry_price}")
+                    logging.info(f"سفارش خرید برای {symbol} با ID: {client_order_id} ثبت شد.", extra=log_utils.log_fields(trade_id=signal['id'], symbol=symbol, stage="process_new_signals"))
+                else:
+                    logging.error(f"خطا در ثبت سفارش خرید برای {symbol}.")
+                    order_journal.record(signal['id'], MARK_ERROR, ("Failed to place buy order on Wallex", signal['id']))
+                    notifier.notify("error", signal['id'], "Failed to place buy order on Wallex")
+
+            except Exception as e:
+                logging.error(f"خطای پیش‌بینی نشده در process_new_signals برای ID {signal['id']}: {e}")
+                order_journal.record(signal['id'], MARK_ERROR, (str(e), signal['id']))
+                notifier.notify("error", signal['id'], str(e))
+
+    if not claimed:
+        logging.info("[مرحله ۱] هیچ سیگنال جدیدی برای اجرا یافت نشد.", extra=log_utils.log_fields("executor.new_signals.empty", stage="process_new_signals"))
 
 
 def check_filled_buys():
     """
     مرحله ۲: سفارشات 'BUY_ORDER_PLACED' را بررسی می‌کند.
     """
-    logging.info("[مرحله ۲] در حال بررسی وضعیت سفارشات خرید ثبت شده...")
-    orders = db_utils.query_db("SELECT id, buy_client_order_id FROM trade_signals WHERE status = 'BUY_ORDER_PLACED'", fetch='all')
-
-    if not orders:
-        logging.info("[مرحله ۲] هیچ سفارش خریدی در انتظار بررسی وضعیت نیست.")
-        return
-
-    for order in orders:
-        try:
-            wallex_order = wallex_api.get_wallex_order_status(order['buy_client_order_id'])
+    logging.debug("[مرحله ۲] در حال بررسی وضعیت سفارشات خرید ثبت شده...")
+    claimed = 0
+    for orders in order_journal.claimed_batches('BUY_ORDER_PLACED', "id, asset_name, buy_client_order_id"):
+        claimed += len(orders)
+
+        for order in orders:
+            try:
+                wallex_order = wallex_api.get_wallex_order_status(order['buy_client_order_id'])
             
-            # فیکس قبلی: تغییر از 'DONE' به 'FILLED'
-            if wallex_order and wallex_order.get("status") == 'FILLED':
-                logging.info(f"سفارش خرید {order['buy_client_order_id']} تکمیل (FILLED) شده است!")
+                # فیکس قبلی: تغییر از 'DONE' به 'FILLED'
+                if wallex_order and wallex_order.get("status") == 'FILLED':
+                    logging.info(f"سفارش خرید {order['buy_client_order_id']} تکمیل (FILLED) شده است!", extra=log_utils.log_fields(trade_id=order['id'], stage="check_filled_buys"))
                 
-                executed_qty_str = wallex_order.get("executedQty", "0")
-                fee_str = wallex_order.get("fee", "0")
+                    executed_qty_str = wallex_order.get("executedQty", "0")
+                    fee_str = wallex_order.get("fee", "0")
                 
-                # محاسبه مقدار خالص با دقت Decimal
-                executed_qty = Decimal(executed_qty_str)
-                fee = Decimal(fee_str)
-                net_quantity = executed_qty - fee
+                    # محاسبه مقدار خالص با دقت Decimal
+                    executed_qty = Decimal(executed_qty_str)
+                    fee = Decimal(fee_str)
+                    net_quantity = executed_qty - fee
                 
-                logging.info(f"مقدار اجرا شده: {executed_qty}, کارمزد: {fee}, مقدار خالص دریافتی: {net_quantity}")
+                    logging.debug(f"مقدار اجرا شده: {executed_qty}, کارمزد: {fee}, مقدار خالص دریافتی: {net_quantity}", extra=log_utils.log_fields(trade_id=order['id'], stage="check_filled_buys"))
                 
-                db_utils.query_db(
-                    "UPDATE trade_signals SET status = 'BUY_ORDER_FILLED', buy_executed_quantity = %s, buy_fee = %s WHERE id = %s",
-                    (net_quantity, fee, order['id'])
-                )
-            elif wallex_order:
-                logging.info(f"سفارش خرید {order['buy_client_order_id']} هنوز باز است (وضعیت: {wallex_order.get('status')}).")
-            else:
-                logging.warning(f"اطلاعاتی برای سفارش {order['buy_client_order_id']} از والکس دریافت نشد.")
-
-        except Exception as e:
-            logging.error(f"خطا در check_filled_buys برای ID {order['id']}: {e}")
-            db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = %s WHERE id = %s", (str(e), order['id']))
+                    order_journal.record(
+                        order['id'],
+                        MARK_BUY_FILLED,
+                        (net_quantity, fee, executed_price(wallex_order), db_utils.utcnow(), order['id'])
+                    )
+                    notifier.notify("buy_filled", order['id'], f"{order['asset_name']} {net_quantity}")
+                elif wallex_order:
+                    logging.info(f"سفارش خرید {order['buy_client_order_id']} هنوز باز است (وضعیت: {wallex_order.get('status')}).", extra=log_utils.log_fields("executor.buy_open", trade_id=order['id'], stage="check_filled_buys"))
+                else:
+                    logging.warning(f"اطلاعاتی برای سفارش {order['buy_client_order_id']} از والکس دریافت نشد.")
+
+            except Exception as e:
+                logging.error(f"خطا در check_filled_buys برای ID {order['id']}: {e}")
+                order_journal.record(order['id'], MARK_ERROR, (str(e), order['id']))
+                notifier.notify("error", order['id'], str(e))
+
+    if not claimed:
+        logging.info("[مرحله ۲] هیچ سفارش خریدی در انتظار بررسی وضعیت نیست.", extra=log_utils.log_fields("executor.buys.empty", stage="check_filled_buys"))
 
 
 def place_sell_orders():
     """
     مرحله ۳: رکوردهای 'BUY_ORDER_FILLED' را پیدا کرده و برای آن‌ها سفارش فروش ثبت می‌کند.
     """
-    logging.info("[مرحله ۳] در حال بررسی خریدهای تکمیل شده برای ثبت سفارش فروش...")
-    orders = db_utils.query_db("SELECT * FROM trade_signals WHERE status = 'BUY_ORDER_FILLED'", fetch='all')
-
-    if not orders:
-        logging.info("[مرحله ۳] هیچ خرید تکمیل شده‌ای برای فروش یافت نشد.")
-        return
-
-    for order in orders:
-        try:
-            quantity_to_sell_raw = order.get("buy_executed_quantity")
-            if not quantity_to_sell_raw or quantity_to_sell_raw <= 0:
-                logging.error(f"مقدار خالص برای فروش (ID: {order['id']}) نامعتبر است: {quantity_to_sell_raw}")
-                db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = 'Invalid net quantity for selling' WHERE id = %s", (order['id'],))
-                continue
-
-            symbol = f"{order['asset_name']}{config.TRADING['QUOTE_ASSET']}"
-            exit_price_raw = order['exit_price']
+    logging.debug("[مرحله ۳] در حال بررسی خریدهای تکمیل شده برای ثبت سفارش فروش...")
+    claimed = 0
+    for orders in order_journal.claimed_batches('BUY_ORDER_FILLED'):
+        claimed += len(orders)
+
+        for order in orders:
+            try:
+                quantity_to_sell_raw = order.get("buy_executed_quantity")
+                if not quantity_to_sell_raw or quantity_to_sell_raw <= 0:
+                    logging.error(f"مقدار خالص برای فروش (ID: {order['id']}) نامعتبر است: {quantity_to_sell_raw}")
+                    order_journal.record(order['id'], MARK_ERROR, ("Invalid net quantity for selling", order['id']))
+                    notifier.notify("error", order['id'], "Invalid net quantity for selling")
+                    continue
+
+                symbol = f"{order['asset_name']}{config.TRADING['QUOTE_ASSET']}"
+                exit_price_raw = order['exit_price']
             
-            # --- فیکس جدید: گرفتن هر دو قانون دقت اعشار ---
-            amount_precision = wallex_api.market_amount_precisions.get(symbol)
-            price_precision = wallex_api.market_price_precisions.get(symbol)
-
-            if amount_precision is None or price_precision is None:
-                logging.warning(f"قوانین دقت اعشار (amount یا price) برای نماد '{symbol}' (جهت فروش) یافت نشد.")
-                db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = %s WHERE id = %s", (f"Precision rules not found for {symbol} (sell)", order['id']))
-                continue
+                # --- فیکس جدید: گرفتن هر دو قانون دقت اعشار ---
+                amount_precision = wallex_api.market_amount_precisions.get(symbol)
+                price_precision = wallex_api.market_price_precisions.get(symbol)
+
+                if amount_precision is None or price_precision is None:
+                    logging.warning(f"قوانین دقت اعشار (amount یا price) برای نماد '{symbol}' (جهت فروش) یافت نشد.")
+                    order_journal.record(order['id'], MARK_ERROR, (f"Precision rules not found for {symbol} (sell)", order['id']))
+                    notifier.notify("error", order['id'], f"Precision rules not found for {symbol} (sell)")
+                    continue
                 
-            # --- فیکس جدید: گرد کردن مقدار فروش ---
-            formatted_quantity_to_sell = wallex_api.format_quantity(quantity_to_sell_raw, amount_precision)
-            logging.info(f"مقدار فروش برای {symbol}: {formatted_quantity_to_sell} (خام: {quantity_to_sell_raw})")
+                # --- فیکس جدید: گرد کردن مقدار فروش ---
+                formatted_quantity_to_sell = wallex_api.format_quantity(quantity_to_sell_raw, amount_precision)
+                logging.debug(f"مقدار فروش برای {symbol}: {formatted_quantity_to_sell} (خام: {quantity_to_sell_raw})", extra=log_utils.log_fields(trade_id=order['id'], symbol=symbol, stage="place_sell_orders"))
 
-            # --- فیکس جدید: گرد کردن قیمت فروش ---
-            formatted_exit_price = wallex_api.format_price(exit_price_raw, price_precision)
-            logging.info(f"قیمت فروش برای {symbol}: {formatted_exit_price} (خام: {exit_price_raw})")
+                # --- فیکس جدید: گرد کردن قیمت فروش ---
+                formatted_exit_price = wallex_api.format_price(exit_price_raw, price_precision)
+                logging.debug(f"قیمت فروش برای {symbol}: {formatted_exit_price} (خام: {exit_price_raw})", extra=log_utils.log_fields(trade_id=order['id'], symbol=symbol, stage="place_sell_orders"))
 
 
-            if formatted_quantity_to_sell <= 0:
-                logging.warning(f"مقدار فروش برای {symbol} پس از گرد کردن 0 شد. نادیده گرفته شد.")
-                db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = %s WHERE id = %s", (f"Sell quantity 0 after formatting (raw: {quantity_to_sell_raw})", order['id']))
-                continue
+                if formatted_quantity_to_sell <= 0:
+                    logging.warning(f"مقدار فروش برای {symbol} پس از گرد کردن 0 شد. نادیده گرفته شد.")
+                    order_journal.record(order['id'], MARK_ERROR, (f"Sell quantity 0 after formatting (raw: {quantity_to_sell_raw})", order['id']))
+                    notifier.notify("error", order['id'], f"Sell quantity 0 after formatting (raw: {quantity_to_sell_raw})")
+                    continue
             
-            if formatted_exit_price <= 0:
-                logging.warning(f"قیمت فروش برای {symbol} پس از گرد کردن 0 شد. نادیده گرفته شد.")
-                db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = %s WHERE id = %s", (f"Sell price 0 after formatting (raw: {exit_price_raw})", order['id']))
-                continue
-
-            # ثبت سفارش فروش با مقادیر و قیمت‌های گرد شده
-            sell_response = wallex_api.place_wallex_order(symbol, formatted_exit_price, formatted_quantity_to_sell, "sell")
+                if formatted_exit_price <= 0:
+                    logging.warning(f"قیمت فروش برای {symbol} پس از گرد کردن 0 شد. نادیده گرفته شد.")
+                    order_journal.record(order['id'], MARK_ERROR, (f"Sell price 0 after formatting (raw: {exit_price_raw})", order['id']))
+                    notifier.notify("error", order['id'], f"Sell price 0 after formatting (raw: {exit_price_raw})")
+                    continue
+
+                if not db_utils.renew_lease(order):
+                    logging.warning(f"اجاره سفارش {symbol} (ID: {order['id']}) منقضی شده و در اختیار اجراکننده دیگری است؛ سفارش فروش ثبت نشد.", extra=log_utils.log_fields(trade_id=order['id'], symbol=symbol, stage="place_sell_orders"))
+                    continue
+
+                # ثبت سفارش فروش با مقادیر و قیمت‌های گرد شده
+                sell_response = wallex_api.place_wallex_order(symbol, formatted_exit_price, formatted_quantity_to_sell, "sell")
             
-            if sell_response:
-                sell_order_id = sell_response.get("result", {}).get("clientOrderId")
-                db_utils.query_db(
-                    "UPDATE trade_signals SET status = 'SELL_ORDER_PLACED', sell_client_order_id = %s WHERE id = %s",
-                    (sell_order_id, order['id'])
-                )
-                logging.info(f"سفارش فروش برای {symbol} با ID: {sell_order_id} ثبت شد.")
-            else:
-                logging.error(f"خطا در ثبت سفارش فروش برای {symbol} (ID: {order['id']}).")
-                # وضعیت را تغییر نمی‌دهیم تا در چرخه بعدی دوباره تلاش شود
+                if sell_response:
+                    sell_order_id = sell_response.get("result", {}).get("clientOrderId")
+                    order_journal.record(
+                        order['id'],
+                        MARK_SELL_PLACED,
+                        (sell_order_id, db_utils.utcnow(), order['id'])
+                    )
+                    notifier.notify("sell_placed", order['id'], f"{symbol} {formatted_quantity_to_sell} @ {formatted_exit_price}")
+                    logging.info(f"سفارش فروش برای {symbol} با ID: {sell_order_id} ثبت شد.", extra=log_utils.log_fields(trade_id=order['id'], symbol=symbol, stage="place_sell_orders"))
+                else:
+                    logging.error(f"خطا در ثبت سفارش فروش برای {symbol} (ID: {order['id']}).")
+                    # وضعیت را تغییر نمی‌دهیم تا در چرخه بعدی دوباره تلاش شود
                 
-        except Exception as e:
-            logging.error(f"خطا در place_sell_orders برای ID {order['id']}: {e}")
-            db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = %s WHERE id = %s", (str(e), order['id']))
+            except Exception as e:
+                logging.error(f"خطا در place_sell_orders برای ID {order['id']}: {e}")
+                order_journal.record(order['id'], MARK_ERROR, (str(e), order['id']))
+                notifier.notify("error", order['id'], str(e))
+
+    if not claimed:
+        logging.info("[مرحله ۳] هیچ خرید تکمیل شده‌ای برای فروش یافت نشد.", extra=log_utils.log_fields("executor.sells_to_place.empty", stage="place_sell_orders"))
 
 
 def check_filled_sells():
     """
     مرحله ۴: سفارشات 'SELL_ORDER_PLACED' را بررسی می‌کند.
     """
-    logging.info("[مرحله ۴] در حال بررسی وضعیت سفارشات فروش ثبت شده...")
-    orders = db_utils.query_db("SELECT id, sell_client_order_id FROM trade_signals WHERE status = 'SELL_ORDER_PLACED'", fetch='all')
-
-    if not orders:
-        logging.info("[مرحله ۴] هیچ سفارش فروشی در انتظار بررسی وضعیت نیست.")
-        return
-
-    for order in orders:
-        try:
-            wallex_order = wallex_api.get_wallex_order_status(order['sell_client_order_id'])
+    logging.debug("[مرحله ۴] در حال بررسی وضعیت سفارشات فروش ثبت شده...")
+    claimed = 0
+    for orders in order_journal.claimed_batches('SELL_ORDER_PLACED', "id, asset_name, sell_client_order_id"):
+        claimed += len(orders)
+
+        for order in orders:
+            try:
+                wallex_order = wallex_api.get_wallex_order_status(order['sell_client_order_id'])
             
-            # فیکس قبلی: تغییر از 'DONE' به 'FILLED'
-            if wallex_order and wallex_order.get("status") == 'FILLED':
-                logging.info(f"سفارش فروش {order['sell_client_order_id']} تکمیل (FILLED) شده است!")
+                # فیکس قبلی: تغییر از 'DONE' به 'FILLED'
+                if wallex_order and wallex_order.get("status") == 'FILLED':
+                    logging.info(f"سفارش فروش {order['sell_client_order_id']} تکمیل (FILLED) شده است!", extra=log_utils.log_fields(trade_id=order['id'], stage="check_filled_sells"))
                 
-                executed_qty = Decimal(wallex_order.get("executedQty", "0"))
-                fee = Decimal(wallex_order.get("fee", "0"))
+                    executed_qty = Decimal(wallex_order.get("executedQty", "0"))
+                    fee = Decimal(wallex_order.get("fee", "0"))
                 
-                db_utils.query_db(
-                    "UPDATE trade_signals SET status = 'SELL_ORDER_FILLED', sell_executed_quantity = %s, sell_fee = %s, notes = 'Trade completed successfully' WHERE id = %s",
-                    (executed_qty, fee, order['id'])
-                )
-                logging.info(f"--- چرخه معامله برای ID {order['id']} با موفقیت بسته شد ---")
+                    order_journal.record(
+                        order['id'],
+                        MARK_SOLD,
+                        (executed_qty, fee, executed_price(wallex_order), db_utils.utcnow(), order['id'])
+                    )
+                    notifier.notify("sold", order['id'], f"{order['asset_name']} {executed_qty}")
+                    logging.info(f"--- چرخه معامله برای ID {order['id']} با موفقیت بسته شد ---", extra=log_utils.log_fields(trade_id=order['id'], stage="check_filled_sells"))
             
-            elif wallex_order:
-                logging.info(f"سفارش فروش {order['sell_client_order_id']} هنوز باز است (وضعیت: {wallex_order.get('status')}).")
-            else:
-                logging.warning(f"اطلاعاتی برای سفارش فروش {order['sell_client_order_id']} از والکس دریافت نشد.")
+                elif wallex_order:
+                    logging.info(f"سفارش فروش {order['sell_client_order_id']} هنوز باز است (وضعیت: {wallex_order.get('status')}).", extra=log_utils.log_fields("executor.sell_open", trade_id=order['id'], stage="check_filled_sells"))
+                else:
+                    logging.warning(f"اطلاعاتی برای سفارش فروش {order['sell_client_order_id']} از والکس دریافت نشد.")
                 
-        except Exception as e:
-            logging.error(f"خطا در check_filled_sells برای ID {order['id']}: {e}")
-            db_utils.query_db("UPDATE trade_signals SET status = 'ERROR', notes = %s WHERE id = %s", (str(e), order['id']))
+            except Exception as e:
+                logging.error(f"خطا در check_filled_sells برای ID {order['id']}: {e}")
+                order_journal.record(order['id'], MARK_ERROR, (str(e), order['id']))
+                notifier.notify("error", order['id'], str(e))
+
+    if not claimed:
+        logging.info("[مرحله ۴] هیچ سفارش فروشی در انتظار بررسی وضعیت نیست.", extra=log_utils.log_fields("executor.sells.empty", stage="check_filled_sells"))
+
+
+# مراحل مجری سفارش به ترتیب اجرا
+EXECUTOR_STAGES = (process_new_signals, check_filled_buys, place_sell_orders, check_filled_sells)
+
+
+def record_open_orders():
+    """تعداد سفارشات باز (غیر نهایی) را به تفکیک وضعیت در متریک‌ها ثبت می‌کند."""
+    placeholders = ", ".join(["%s"] * len(db_utils.TERMINAL_STATUSES))
+    rows = db_utils.query_db(
+        f"SELECT status, COUNT(*) AS count FROM trade_signals WHERE status NOT IN ({placeholders}) GROUP BY status",
+        db_utils.TERMINAL_STATUSES,
+        fetch='all'
+    )
+    if rows is not None:
+        metrics.OPEN_ORDERS.replace_all({row['status']: row['count'] for row in rows})
+
+
+def run_executor_cycle():
+    """یک چرخه کامل مجری سفارش: اجرای ۴ مرحله به ترتیب و ثبت متریک سفارشات باز."""
+    for stage in EXECUTOR_STAGES:
+        with metrics.timed(metrics.EXECUTOR_STAGE_SECONDS, stage=stage.__name__):
+            stage()
+    record_open_orders()
 
 
 def main_executor_loop():
@@ -239,18 +350,17 @@ def main_executor_loop():
         logging.critical("امکان بارگذاری قوانین بازار وجود ندارد. مجری سفارش متوقف شد.")
         return
 
+    loop_timer = metrics.LoopTimer("executor", config.BOT["ORDER_MANAGEMENT_INTERVAL_SECONDS"])
     while True:
+        loop_timer.tick()
         try:
-            # اجرای ۴ مرحله به ترتیب
-            process_new_signals()
-            check_filled_buys()
-            place_sell_orders()
-            check_filled_sells()
+            with profiler.profile_cycle("executor"):
+                run_executor_cycle()
             
         except Exception as e:
             logging.critical(f"خطای بحرانی در حلقه اصلی مجری سفارش: {e}")
             
-        logging.info(f"--- پایان چرخه اجرا. خواب به مدت {config.BOT['ORDER_MANAGEMENT_INTERVAL_SECONDS']} ثانیه... ---")
+        logging.info(f"--- پایان چرخه اجرا. خواب به مدت {config.BOT['ORDER_MANAGEMENT_INTERVAL_SECONDS']} ثانیه... ---", extra=log_utils.log_fields("executor.sleep"))
         time.sleep(config.BOT["ORDER_MANAGEMENT_INTERVAL_SECONDS"])
 
 
@@ -0,0 +1,333 @@
+# order_journal.py
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+import config
+import db_utils
+import log_utils
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    # ویندوز: قفل فایل در دسترس نیست
+    fcntl = None
+
+# دفترچه پیش‌نویس (Write-Ahead Journal) تغییر وضعیت سفارش‌ها.
+# هر تغییر وضعیت ابتدا به یک فایل محلی اضافه و fsync می‌شود و سپس یک رشته پس‌زمینه
+# تغییرات را دسته‌ای و در یک تراکنش به MySQL می‌برد. اگر MySQL در دسترس نباشد، تغییرات در
+# دفترچه می‌مانند (و پس از ری‌استارت دوباره اجرا می‌شوند)؛ هرگز سفارشی که در والکس ثبت شده گم نمی‌شود.
+#
+# ردیف‌هایی که تغییر اعمال نشده دارند "در انتظار" هستند: مراحل مجری سفارش و پاکسازی آن‌ها را
+# برنمی‌دارند (وضعیت دیتابیس‌شان قدیمی است) و اجاره‌شان هم از طریق همین دفترچه و پس از
+# اعمال تغییر آزاد می‌شود تا اجراکننده دیگری زودتر آن‌ها را برندارد.
+#
+# دفترچه با قفل انحصاری (flock) باز می‌شود و همیشه پیش از اولین ورودی جدید بارگذاری می‌شود؛
+# پس ورودی‌های یک اجرای قبلی هرگز بدون اعمال پاک نمی‌شوند. پردازه دیگری که همزمان اجرا شود
+# (مثلاً order_executor.py یا cleanup_manager.py به صورت مستقل) مانند دفترچه غیرفعال مستقیماً می‌نویسد.
+
+JOURNAL_PENDING = metrics.Gauge(
+    "order_journal_pending_entries", "Journaled order transitions not yet applied to MySQL")
+JOURNAL_FLUSH_SECONDS = metrics.Histogram(
+    "order_journal_flush_seconds", "Time to apply one batch of journaled transitions")
+
+_lock = threading.Lock()
+# جلوگیری از اجرای همزمان دو flush (رشته پس‌زمینه و flush مستقیم)
+_flush_lock = threading.Lock()
+_wakeup = threading.Event()
+_file = None
+_seq = 0
+# ورودی‌های اعمال نشده به ترتیب ثبت
+_unflushed = []
+# {trade_id: تعداد ورودی‌های اعمال نشده}
+_pending = {}
+_started = False
+# دفترچه در اختیار پردازه دیگری است
+_busy = False
+# آخرین flush به خاطر قطعی یا خطای گذرای دیتابیس ناتمام ماند
+_recovering = False
+
+
+def _encode(value):
+    if isinstance(value, Decimal):
+        return {"$d": str(value)}
+    if isinstance(value, datetime):
+        return {"$t": value.isoformat()}
+    raise TypeError(f"{type(value).__name__} قابل ذخیره در دفترچه نیست")
+
+
+def _decode(obj):
+    if "$d" in obj:
+        return Decimal(obj["$d"])
+    if "$t" in obj:
+        return datetime.fromisoformat(obj["$t"])
+    return obj
+
+
+def _write_line(entry):
+    """یک خط به دفترچه اضافه و تا دیسک fsync می‌کند (باید داخل _lock فراخوانی شود)."""
+    _file.write(json.dumps(entry, separators=(",", ":"), default=_encode) + "\n")
+    _file.flush()
+    os.fsync(_file.fileno())
+
+
+def _open():
+    """
+    دفترچه را با قفل انحصاری باز و ورودی‌های اعمال نشده قبلی را بارگذاری می‌کند (داخل _lock).
+    :return: تعداد ورودی‌های بازیابی شده، یا None اگر دفترچه در اختیار پردازه دیگری باشد
+    """
+    global _file, _busy
+    path = config.JOURNAL.get("PATH", "journal/order_journal.jsonl")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    journal = open(path, "a+", encoding="utf-8")
+    if fcntl is not None:
+        try:
+            fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            journal.close()
+            _busy = True
+            logging.error(f"دفترچه سفارش‌ها ({path}) در اختیار پردازه دیگری است؛ تغییرات این پردازه مستقیماً در دیتابیس نوشته می‌شوند.")
+            return None
+    _file = journal
+    return _load()
+
+
+def _ensure_open():
+    """:return: True اگر دفترچه باز (و بارگذاری شده) است و این پردازه می‌تواند در آن بنویسد"""
+    with _lock:
+        if _file is None and not _busy:
+            _open()
+        return _file is not None
+
+
+def _load():
+    """
+    ورودی‌های اعمال نشده را از دفترچه (پس از ری‌استارت) بارگذاری می‌کند.
+    خطوط {"flushed": seq} نشان می‌دهند همه ورودی‌ها تا آن شماره در دیتابیس اعمال شده‌اند.
+    """
+    global _seq
+    _file.seek(0)
+    entries = []
+    flushed = 0
+    for line in _file:
+        try:
+            entry = json.loads(line, object_hook=_decode)
+        except ValueError:
+            # خط ناقص (توقف ناگهانی هنگام نوشتن)؛ چون fsync نشده، تغییر آن هنوز اجرا نشده بود
+            logging.warning("یک خط ناقص در دفترچه سفارش‌ها نادیده گرفته شد.")
+            continue
+        if "flushed" in entry:
+            flushed = max(flushed, entry["flushed"])
+        else:
+            entries.append(entry)
+            _seq = max(_seq, entry["seq"])
+    for entry in entries:
+        if entry["seq"] > flushed:
+            _add_unflushed(entry)
+    _file.seek(0, os.SEEK_END)
+    return len(_unflushed)
+
+
+def _add_unflushed(entry):
+    _unflushed.append(entry)
+    for trade_id in entry["ids"]:
+        _pending[trade_id] = _pending.get(trade_id, 0) + 1
+    JOURNAL_PENDING.set(len(_unflushed))
+
+
+def _append(ids, query, params):
+    global _seq
+    with _lock:
+        _seq += 1
+        entry = {"seq": _seq, "ids": list(ids), "query": query, "params": list(params)}
+        _write_line(entry)
+        _add_unflushed(entry)
+        batch_full = len(_unflushed) >= config.JOURNAL.get("FLUSH_BATCH_SIZE", 200)
+    if not _started:
+        # بدون رشته پس‌زمینه (اجرای مستقل ماژول‌ها) تغییر بلافاصله اعمال می‌شود
+        flush()
+    elif batch_full:
+        _wakeup.set()
+
+
+def record(trade_id, query, params):
+    """
+    یک تغییر وضعیت ردیف trade_id را ثبت می‌کند.
+    با دفترچه غیرفعال (یا در اختیار پردازه دیگر)، مستقیماً با query_db اجرا می‌شود (رفتار قبلی).
+    """
+    if not config.JOURNAL.get("ENABLED") or not _ensure_open():
+        return db_utils.query_db(query, params)
+    _append((trade_id,), query, params)
+    return True
+
+
+def release_rows(lease_owner, row_ids):
+    """
+    اجاره ردیف‌ها را آزاد می‌کند: ردیف‌های بدون تغییر در انتظار بلافاصله، و بقیه از طریق
+    دفترچه (پس از اعمال تغییر وضعیتشان). برای db_utils.claimed_rows(release=...).
+    """
+    with _lock:
+        pending = [row_id for row_id in row_ids if row_id in _pending]
+    direct = [row_id for row_id in row_ids if row_id not in pending]
+    if direct:
+        db_utils.release_rows(lease_owner, direct)
+    if pending:
+        query, params = db_utils.release_statement(lease_owner, pending)
+        _append(pending, query, params)
+
+
+def pending_ids():
+    """شناسه ردیف‌هایی که تغییر اعمال نشده دارند (مراحل باید آن‌ها را برندارند)."""
+    with _lock:
+        return tuple(_pending)
+
+
+def claimed_rows(status, columns="*", extra_where="", extra_params=()):
+    """
+    مانند db_utils.claimed_rows، با این تفاوت که ردیف‌های دارای تغییر در انتظار برداشته نمی‌شوند
+    و اجاره‌ها از طریق دفترچه آزاد می‌شوند.
+    """
+    if config.JOURNAL.get("ENABLED") and _ensure_open() and not _started:
+        # اجرای مستقل: ورودی‌های بازیابی شده اجرای قبلی پیش از برداشت ردیف‌ها اعمال می‌شوند
+        flush()
+    return db_utils.claimed_rows(
+        status, columns, extra_where, extra_params, exclude_ids=pending_ids(), release=release_rows)
+
+
+def claimed_batches(status, columns="*", extra_where="", extra_params=()):
+    """
+    همه ردیف‌های آزاد یک وضعیت را دسته به دسته (هر دسته CLAIM_BATCH_SIZE ردیف) اجاره می‌کند تا برداشت
+    خالی برگردد؛ هر دسته پس از پردازش آزاد می‌شود. هر دسته فقط ردیف‌هایی با id بزرگ‌تر از دسته قبلی را
+    برمی‌دارد، پس ردیف‌هایی که در این چرخه پردازش شده‌اند (و وضعیتشان تغییر نکرده) دوباره برداشته نمی‌شوند
+    و همه سفارش‌های باز در هر چرخه بررسی می‌شوند، نه فقط CLAIM_BATCH_SIZE ردیف اول.
+    """
+    last_id = 0
+    while True:
+        with claimed_rows(status, columns, f"{extra_where} AND id > %s", (*extra_params, last_id)) as rows:
+            if not rows:
+                return
+            yield rows
+            last_id = max(row['id'] for row in rows)
+
+
+def _mark_flushed(batch):
+    """ورودی‌های اعمال شده را از حافظه حذف و در دفترچه علامت می‌زند؛ دفترچه خالی کوتاه می‌شود."""
+    with _lock:
+        del _unflushed[:len(batch)]
+        for entry in batch:
+            for trade_id in entry["ids"]:
+                _pending[trade_id] -= 1
+                if not _pending[trade_id]:
+                    del _pending[trade_id]
+        if _unflushed:
+            _write_line({"flushed": batch[-1]["seq"]})
+        else:
+            # همه چیز اعمال شده است؛ دفترچه از نو شروع می‌شود
+            _file.seek(0)
+            _file.truncate()
+            _file.flush()
+            os.fsync(_file.fileno())
+        JOURNAL_PENDING.set(len(_unflushed))
+
+
+def _apply_individually(batch):
+    """
+    وقتی تراکنش دسته‌ای شکست خورده ولی دیتابیس در دسترس است، یک دستور معیوب نباید دفترچه را
+    برای همیشه متوقف کند: ورودی‌ها تک به تک اعمال و ورودی‌هایی که با خطای دائمی (نحو، داده)
+    شکست می‌خورند لاگ و کنار گذاشته می‌شوند. با خطای گذرا (قطع اتصال، بن‌بست، انتظار قفل)
+    متوقف می‌شود و بقیه ورودی‌ها برای flush بعدی در دفترچه می‌مانند.
+    :return: تعداد ورودی‌های ابتدای دسته که اعمال یا کنار گذاشته شدند
+    """
+    for handled, entry in enumerate(batch):
+        try:
+            if db_utils.execute_statement(entry["query"], entry["params"]) is None:
+                return handled
+        except db_utils.DB_ERRORS as e:
+            if db_utils.is_retryable_error(e):
+                logging.warning(f"ورودی {entry['seq']} دفترچه سفارش‌ها (ID: {entry['ids']}) با خطای گذرا اعمال نشد و در دفترچه می‌ماند: {e}", extra=log_utils.log_fields("journal.retry"))
+                return handled
+            logging.error(f"ورودی {entry['seq']} دفترچه سفارش‌ها (ID: {entry['ids']}) اعمال نشد و کنار گذاشته شد: {e} | {entry['query']} | {entry['params']}")
+    return len(batch)
+
+
+def flush():
+    """
+    ورودی‌های اعمال نشده را دسته به دسته (هر دسته در یک تراکنش) به دیتابیس می‌برد.
+    پس از قطعی دیتابیس، پیش از اعمال ورودی‌ها اجاره ردیف‌های در انتظار تمدید می‌شود: اجاره آن‌ها
+    ممکن است در طول قطعی منقضی شده باشد و ردیفی مثل NEW_SIGNAL (که سفارشش در والکس ثبت شده)
+    نباید توسط اجراکننده دیگری دوباره برداشته شود.
+    :return: تعداد ورودی‌های اعمال شده
+    """
+    global _recovering
+    applied = 0
+    batch_size = config.JOURNAL.get("FLUSH_BATCH_SIZE", 200)
+    with _flush_lock:
+        if _recovering and _pending:
+            if not db_utils.database_available():
+                logging.warning(f"دیتابیس در دسترس نیست؛ {len(_unflushed)} تغییر در دفترچه سفارش‌ها منتظر می‌مانند.", extra=log_utils.log_fields("journal.db_down"))
+                return applied
+            db_utils.extend_leases(pending_ids())
+        while True:
+            with _lock:
+                batch = list(_unflushed[:batch_size])
+            if not batch:
+                _recovering = False
+                return applied
+            started = time.perf_counter()
+            result = db_utils.run_in_transaction([(entry["query"], entry["params"]) for entry in batch])
+            if result is None:
+                if not db_utils.database_available():
+                    logging.warning(f"دیتابیس در دسترس نیست؛ {len(_unflushed)} تغییر در دفترچه سفارش‌ها منتظر می‌مانند.", extra=log_utils.log_fields("journal.db_down"))
+                    _recovering = True
+                    return applied
+                handled = _apply_individually(batch)
+                if handled < len(batch):
+                    _recovering = True
+                    JOURNAL_FLUSH_SECONDS.observe(time.perf_counter() - started)
+                    if handled:
+                        _mark_flushed(batch[:handled])
+                    return applied + handled
+            JOURNAL_FLUSH_SECONDS.observe(time.perf_counter() - started)
+            _mark_flushed(batch)
+            applied += len(batch)
+
+
+def _flush_loop():
+    interval = config.JOURNAL.get("FLUSH_INTERVAL_SECONDS", 1)
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception as e:
+            logging.error(f"خطای پیش‌بینی نشده در flush دفترچه سفارش‌ها: {e}")
+
+
+def start_journal():
+    """
+    دفترچه را باز، ورودی‌های اعمال نشده قبلی را دوباره اجرا و رشته flush را راه‌اندازی می‌کند.
+    باید پیش از شروع حلقه‌های مجری سفارش و پاکسازی فراخوانی شود.
+    """
+    global _started
+    if not config.JOURNAL.get("ENABLED") or _started:
+        return False
+    with _lock:
+        if _file is not None:
+            # قبلاً (با اولین ورودی) باز و بارگذاری شده است
+            recovered = len(_unflushed)
+        elif _busy:
+            return False
+        else:
+            recovered = _open()
+    if recovered is None:
+        return False
+    if recovered:
+        logging.warning(f"{recovered} تغییر وضعیت اعمال نشده از دفترچه سفارش‌ها بازیابی شد. در حال اعمال...")
+        flush()
+    threading.Thread(target=_flush_loop, name="OrderJournal", daemon=True).start()
+    _started = True
+    return True
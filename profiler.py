@@ -0,0 +1,229 @@
+# profiler.py
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+import config
+
+# حلقه‌هایی که قابل پروفایل هستند (نام‌ها همان نام‌های LoopTimer در metrics هستند)
+LOOPS = ("executor", "cleanup", "ingestor", "archiver")
+
+_lock = threading.Lock()
+# درخواست‌های در انتظار: {نام حلقه: تعداد چرخه}
+_pending = {}
+# ضبط‌های فعال: {نام حلقه: _Capture}
+_active = {}
+
+
+class _Capture:
+    """
+    ضبط پروفایل یک حلقه برای N چرخه:
+    cProfile برای زمان هر تابع و نمونه‌برداری از پشته رشته برای خروجی flamegraph.
+    در هر لحظه فقط یک ضبط از cProfile استفاده می‌کند (در پایتون 3.12+ فعال کردن پروفایلر دوم
+    ValueError می‌دهد)؛ بقیه حلقه‌ها (مثلاً با 'profile all') فقط نمونه‌برداری می‌شوند.
+    """
+
+    def __init__(self, loop_name, cycles, use_cprofile=True):
+        self.loop_name = loop_name
+        self.cycles_left = cycles
+        self.cycles_total = cycles
+        self.profile = cProfile.Profile() if use_cprofile else None
+        self.stacks = Counter()
+        self.thread_id = threading.get_ident()
+        self.in_cycle = threading.Event()
+        self.stopped = threading.Event()
+        self.started_at = time.time()
+        self.sampler = threading.Thread(target=self._sample, name=f"Profiler-{loop_name}", daemon=True)
+        self.sampler.start()
+
+    def _sample(self):
+        interval = config.PROFILING.get("SAMPLE_INTERVAL_SECONDS", 0.005)
+        while not self.stopped.is_set():
+            if self.in_cycle.wait(timeout=0.5):
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    self.stacks[_collapse(frame)] += 1
+                time.sleep(interval)
+
+    def write(self):
+        """خروجی‌ها را در پوشه تنظیم شده می‌نویسد و مسیر پایه فایل‌ها را برمی‌گرداند."""
+        output_dir = config.PROFILING.get("OUTPUT_DIR", "profiles")
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(output_dir, f"{self.loop_name}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))}")
+
+        text = io.StringIO()
+        if self.profile is not None:
+            # ۱. آمار خام cProfile (قابل باز کردن با pstats یا snakeviz)
+            self.profile.dump_stats(base + ".pstats")
+
+            # ۲. خلاصه متنی زمان هر تابع
+            stats = pstats.Stats(self.profile, stream=text)
+            stats.sort_stats("cumulative").print_stats(config.PROFILING.get("TOP_FUNCTIONS", 40))
+        else:
+            text.write("cProfile در اختیار حلقه دیگری بود؛ فقط پشته‌های نمونه‌برداری شده (.collapsed) ضبط شدند.\n")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(f"loop={self.loop_name} cycles={self.cycles_total}\n")
+            f.write(text.getvalue())
+
+        # ۳. پشته‌های فشرده (collapsed) برای flamegraph.pl / speedscope
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return base
+
+
+def _collapse(frame):
+    """پشته یک فریم را به قالب collapsed تبدیل می‌کند: ریشه;...;برگ"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def request_profile(loop_name, cycles=None):
+    """
+    ضبط پروفایل را برای N چرخه بعدی یک حلقه (یا همه حلقه‌ها با 'all') درخواست می‌کند.
+    :return: پیام نتیجه برای نمایش به اپراتور
+    """
+    try:
+        cycles = int(cycles or config.PROFILING.get("DEFAULT_CYCLES", 10))
+    except ValueError:
+        return f"تعداد چرخه نامعتبر: {cycles}"
+    if cycles <= 0:
+        return f"تعداد چرخه باید مثبت باشد: {cycles}"
+    names = LOOPS if loop_name == "all" else (loop_name,)
+    for name in names:
+        if name not in LOOPS:
+            return f"حلقه ناشناخته: {name}. حلقه‌های موجود: {', '.join(LOOPS)}, all"
+    with _lock:
+        for name in names:
+            if name not in _active:
+                _pending[name] = cycles
+    logging.warning(f"پروفایل برای {cycles} چرخه از حلقه(های) {', '.join(names)} درخواست شد.")
+    return f"OK: {', '.join(names)} x {cycles} cycles"
+
+
+def status():
+    """وضعیت درخواست‌ها و ضبط‌های فعال."""
+    with _lock:
+        pending = dict(_pending)
+        active = {name: capture.cycles_left for name, capture in _active.items()}
+    return f"pending={pending} active={active}"
+
+
+@contextmanager
+def profile_cycle(loop_name):
+    """
+    یک چرخه حلقه را در صورت درخواست پروفایل می‌کند؛ در غیر این صورت تقریباً هزینه‌ای ندارد.
+    استفاده: with profiler.profile_cycle("executor"): run_executor_cycle()
+    """
+    capture = _active.get(loop_name)
+    if capture is None and loop_name in _pending:
+        with _lock:
+            cycles = _pending.pop(loop_name, None)
+            if cycles:
+                use_cprofile = all(active.profile is None for active in _active.values())
+                capture = _active[loop_name] = _Capture(loop_name, cycles, use_cprofile)
+    if capture is None:
+        yield
+        return
+
+    if capture.profile is not None:
+        try:
+            capture.profile.enable()
+        except ValueError as e:
+            # پایتون 3.12+: ابزار پروفایل دیگری (مثلاً یک دیباگر) فعال است؛ چرخه بدون پروفایل اجرا می‌شود
+            logging.error(f"امکان فعال کردن cProfile برای حلقه {loop_name} وجود ندارد و ضبط لغو شد: {e}")
+            _drop(capture)
+            yield
+            return
+
+    capture.in_cycle.set()
+    try:
+        yield
+    finally:
+        if capture.profile is not None:
+            capture.profile.disable()
+        capture.in_cycle.clear()
+        capture.cycles_left -= 1
+        if capture.cycles_left <= 0:
+            _finish(capture)
+
+
+def _drop(capture):
+    capture.stopped.set()
+    with _lock:
+        _active.pop(capture.loop_name, None)
+
+
+def _finish(capture):
+    _drop(capture)
+    try:
+        base = capture.write()
+        extensions = "txt|pstats|collapsed" if capture.profile is not None else "txt|collapsed"
+        logging.warning(f"پروفایل حلقه {capture.loop_name} ذخیره شد: {base}.({extensions})")
+    except OSError as e:
+        logging.error(f"خطا در ذخیره خروجی پروفایل حلقه {capture.loop_name}: {e}")
+
+
+# ==============================================================================
+# راه‌های فعال‌سازی: سیگنال سیستم‌عامل و سوکت کنترل محلی
+# ==============================================================================
+
+def install_signal_handler():
+    """
+    SIGUSR1 را به پروفایل همه حلقه‌ها برای DEFAULT_CYCLES چرخه متصل می‌کند.
+    فقط از رشته اصلی قابل فراخوانی است؛ روی ویندوز SIGUSR1 وجود ندارد.
+    """
+    if not hasattr(signal, "SIGUSR1"):
+        logging.info("SIGUSR1 روی این سیستم‌عامل پشتیبانی نمی‌شود؛ فقط سوکت کنترل فعال است.")
+        return False
+    signal.signal(signal.SIGUSR1, lambda signum, frame: request_profile("all"))
+    return True
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    """
+    پروتکل متنی یک خطی:
+        profile <executor|cleanup|ingestor|archiver|all> [cycles]
+        status
+    """
+
+    def handle(self):
+        line = self.rfile.readline(1024).decode("utf-8", errors="replace").strip()
+        parts = line.split()
+        if parts and parts[0] == "profile" and len(parts) in (2, 3):
+            reply = request_profile(parts[1], parts[2] if len(parts) == 3 else None)
+        elif parts == ["status"]:
+            reply = status()
+        else:
+            reply = "usage: profile <executor|cleanup|ingestor|archiver|all> [cycles] | status"
+        self.wfile.write((reply + "\n").encode("utf-8"))
+
+
+def start_control_server(host=None, port=None):
+    """
+    سوکت کنترل پروفایلر را روی localhost در یک رشته پس‌زمینه راه‌اندازی می‌کند.
+    مثال: echo "profile executor 20" | nc 127.0.0.1 9109
+    """
+    host = host or config.PROFILING.get("CONTROL_HOST", "127.0.0.1")
+    port = port if port is not None else config.PROFILING.get("CONTROL_PORT", 9109)
+    try:
+        server = socketserver.ThreadingTCPServer((host, port), _ControlHandler)
+    except OSError as e:
+        logging.error(f"امکان راه‌اندازی سوکت کنترل پروفایلر روی {host}:{port} وجود ندارد: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ProfilerControl", daemon=True).start()
+    logging.info(f"سوکت کنترل پروفایلر روی {host}:{server.server_address[1]} فعال شد.")
+    return server
@@ -0,0 +1,236 @@
+# replay.py
+import argparse
+import glob
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+import config
+import db_utils
+import log_utils
+import order_executor
+import signal_ingestor
+import cleanup_manager
+import signal_recorder
+from simulated_exchange import SimulatedExchange, RandomFillModel
+
+# تنظیمات لاگ‌گیری
+log_utils.setup_logging()
+
+# اجرای دوباره (Replay/Backtest) سیگنال‌های ضبط شده توسط signal_recorder:
+# سیگنال‌ها با زمان ضبط شده از همان ingest_signals، run_executor_cycle و cleanup_stale_orders
+# واقعی عبور می‌کنند، اما در برابر یک صرافی شبیه‌سازی شده و با یک ساعت شبیه‌سازی شده.
+# ساعت بین رویدادها پرش می‌کند (بدون خواب)، پس یک روز سیگنال در چند ثانیه اجرا می‌شود.
+#
+# اجرا:
+#     python replay.py recordings/signals-20261018.jsonl --buy-fill-rate 0.7 --max-fill-delay 240
+#
+# به صورت پیش‌فرض روی یک فایل SQLite موقت و بدون نیاز به MySQL اجرا می‌شود (--backend mysql برای MySQL).
+# جدول trade_signals دیتابیس replay در شروع پاک می‌شود.
+
+QUOTE = config.TRADING["QUOTE_ASSET"]
+
+
+class SimulatedClock:
+    """ساعتی که به جای db_utils.utcnow نصب می‌شود و فقط با advance_to جلو می‌رود."""
+
+    def __init__(self, start):
+        self._now = start
+        self._original = None
+
+    def now(self):
+        return self._now
+
+    def advance_to(self, moment):
+        self._now = max(self._now, moment)
+
+    def install(self):
+        self._original = db_utils.utcnow
+        db_utils.utcnow = self.now
+        return self
+
+    def uninstall(self):
+        if self._original is not None:
+            db_utils.utcnow = self._original
+            self._original = None
+
+
+def _utc(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _precisions(events, amount_precision, price_precision):
+    """برای همه نمادهای ضبط شده قوانین دقت اعشار یکسانی می‌سازد."""
+    symbols = {f"{opportunity.get('asset_name')}{QUOTE}" for _, _, opportunities in events for opportunity in opportunities}
+    return {symbol: amount_precision for symbol in symbols}, {symbol: price_precision for symbol in symbols}
+
+
+def _open_orders():
+    placeholders = ", ".join(["%s"] * len(db_utils.TERMINAL_STATUSES))
+    row = db_utils.query_db(
+        f"SELECT COUNT(*) AS count FROM trade_signals WHERE status NOT IN ({placeholders})",
+        db_utils.TERMINAL_STATUSES, fetch='one')
+    return row['count'] if row else 0
+
+
+def run_replay(events, clock, drain_minutes):
+    """
+    رویدادهای ضبط شده را با ساعت شبیه‌سازی شده اجرا می‌کند.
+    مجری سفارش و پاکسازی با همان فاصله‌های config.BOT اجرا می‌شوند؛ پس از آخرین سیگنال تا
+    'drain_minutes' دقیقه (یا تا بسته شدن همه معاملات) ادامه می‌دهد.
+    :return: آمار سیگنال‌ها
+    """
+    executor_interval = timedelta(seconds=config.BOT["ORDER_MANAGEMENT_INTERVAL_SECONDS"])
+    cleanup_interval = timedelta(seconds=config.BOT["CLEANUP_INTERVAL_SECONDS"])
+    next_executor = next_cleanup = clock.now()
+    end = _utc(events[-1][0]) + timedelta(minutes=drain_minutes)
+    stats = {"opportunities": 0, "ingested": 0, "executor_cycles": 0, "cleanup_cycles": 0}
+
+    index = 0
+    clock.install()
+    try:
+        while clock.now() <= end:
+            now = clock.now()
+            while index < len(events) and _utc(events[index][0]) <= now:
+                received_at, _, opportunities = events[index]
+                stats["opportunities"] += len(opportunities)
+                stats["ingested"] += signal_ingestor.ingest_signals(opportunities, received_at=_utc(received_at))
+                index += 1
+            if now >= next_executor:
+                order_executor.run_executor_cycle()
+                stats["executor_cycles"] += 1
+                next_executor = now + executor_interval
+            if now >= next_cleanup:
+                cleanup_manager.cleanup_stale_orders()
+                stats["cleanup_cycles"] += 1
+                next_cleanup = now + cleanup_interval
+            if index == len(events) and _open_orders() == 0:
+                break
+
+            upcoming = [next_executor, next_cleanup]
+            if index < len(events):
+                upcoming.append(_utc(events[index][0]))
+            clock.advance_to(min(upcoming))
+    finally:
+        clock.uninstall()
+    stats["simulated_seconds"] = (clock.now() - _utc(events[0][0])).total_seconds()
+    return stats
+
+
+def build_report(stats):
+    """نرخ پر شدن و سود/زیان را از ردیف‌های trade_signals دیتابیس replay محاسبه می‌کند."""
+    counts = db_utils.query_db(
+        "SELECT COUNT(buy_placed_at) AS buy_placed, COUNT(buy_filled_at) AS buy_filled, "
+        "COUNT(sell_placed_at) AS sell_placed, COUNT(sell_filled_at) AS sell_filled, COUNT(canceled_at) AS canceled "
+        "FROM trade_signals",
+        fetch='one'
+    ) or {}
+    by_status = db_utils.query_db(
+        "SELECT status, COUNT(*) AS count FROM trade_signals GROUP BY status", fetch='all') or []
+    filled = db_utils.query_db(
+        "SELECT strategy_name, entry_price, buy_limit_price, exit_price, buy_quantity_formatted, sell_executed_quantity, sell_fee "
+        "FROM trade_signals WHERE status = 'SELL_ORDER_FILLED'",
+        fetch='all'
+    ) or []
+
+    pnl_by_strategy = {}
+    for row in filled:
+        # همان تعریف سود/زیان محقق شده داشبورد: فروش − کارمزد فروش − هزینه خرید
+        pnl = (Decimal(row['sell_executed_quantity'] or 0) * Decimal(row['exit_price'] or 0)
+               - Decimal(row['sell_fee'] or 0)
+               - Decimal(row['buy_quantity_formatted'] or 0) * Decimal(row['buy_limit_price'] or row['entry_price'] or 0))
+        strategy = row['strategy_name'] or "-"
+        pnl_by_strategy[strategy] = pnl_by_strategy.get(strategy, Decimal(0)) + pnl
+
+    def rate(numerator, denominator):
+        return round(counts.get(numerator, 0) / counts[denominator], 4) if counts.get(denominator) else None
+
+    return {
+        **stats,
+        "orders": counts,
+        "by_status": {row['status']: row['count'] for row in by_status},
+        "buy_fill_rate": rate("buy_filled", "buy_placed"),
+        "sell_fill_rate": rate("sell_filled", "sell_placed"),
+        "round_trips": len(filled),
+        "realized_pnl": str(sum(pnl_by_strategy.values(), Decimal(0))),
+        "realized_pnl_by_strategy": {strategy: str(pnl) for strategy, pnl in sorted(pnl_by_strategy.items())},
+    }
+
+
+def print_report(report):
+    print(f"\n=== Replay: {report['opportunities']} فرصت، {report['ingested']} سیگنال ذخیره شده ===")
+    print(f"زمان شبیه‌سازی شده: {timedelta(seconds=int(report['simulated_seconds']))} "
+          f"در {report['wall_seconds']:.1f} ثانیه ({report['executor_cycles']} چرخه مجری سفارش)")
+    orders = report['orders']
+    print(f"خرید: {orders.get('buy_filled', 0)}/{orders.get('buy_placed', 0)} پر شد (نرخ: {report['buy_fill_rate']}) | "
+          f"لغو شده: {orders.get('canceled', 0)}")
+    print(f"فروش: {orders.get('sell_filled', 0)}/{orders.get('sell_placed', 0)} پر شد (نرخ: {report['sell_fill_rate']})")
+    print("وضعیت نهایی: " + ", ".join(f"{status}={count}" for status, count in sorted(report['by_status'].items())))
+    print(f"سود/زیان محقق شده ({report['round_trips']} معامله کامل): {Decimal(report['realized_pnl']):,.0f} {QUOTE}")
+    for strategy, pnl in report['realized_pnl_by_strategy'].items():
+        print(f"  {strategy:<30} {Decimal(pnl):>15,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="اجرای دوباره سیگنال‌های ضبط شده در برابر صرافی شبیه‌سازی شده")
+    parser.add_argument("recordings", nargs="+", help="فایل‌های ضبط شده (الگوی glob هم پذیرفته می‌شود)")
+    parser.add_argument("--backend", choices=("sqlite", "mysql"), default="sqlite", help="بک‌اند دیتابیس replay")
+    parser.add_argument("--database", help="مسیر فایل SQLite یا نام دیتابیس MySQL (جدول trade_signals آن پاک می‌شود)")
+    parser.add_argument("--buy-fill-rate", type=float, default=1.0, help="احتمال پر شدن سفارش خرید")
+    parser.add_argument("--sell-fill-rate", type=float, default=1.0, help="احتمال پر شدن سفارش فروش")
+    parser.add_argument("--min-fill-delay", type=float, default=0, help="حداقل تاخیر پر شدن (ثانیه)")
+    parser.add_argument("--max-fill-delay", type=float, default=60, help="حداکثر تاخیر پر شدن (ثانیه)")
+    parser.add_argument("--fee-rate", default="0.002", help="نرخ کارمزد صرافی شبیه‌سازی شده")
+    parser.add_argument("--amount-precision", type=int, default=6, help="دقت اعشار مقدار برای همه نمادها")
+    parser.add_argument("--price-precision", type=int, default=0, help="دقت اعشار قیمت برای همه نمادها")
+    parser.add_argument("--drain-minutes", type=float, default=60, help="ادامه شبیه‌سازی پس از آخرین سیگنال (دقیقه)")
+    parser.add_argument("--seed", type=int, default=1, help="seed مدل پر شدن (برای نتایج تکرارپذیر)")
+    parser.add_argument("--json", action="store_true", help="خروجی به صورت JSON")
+    parser.add_argument("--verbose", action="store_true", help="نمایش لاگ‌های INFO چرخه‌ها")
+    args = parser.parse_args()
+
+    production_database = (config.STORAGE.get("BACKEND", "mysql"), db_utils.current_database())
+    if args.backend == "sqlite":
+        args.database = os.path.abspath(args.database or os.path.join(tempfile.gettempdir(), "trade_internal_replay.sqlite3"))
+    else:
+        args.database = args.database or "trade_internal_replay"
+    if (args.backend, args.database) == production_database:
+        parser.error("replay جدول trade_signals را پاک می‌کند و نباید روی دیتابیس اصلی اجرا شود.")
+    paths = sorted(path for pattern in args.recordings for path in (glob.glob(pattern) or [pattern]))
+    events = signal_recorder.read_recording(paths)
+    if not events:
+        parser.error("هیچ رویداد ضبط شده‌ای یافت نشد.")
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    db_utils.use_database(args.backend, args.database)
+    # دفترچه سفارش‌های ربات اصلی نباید با تغییرات replay مخلوط شود
+    config.JOURNAL["ENABLED"] = False
+    if not db_utils.database_available():
+        parser.error(f"دیتابیس replay '{args.database}' در دسترس نیست.")
+    db_utils.query_db("DELETE FROM trade_signals")
+
+    clock = SimulatedClock(_utc(events[0][0]))
+    fill_model = RandomFillModel(args.buy_fill_rate, args.sell_fill_rate, args.min_fill_delay, args.max_fill_delay, args.seed)
+    exchange = SimulatedExchange(fee_rate=Decimal(args.fee_rate), fill_model=fill_model, clock=clock.now)
+    exchange.install(*_precisions(events, args.amount_precision, args.price_precision))
+    started = time.perf_counter()
+    try:
+        stats = run_replay(events, clock, args.drain_minutes)
+    finally:
+        exchange.uninstall()
+    stats["wall_seconds"] = time.perf_counter() - started
+
+    report = build_report(stats)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+    log_utils.stop_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# session_store.py
+from datetime import timedelta
+import config
+import db_utils
+import user_store
+from cache_utils import LRUCache, MISSING
+
+# نشست‌های لاگین ربات تلگرام در جدول bot_sessions نگهداری می‌شوند تا پس از ری‌استارت
+# باقی بمانند و بین چند ورکر ربات مشترک باشند. یک کش کوتاه‌مدت محلی جلوی رفتن هر پیام
+# به دیتابیس را می‌گیرد؛ خروج در یک ورکر حداکثر پس از SESSION_CACHE_SECONDS در بقیه اعمال می‌شود.
+
+_sessions = LRUCache(
+    maxsize=config.TELEGRAM_BOT.get("SESSION_CACHE_SIZE", 4096),
+    ttl_seconds=config.TELEGRAM_BOT.get("SESSION_CACHE_SECONDS", 30))
+
+
+def _session_ttl():
+    return timedelta(hours=config.TELEGRAM_BOT.get("SESSION_TTL_HOURS", 168))
+
+
+def _load_session(telegram_user_id):
+    return db_utils.query_db(
+        "SELECT user_id, chat_id, is_admin, expires_at FROM bot_sessions WHERE telegram_user_id = %s AND expires_at > %s",
+        (telegram_user_id, db_utils.utcnow()),
+        fetch='one'
+    )
+
+
+async def get_session(telegram_user_id):
+    """
+    نشست فعال کاربر را برمی‌گرداند (یا None).
+    :return: دیکشنری {'user_id', 'chat_id', 'is_admin', 'expires_at'}
+    """
+    session = _sessions.get(telegram_user_id)
+    if session is MISSING:
+        session = await user_store.run_db(_load_session, telegram_user_id)
+        _sessions.set(telegram_user_id, session)
+    if session and session['expires_at'] <= db_utils.utcnow():
+        _sessions.invalidate(telegram_user_id)
+        return None
+    return session
+
+
+async def is_logged_in(telegram_user_id):
+    return await get_session(telegram_user_id) is not None
+
+
+async def create_session(telegram_user_id, user_id, chat_id, is_admin):
+    """یک نشست جدید (یا جایگزین نشست قبلی) با انقضای SESSION_TTL_HOURS ثبت می‌کند."""
+    expires_at = db_utils.utcnow() + _session_ttl()
+    saved = await user_store.run_db(
+        db_utils.query_db,
+        "REPLACE INTO bot_sessions (telegram_user_id, user_id, chat_id, is_admin, expires_at) VALUES (%s, %s, %s, %s, %s)",
+        (telegram_user_id, user_id, chat_id, is_admin, expires_at)
+    )
+    if saved:
+        _sessions.set(telegram_user_id, {'user_id': user_id, 'chat_id': chat_id, 'is_admin': is_admin, 'expires_at': expires_at})
+    return bool(saved)
+
+
+async def delete_session(telegram_user_id):
+    """
+    نشست کاربر را حذف می‌کند.
+    :return: True اگر کاربر لاگین بوده است
+    """
+    was_logged_in = await is_logged_in(telegram_user_id)
+    await user_store.run_db(
+        db_utils.query_db, "DELETE FROM bot_sessions WHERE telegram_user_id = %s", (telegram_user_id,))
+    _sessions.invalidate(telegram_user_id)
+    return was_logged_in
+
+
+async def purge_expired():
+    """نشست‌های منقضی شده را از دیتابیس پاک می‌کند (در شروع ربات فراخوانی می‌شود)."""
+    return await user_store.run_db(
+        db_utils.query_db, "DELETE FROM bot_sessions WHERE expires_at <= %s", (db_utils.utcnow(),))
@@ -1,12 +1,108 @@
 # signal_ingestor.py
+import hashlib
 import requests
 import time
 import logging
 import config
 import db_utils
+import log_utils
+import metrics
+import profiler
+import signal_recorder
+from cache_utils import LRUCache, MISSING
 
 # تنظیمات لاگ‌گیری
-logging.basicConfig(level=config.BOT["LOG_LEVEL"], format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+log_utils.setup_logging()
+
+# کوئری‌های هر فرصت دریافتی؛ با ثبت در db_utils روی هر اتصال فقط یک بار prepare می‌شوند
+db_utils.register_statement(
+    "ingestor.active_order",
+    f"SELECT id FROM trade_signals WHERE asset_name = %s "
+    f"AND status NOT IN ({', '.join(['%s'] * len(db_utils.TERMINAL_STATUSES))}) LIMIT 1"
+)
+db_utils.register_statement(
+    "ingestor.insert_signal",
+    """
+    INSERT INTO trade_signals
+    (asset_name, pair, entry_price, exit_price, strategy_name, status, created_at)
+    VALUES (%s, %s, %s, %s, %s, 'NEW_SIGNAL', %s)
+    """
+)
+
+SOURCE_PAYLOADS_TOTAL = metrics.Counter(
+    "trade_signal_source_payloads_total", "Signal source responses by result (changed/not_modified/unchanged/error)", ("source", "result"))
+
+# آخرین پاسخ پردازش شده هر منبع: {name: {"etag", "last_modified", "digest", "processed_at", "opportunities"}}
+_source_state = {}
+# فرصت‌هایی که اخیراً ذخیره یا رد شده‌اند (نتیجه‌ای که به وضعیت trade_signals بستگی ندارد)؛
+# انقضا با db_utils.utcnow (ساعت شبیه‌سازی شده در replay)
+_seen_opportunities = LRUCache(
+    maxsize=config.STRATEGY_API.get("FINGERPRINT_CACHE_SIZE", 10000),
+    ttl_seconds=config.STRATEGY_API.get("FINGERPRINT_TTL_SECONDS", 900),
+    clock=lambda: db_utils.utcnow().timestamp(),
+)
+
+
+def reset_change_detection():
+    """وضعیت تشخیص تغییر منابع و فرصت‌های دیده شده را پاک می‌کند (بنچمارک‌ها و تست‌ها)."""
+    _source_state.clear()
+    _seen_opportunities.clear()
+
+
+def _fingerprint(signal):
+    """اثر انگشت یک فرصت: همان فیلدهایی که در trade_signals ذخیره می‌شوند."""
+    return tuple(str(signal.get(field)) for field in ("asset_name", "pair", "entry_price", "exit_price", "strategy_name"))
+
+
+def _all_seen(opportunities):
+    """آیا همه فرصت‌ها اخیراً ذخیره یا رد شده‌اند (و پردازش دوباره آن‌ها بی‌اثر است)؟"""
+    return all(_seen_opportunities.get(_fingerprint(signal)) is not MISSING for signal in opportunities)
+
+
+def _fetch_source(name, url):
+    """
+    پاسخ یک منبع را دریافت می‌کند؛ اگر نسبت به آخرین پاسخ پردازش شده تغییری نکرده باشد
+    (304 برای If-None-Match/If-Modified-Since، یا هش محتوای یکسان) بدون parse کردن، فرصت‌های
+    همان پاسخ قبلی برگردانده می‌شوند. پس از UNCHANGED_PAYLOAD_TTL_SECONDS پاسخ بدون شرط دریافت می‌شود.
+    :return: (لیست فرصت‌ها، آیا پاسخ تغییر کرده است) یا None در صورت خطا
+    """
+    state = _source_state.get(name)
+    if state and time.monotonic() - state["processed_at"] > config.STRATEGY_API.get("UNCHANGED_PAYLOAD_TTL_SECONDS", 900):
+        state = None
+    headers = {}
+    if state:
+        if state["etag"]:
+            headers["If-None-Match"] = state["etag"]
+        if state["last_modified"]:
+            headers["If-Modified-Since"] = state["last_modified"]
+
+    response = requests.get(url, headers=headers, timeout=10)
+    if response.status_code == 304 and state:
+        logging.info(f"پاسخ منبع {name} تغییری نکرده است (304).")
+        SOURCE_PAYLOADS_TOTAL.inc(source=name, result="not_modified")
+        return state["opportunities"], False
+    if response.status_code != 200:
+        logging.warning(f"منبع {name} پاسخی با کد وضعیت {response.status_code} برگرداند.")
+        SOURCE_PAYLOADS_TOTAL.inc(source=name, result="error")
+        return None
+
+    digest = hashlib.blake2b(response.content, digest_size=16).digest()
+    if state and state["digest"] == digest:
+        logging.info(f"پاسخ منبع {name} با پاسخ قبلی یکسان است.")
+        SOURCE_PAYLOADS_TOTAL.inc(source=name, result="unchanged")
+        return state["opportunities"], False
+
+    opportunities = response.json().get("opportunities", [])
+    _source_state[name] = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "digest": digest,
+        "processed_at": time.monotonic(),
+        "opportunities": opportunities,
+    }
+    SOURCE_PAYLOADS_TOTAL.inc(source=name, result="changed")
+    return opportunities, True
+
 
 def fetch_signals():
     """سیگنال‌ها را از تمام منابع API تعریف شده در کانفیگ دریافت می‌کند."""
@@ -20,74 +116,105 @@ def fetch_signals():
     for name, url in api_sources.items():
         try:
             logging.info(f"در حال بررسی سیگنال از منبع: {name}...")
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                opportunities = data.get("opportunities", [])
-                if opportunities:
-                    logging.info(f"{len(opportunities)} فرصت جدید از {name} یافت شد.")
-                    all_opportunities.extend(opportunities)
-            else:
-                logging.warning(f"منبع {name} پاسخی با کد وضعیت {response.status_code} برگرداند.")
-        except requests.exceptions.RequestException as e:
-            logging.error(f"عدم امکان اتصال به منبع API {name}: {e}")
+            if not config.STRATEGY_API.get("CHANGE_DETECTION"):
+                _source_state.pop(name, None)
+            fetched = _fetch_source(name, url)
+            if fetched is None:
+                continue
+            opportunities, changed = fetched
+            # هر پاسخ (حتی بدون تغییر) ضبط می‌شود تا replay همان چیزی را ببیند که ربات دیده است
+            signal_recorder.record(name, opportunities)
+            if not changed and _all_seen(opportunities):
+                logging.info(f"همه فرصت‌های پاسخ بدون تغییر {name} اخیراً بررسی شده‌اند.")
+                continue
+            if opportunities:
+                logging.info(f"{len(opportunities)} فرصت جدید از {name} یافت شد.")
+                all_opportunities.extend(opportunities)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.error(f"عدم امکان دریافت سیگنال از منبع API {name}: {e}")
+            SOURCE_PAYLOADS_TOTAL.inc(source=name, result="error")
             continue
     return all_opportunities
 
+def ingest_signals(signals, received_at=None):
+    """
+    سیگنال‌های دریافت شده را بررسی و سیگنال‌های جدید را در دیتابیس ذخیره می‌کند.
+    فرصت‌هایی که در FINGERPRINT_TTL_SECONDS گذشته ذخیره یا رد شده‌اند بدون کوئری دیتابیس کنار گذاشته
+    می‌شوند؛ فرصتی که به خاطر پوزیشن باز کنار گذاشته شود به خاطر سپرده نمی‌شود (با بسته شدن پوزیشن، در
+    اولین چرخه بعدی ذخیره می‌شود).
+    :param signals: لیست فرصت‌های دریافت شده از منابع
+    :param received_at: زمان دریافت به وقت UTC (پیش‌فرض: اکنون؛ replay زمان ضبط شده را می‌دهد)
+    :return: تعداد سیگنال‌های جدید ذخیره شده
+    """
+    new_signals_saved = 0
+    received_at = received_at or db_utils.utcnow()
+    change_detection = config.STRATEGY_API.get("CHANGE_DETECTION")
+    for signal in signals:
+        fingerprint = _fingerprint(signal)
+        if change_detection and _seen_opportunities.get(fingerprint) is not MISSING:
+            metrics.SIGNALS_TOTAL.inc(result="seen")
+            continue
+
+        asset_name = signal.get("asset_name")
+        if not asset_name:
+            logging.warning("سیگنال دریافت شده فاقد 'asset_name' است. نادیده گرفته شد.")
+            metrics.SIGNALS_TOTAL.inc(result="rejected")
+            _seen_opportunities.set(fingerprint, True)
+            continue
+
+        # --- منطق کلیدی: بررسی پوزیشن تکراری و باز ---
+        # ما به دنبال سفارشی برای این دارایی هستیم که هنوز تکمیل نشده یا لغو نشده باشد
+        active_order = db_utils.execute_named(
+            "ingestor.active_order", (asset_name, *db_utils.TERMINAL_STATUSES), fetch='one')
+        
+        if active_order:
+            logging.info(f"یک پوزیشن باز برای {asset_name} وجود دارد (ID: {active_order['id']}). سیگنال جدید نادیده گرفته شد.", extra=log_utils.log_fields("ingestor.duplicate", symbol=asset_name))
+            metrics.SIGNALS_TOTAL.inc(result="deduplicated")
+            continue
+        
+        # --- ذخیره سیگنال جدید در دیتابیس ---
+        logging.info(f"سیگنال جدید برای {asset_name} یافت شد. در حال ذخیره در دیتابیس...")
+        
+        inserted = db_utils.execute_named(
+            "ingestor.insert_signal",
+            (
+                asset_name,
+                signal.get("pair"),
+                signal.get("entry_price"),
+                signal.get("exit_price"),
+                signal.get("strategy_name"),
+                received_at
+            )
+        )
+        if not inserted:
+            metrics.SIGNALS_TOTAL.inc(result="rejected")
+            # خطای دیتابیس: پاسخ بعدی منابع حتی بدون تغییر دوباره پردازش می‌شود
+            _source_state.clear()
+            continue
+        metrics.SIGNALS_TOTAL.inc(result="ingested")
+        _seen_opportunities.set(fingerprint, True)
+        new_signals_saved += 1
+
+    return new_signals_saved
+
 def ingest_signals_loop():
     """حلقه اصلی برای دریافت سیگنال و ذخیره در دیتابیس."""
     logging.info("ماژول شکارچی سیگنال (Ingestor) شروع به کار کرد.")
     
+    loop_timer = metrics.LoopTimer("ingestor", config.BOT["SIGNAL_CHECK_INTERVAL_SECONDS"])
     while True:
+        loop_timer.tick()
         try:
-            signals = fetch_signals()
-            if not signals:
-                logging.info("هیچ سیگنال جدیدی از منابع یافت نشد.")
-                time.sleep(config.BOT["SIGNAL_CHECK_INTERVAL_SECONDS"])
-                continue
+            with profiler.profile_cycle("ingestor"):
+                signals = fetch_signals()
+                if not signals:
+                    logging.info("هیچ سیگنال جدیدی از منابع یافت نشد.")
+                else:
+                    logging.info(f"مجموعاً {len(signals)} سیگنال دریافت شد. در حال بررسی در دیتابیس...")
 
-            logging.info(f"مجموعاً {len(signals)} سیگنال دریافت شد. در حال بررسی در دیتابیس...")
-            
-            new_signals_saved = 0
-            for signal in signals:
-                asset_name = signal.get("asset_name")
-                if not asset_name:
-                    logging.warning("سیگنال دریافت شده فاقد 'asset_name' است. نادیده گرفته شد.")
-                    continue
-
-                # --- منطق کلیدی: بررسی پوزیشن تکراری و باز ---
-                # ما به دنبال سفارشی برای این دارایی هستیم که هنوز تکمیل نشده یا لغو نشده باشد
-                active_order = db_utils.query_db(
-                    "SELECT id FROM trade_signals WHERE asset_name = %s AND status NOT IN ('SELL_ORDER_FILLED', 'CANCELED_TIMEOUT', 'ERROR')",
-                    (asset_name,),
-                    fetch='one'
-                )
-                
-                if active_order:
-                    logging.info(f"یک پوزیشن باز برای {asset_name} وجود دارد (ID: {active_order['id']}). سیگنال جدید نادیده گرفته شد.")
-                    continue
-                
-                # --- ذخیره سیگنال جدید در دیتابیس ---
-                logging.info(f"سیگنال جدید برای {asset_name} یافت شد. در حال ذخیره در دیتابیس...")
-                
-                db_utils.query_db(
-                    """
-                    INSERT INTO trade_signals 
-                    (asset_name, pair, entry_price, exit_price, strategy_name, status) 
-                    VALUES (%s, %s, %s, %s, %s, 'NEW_SIGNAL')
-                    """,
-                    (
-                        asset_name,
-                        signal.get("pair"),
-                        signal.get("entry_price"),
-                        signal.get("exit_price"),
-                        signal.get("strategy_name")
-                    )
-                )
-                new_signals_saved += 1
-            
-            if new_signals_saved > 0:
-                logging.info(f"{new_signals_saved} سیگنال جدید با موفقیت در دیتابیس ذخیره شد.")
+                    new_signals_saved = ingest_signals(signals)
+                    if new_signals_saved > 0:
+                        logging.info(f"{new_signals_saved} سیگنال جدید با موفقیت در دیتابیس ذخیره شد.")
 
         except Exception as e:
             logging.error(f"خطای پیش‌بینی نشده در حلقه شکارچی سیگنال: {e}")
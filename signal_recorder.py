@@ -0,0 +1,76 @@
+# signal_recorder.py
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+import config
+
+# ضبط پاسخ خام منابع سیگنال در یک لاگ فقط-افزودنی (JSONL فشرده، یک فایل برای هر روز UTC).
+# هر خط یک دریافت از یک منبع است: {"t": زمان یونیکس, "s": نام منبع, "o": فرصت‌ها}
+# replay.py همین فایل‌ها را با سرعت بالا در مجری سفارش واقعی و صرافی شبیه‌سازی شده اجرا می‌کند.
+
+_lock = threading.Lock()
+_file = None
+_file_day = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} قابل ذخیره در JSON نیست")
+
+
+def _open_for(day):
+    global _file, _file_day
+    if _file is not None:
+        _file.close()
+    directory = config.SIGNAL_RECORDING.get("DIR", "recordings")
+    os.makedirs(directory, exist_ok=True)
+    _file = open(os.path.join(directory, f"signals-{day}.jsonl"), "a", encoding="utf-8")
+    _file_day = day
+
+
+def record(source, opportunities, received_at=None):
+    """
+    فرصت‌های دریافت شده از یک منبع را (در صورت فعال بودن ضبط) به انتهای فایل روز اضافه می‌کند.
+    خطای نوشتن فقط لاگ می‌شود و هرگز دریافت سیگنال را متوقف نمی‌کند.
+    """
+    if not config.SIGNAL_RECORDING.get("ENABLED") or not opportunities:
+        return
+    received_at = received_at or time.time()
+    line = json.dumps({"t": round(received_at, 3), "s": source, "o": opportunities},
+                      separators=(",", ":"), ensure_ascii=False, default=_default)
+    day = datetime.fromtimestamp(received_at, timezone.utc).strftime("%Y%m%d")
+    try:
+        with _lock:
+            if day != _file_day:
+                _open_for(day)
+            _file.write(line + "\n")
+            _file.flush()
+    except (OSError, TypeError) as e:
+        logging.error(f"خطا در ضبط سیگنال‌های منبع {source}: {e}")
+
+
+def read_recording(paths):
+    """
+    رکوردهای ضبط شده را از یک یا چند فایل به ترتیب زمان برمی‌گرداند.
+    :return: لیست (زمان یونیکس، نام منبع، فرصت‌ها)
+    """
+    events = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # خط ناقص (مثلاً آخرین خط هنگام توقف ناگهانی) نادیده گرفته می‌شود
+                    logging.warning(f"خط نامعتبر {line_number} در {path} نادیده گرفته شد.")
+                    continue
+                events.append((entry["t"], entry.get("s"), entry.get("o", [])))
+    events.sort(key=lambda event: event[0])
+    return events
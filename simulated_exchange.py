@@ -0,0 +1,163 @@
+# simulated_exchange.py
+import itertools
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+import wallex_api
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class RandomFillModel:
+    """
+    مدل پر شدن احتمالاتی برای replay: هر سفارش با احتمال 'buy_fill_rate' (یا 'sell_fill_rate')
+    پس از تاخیری تصادفی بین 'min_delay' و 'max_delay' ثانیه پر می‌شود و در غیر این صورت هرگز.
+    با seed ثابت، نتایج یک replay تکرارپذیر است.
+    """
+
+    def __init__(self, buy_fill_rate=1.0, sell_fill_rate=1.0, min_delay=0, max_delay=0, seed=None):
+        self.rates = {"buy": buy_fill_rate, "sell": sell_fill_rate}
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+
+    def __call__(self, order):
+        """:return: تاخیر پر شدن (ثانیه) یا None اگر سفارش هرگز پر نشود"""
+        if self._random.random() >= self.rates.get(order["side"], 1.0):
+            return None
+        return self._random.uniform(self.min_delay, self.max_delay)
+
+
+
+class SimulatedExchange:
+    """
+    یک صرافی شبیه‌سازی شده که به جای توابع والکس در wallex_api نصب می‌شود.
+    سفارش‌ها در حافظه نگهداری می‌شوند و (به صورت پیش‌فرض) بلافاصله پر (FILLED) می‌شوند.
+    با 'fill_model' هر سفارش در زمان مشخصی از ساعت 'clock' پر می‌شود (برای replay).
+    برای بنچمارک‌ها و تست‌ها بدون ارسال هیچ درخواستی به والکس استفاده می‌شود.
+    """
+
+    def __init__(self, fill_immediately=True, fee_rate=Decimal("0"), fill_model=None, clock=None):
+        self.fill_immediately = fill_immediately
+        self.fee_rate = Decimal(fee_rate)
+        self.fill_model = fill_model
+        self.clock = clock or _utcnow
+        self.orders = {}
+        # {symbol: (bid, ask)} برای market_data؛ خالی یعنی بدون قیمت (سیگنال‌ها بدون بررسی اجرا می‌شوند)
+        self.quotes = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._originals = None
+
+    # --- جایگزین‌های توابع wallex_api ---
+
+    def place_order(self, symbol, price, quantity, side):
+        with self._lock:
+            client_order_id = f"SIM-{next(self._ids)}"
+            self.orders[client_order_id] = {
+                "symbol": symbol,
+                "price": Decimal(price),
+                "origQty": Decimal(quantity),
+                "executedQty": Decimal(0),
+                "side": side.lower(),
+                "status": "NEW",
+                "fill_at": None,
+            }
+            if self.fill_model is not None:
+                delay = self.fill_model(self.orders[client_order_id])
+                if delay is not None:
+                    self.orders[client_order_id]["fill_at"] = self.clock() + timedelta(seconds=delay)
+            elif self.fill_immediately:
+                self._fill(client_order_id)
+        return {"success": True, "result": {"clientOrderId": client_order_id}}
+
+    def get_order_status(self, client_order_id):
+        with self._lock:
+            order = self.orders.get(client_order_id)
+            if order is None:
+                return None
+            self._settle(client_order_id)
+            fee = order["executedQty"] * self.fee_rate if order["side"] == "buy" else order["executedQty"] * order["price"] * self.fee_rate
+            return {
+                "clientOrderId": client_order_id,
+                "symbol": order["symbol"],
+                "price": str(order["price"]),
+                "origQty": str(order["origQty"]),
+                "executedQty": str(order["executedQty"]),
+                "executedSum": str(order["executedQty"] * order["price"]),
+                "fee": str(fee),
+                "side": order["side"],
+                "status": order["status"],
+            }
+
+    def cancel_order(self, client_order_id):
+        with self._lock:
+            order = self.orders.get(client_order_id)
+            if order is None:
+                return False
+            self._settle(client_order_id)
+            if order["status"] != "NEW":
+                return False
+            order["status"] = "CANCELED"
+            return True
+
+    def get_market_quotes(self):
+        return dict(self.quotes)
+
+    # --- کنترل شبیه‌سازی ---
+
+    def _fill(self, client_order_id):
+        order = self.orders[client_order_id]
+        order["executedQty"] = order["origQty"]
+        order["status"] = "FILLED"
+
+    def _settle(self, client_order_id):
+        """سفارشی که زمان پر شدنش (طبق fill_model) رسیده را پر می‌کند."""
+        order = self.orders[client_order_id]
+        if order["status"] == "NEW" and order["fill_at"] is not None and order["fill_at"] <= self.clock():
+            self._fill(client_order_id)
+
+    def fill(self, client_order_id):
+        """یک سفارش باز را به صورت دستی پر می‌کند."""
+        with self._lock:
+            if self.orders.get(client_order_id, {}).get("status") == "NEW":
+                self._fill(client_order_id)
+                return True
+            return False
+
+    def install(self, amount_precisions=None, price_precisions=None):
+        """توابع والکس و قوانین دقت اعشار را با نسخه شبیه‌سازی شده جایگزین می‌کند."""
+        self._originals = (
+            wallex_api.place_wallex_order,
+            wallex_api.get_wallex_order_status,
+            wallex_api.cancel_wallex_order,
+            wallex_api.get_market_quotes,
+            dict(wallex_api.market_amount_precisions),
+            dict(wallex_api.market_price_precisions),
+        )
+        wallex_api.place_wallex_order = self.place_order
+        wallex_api.get_wallex_order_status = self.get_order_status
+        wallex_api.cancel_wallex_order = self.cancel_order
+        wallex_api.get_market_quotes = self.get_market_quotes
+        wallex_api.market_amount_precisions.update(amount_precisions or {})
+        wallex_api.market_price_precisions.update(price_precisions or {})
+        return self
+
+    def uninstall(self):
+        """توابع اصلی والکس را بازمی‌گرداند."""
+        if self._originals is None:
+            return
+        (wallex_api.place_wallex_order,
+         wallex_api.get_wallex_order_status,
+         wallex_api.cancel_wallex_order,
+         wallex_api.get_market_quotes,
+         amount_precisions,
+         price_precisions) = self._originals
+        wallex_api.market_amount_precisions.clear()
+        wallex_api.market_amount_precisions.update(amount_precisions)
+        wallex_api.market_price_precisions.clear()
+        wallex_api.market_price_precisions.update(price_precisions)
+        self._originals = None
@@ -14,24 +14,23 @@ from telegram.ext import (
     filters,
 )
 
-# ایمپورت ابزارهای دیتابیس و امنیت
-import db_utils
-import security_utils
+# ایمپورت لایه دسترسی async به کاربران (دیتابیس و امنیت خارج از حلقه رویداد اجرا می‌شوند)
+import dashboard
+import log_utils
+import session_store
+import user_store
 
 # بارگذاری متغیرهای محیطی (برای توکن تلگرام)
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
 # تنظیمات لاگ‌گیری
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(threadName)s - %(levelname)s - %(message)s"
-)
+log_utils.setup_logging(level=logging.INFO)
 
 # --- متغیرهای جهانی برای مدیریت وضعیت ---
 
-# یک دیکشنری ساده برای نگهداری وضعیت لاگین کاربران در حافظه
-# فرمت: {telegram_user_id: user_db_id}
-LOGGED_IN_USERS = {}
+# وضعیت لاگین کاربران در session_store (جدول bot_sessions + کش محلی) نگهداری می‌شود
+# تا پس از ری‌استارت باقی بماند و بین چند ورکر ربات مشترک باشد.
 
 # تعریف وضعیت‌ها (States) برای مکالمه‌ها
 (   
@@ -63,12 +62,23 @@ async def delete_message_if_private(update: Update):
 async def is_user_logged_in(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """بررسی می‌کند آیا کاربر لاگین کرده است یا خیر."""
     user_id = update.effective_user.id
-    if user_id in LOGGED_IN_USERS:
+    if await session_store.is_logged_in(user_id):
         return True
     
     await update.message.reply_text("⛔️ شما لاگین نکرده‌اید. لطفاً ابتدا با /login وارد شوید.")
     return False
 
+async def is_admin_logged_in(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """بررسی می‌کند آیا کاربر لاگین کرده و ادمین است یا خیر."""
+    session = await session_store.get_session(update.effective_user.id)
+    if session is None:
+        await update.message.reply_text("⛔️ شما لاگین نکرده‌اید. لطفاً ابتدا با /login وارد شوید.")
+        return False
+    if not session['is_admin']:
+        await update.message.reply_text("⛔️ این دستور فقط برای ادمین‌ها در دسترس است.")
+        return False
+    return True
+
 # --- ۱. دستورات پایه (Start, Help, Cancel) ---
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -82,6 +92,8 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/register - ثبت نام کاربر جدید\n"
         "/login - ورود به حساب کاربری\n"
         "/logout - خروج از حساب کاربری\n"
+        "/status - وضعیت سفارشات و سود/زیان امروز (ادمین)\n"
+        "/positions - لیست پوزیشن‌های باز (ادمین)\n"
         "/help - نمایش همین پیام\n\n"
         "پس از ورود می‌توانید از دستورات مدیریتی مانند /addkey استفاده کنید."
     )
@@ -103,7 +115,7 @@ async def register_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """شروع فرآیند ثبت نام."""
     user_id = update.effective_user.id
     # بررسی اینکه کاربر از قبل ثبت نام نکرده باشد
-    existing_user = db_utils.query_db("SELECT id FROM bot_users WHERE telegram_user_id = %s", (user_id,), fetch='one')
+    existing_user = await user_store.get_user_by_telegram_id(user_id)
     if existing_user:
         await update.message.reply_text("شما قبلاً ثبت نام کرده‌اید. می‌توانید با /login وارد شوید.")
         return ConversationHandler.END
@@ -119,7 +131,7 @@ async def register_get_username(update: Update, context: ContextTypes.DEFAULT_TY
     username = update.message.text.strip()
     
     # بررسی اینکه نام کاربری قبلاً استفاده نشده باشد
-    existing_user = db_utils.query_db("SELECT id FROM bot_users WHERE username = %s", (username,), fetch='one')
+    existing_user = await user_store.get_user_by_username(username)
     if existing_user:
         await update.message.reply_text("این نام کاربری قبلاً استفاده شده. لطفاً یکی دیگر انتخاب کنید یا /cancel را بزنید.")
         return REGISTER_USERNAME # بازگشت به همین مرحله
@@ -163,16 +175,16 @@ async def register_get_password_confirm(update: Update, context: ContextTypes.DE
         telegram_id = update.effective_user.id
         
         # هش کردن پسورد
-        hashed_pass = security_utils.hash_password(password_original)
+        hashed_pass = await user_store.hash_password(password_original)
         
         # بررسی اینکه آیا این اولین کاربر است؟
-        user_count = db_utils.query_db("SELECT COUNT(*) as count FROM bot_users", fetch='one')['count']
+        user_count = await user_store.count_users()
+        if user_count is None:
+            raise RuntimeError("امکان شمارش کاربران در دیتابیس وجود ندارد")
         is_admin = (user_count == 0) # اولین کاربر، ادمین می‌شود
         
-        db_utils.query_db(
-            "INSERT INTO bot_users (telegram_user_id, username, hashed_password, is_admin) VALUES (%s, %s, %s, %s)",
-            (telegram_id, username, hashed_pass, is_admin)
-        )
+        if not await user_store.create_user(telegram_id, username, hashed_pass, is_admin):
+            raise RuntimeError("درج کاربر در دیتابیس ناموفق بود")
         
         await update.message.reply_text(
             f"🎉 **ثبت نام شما با موفقیت انجام شد، {username}!**\n"
@@ -195,7 +207,7 @@ async def register_get_password_confirm(update: Update, context: ContextTypes.DE
 async def login_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """شروع فرآیند لاگین."""
     user_id = update.effective_user.id
-    if user_id in LOGGED_IN_USERS:
+    if await session_store.is_logged_in(user_id):
         await update.message.reply_text("شما همین حالا لاگین هستید.")
         return ConversationHandler.END
 
@@ -211,7 +223,7 @@ async def login_get_username(update: Update, context: ContextTypes.DEFAULT_TYPE)
     username = update.message.text.strip()
     
     # بررسی وجود کاربر
-    user_record = db_utils.query_db("SELECT id, hashed_password FROM bot_users WHERE username = %s", (username,), fetch='one')
+    user_record = await user_store.get_user_by_username(username)
     
     if not user_record:
         await update.message.reply_text("کاربری با این نام کاربری یافت نشد. دوباره تلاش کنید یا /cancel را بزنید.")
@@ -235,13 +247,15 @@ async def login_get_password(update: Update, context: ContextTypes.DEFAULT_TYPE)
         hashed_password = user_record['hashed_password']
         
         # بررسی پسورد
-        if security_utils.check_password(plain_password, hashed_password):
+        if await user_store.check_password(plain_password, hashed_password):
             # --- لاگین موفقیت آمیز ---
             telegram_id = update.effective_user.id
             user_db_id = user_record['id']
             
-            # ثبت کاربر در دیکشنری لاگین‌شده‌ها
-            LOGGED_IN_USERS[telegram_id] = user_db_id
+            # ثبت نشست کاربر (ماندگار پس از ری‌استارت)
+            if not await session_store.create_session(telegram_id, user_db_id, update.effective_chat.id, bool(user_record['is_admin'])):
+                await update.message.reply_text("خطایی در سرور رخ داد. لطفاً بعداً تلاش کنید.")
+                return ConversationHandler.END
             
             await update.message.reply_text("✅ **ورود با موفقیت انجام شد!**\n"
 "شما اکنون به دستورات مدیریتی دسترسی دارید.\n\n"
@@ -264,14 +278,35 @@ async def login_get_password(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def logout_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """خروج کاربر از سیستم."""
     user_id = update.effective_user.id
-    if user_id in LOGGED_IN_USERS:
-        # حذف کاربر از دیکشنری لاگین‌شده‌ها
-        del LOGGED_IN_USERS[user_id]
+    if await session_store.delete_session(user_id):
         await update.message.reply_text("◀️ شما با موفقیت خارج شدید.")
     else:
         await update.message.reply_text("شما لاگین نکرده بودید.")
 
-# --- ۵. دستورات مدیریتی (Placeholder) ---
+# --- ۵. داشبورد (/status و /positions) ---
+# داده‌ها از خلاصه کش شده dashboard خوانده می‌شوند، نه مستقیماً از جدول trade_signals
+
+async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """وضعیت سفارشات باز، معاملات تکمیل شده و سود/زیان محقق شده امروز."""
+    if not await is_admin_logged_in(update, context):
+        return
+    summary = await dashboard.get_summary()
+    if summary is None:
+        await update.message.reply_text("خطایی در دریافت اطلاعات رخ داد. لطفاً بعداً تلاش کنید.")
+        return
+    await update.message.reply_text(dashboard.format_status(summary))
+
+async def positions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """لیست پوزیشن‌های باز."""
+    if not await is_admin_logged_in(update, context):
+        return
+    summary = await dashboard.get_summary()
+    if summary is None:
+        await update.message.reply_text("خطایی در دریافت اطلاعات رخ داد. لطفاً بعداً تلاش کنید.")
+        return
+    await update.message.reply_text(dashboard.format_positions(summary))
+
+# --- ۶. دستورات مدیریتی (Placeholder) ---
 # ما اینها را در فاز بعدی کامل خواهیم کرد
 
 async def addkey_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -289,7 +324,11 @@ async def addkey_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     # فعلا برای تست، مکالمه را تمام می‌کنیم:
     return ConversationHandler.END
 
-# --- ۶. تابع اصلی و اجرای ربات ---
+# --- ۷. تابع اصلی و اجرای ربات ---
+
+async def _post_init(application: Application):
+    """پس از راه‌اندازی ربات: پاکسازی نشست‌های منقضی شده."""
+    await session_store.purge_expired()
 
 def run_bot():
     """ربات تلگرام را راه‌اندازی و اجرا می‌کند."""
@@ -297,7 +336,7 @@ def run_bot():
         logging.critical("توکن تلگرام (TELEGRAM_BOT_TOKEN) در .env یافت نشد.")
         return
 
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    application = Application.builder().token(TELEGRAM_TOKEN).post_init(_post_init).build()
 
     # --- تعریف مکالمه‌ها (Conversations) ---
     
@@ -342,6 +381,8 @@ def run_bot():
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("logout", logout_command))
+    application.add_handler(CommandHandler("status", status_command))
+    application.add_handler(CommandHandler("positions", positions_command))
 
     # شروع به کار ربات
     logging.info("ربات تلگرام در حال اجرا است...")
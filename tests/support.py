@@ -0,0 +1,78 @@
+# tests/support.py
+"""
+ابزارهای مشترک تست‌ها: هر تست روی یک فایل SQLite موقت و در برابر SimulatedExchange اجرا می‌شود
+(بدون MySQL و بدون هیچ درخواستی به والکس).
+
+اجرا (از ریشه مخزن):
+    python -m pytest -q tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import db_utils  # noqa: E402
+import order_journal  # noqa: E402
+from simulated_exchange import SimulatedExchange  # noqa: E402
+
+QUOTE = config.TRADING["QUOTE_ASSET"]
+
+
+def reset_journal():
+    """وضعیت سراسری order_journal را (بین تست‌ها) بازنشانی می‌کند."""
+    with order_journal._lock:
+        if order_journal._file is not None:
+            order_journal._file.close()
+        order_journal._file = None
+        order_journal._busy = False
+        order_journal._recovering = False
+        order_journal._seq = 0
+        order_journal._unflushed.clear()
+        order_journal._pending.clear()
+
+
+class SimulatedTradingTestCase(unittest.TestCase):
+    """پایه تست‌هایی که مراحل واقعی مجری سفارش را روی دیتابیس و صرافی شبیه‌سازی شده اجرا می‌کنند."""
+
+    ASSETS = [f"TS{i:03d}" for i in range(20)]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="trade_internal_test_")
+        self._saved_config = {name: dict(getattr(config, name)) for name in ("STORAGE", "JOURNAL", "MARKET_DATA", "BOT")}
+        db_utils.use_database("sqlite", os.path.join(self.directory, "test.sqlite3"))
+        config.JOURNAL.update(ENABLED=False, PATH=os.path.join(self.directory, "journal", "order_journal.jsonl"))
+        # بدون قیمت بازار؛ سیگنال‌ها با قیمت خودشان اجرا می‌شوند
+        config.MARKET_DATA["ENABLED"] = False
+        reset_journal()
+
+        symbols = [f"{asset}{QUOTE}" for asset in self.ASSETS]
+        self.exchange = SimulatedExchange()
+        self.exchange.install({symbol: 2 for symbol in symbols}, {symbol: 0 for symbol in symbols})
+
+    def tearDown(self):
+        self.exchange.uninstall()
+        reset_journal()
+        for name, saved in self._saved_config.items():
+            getattr(config, name).clear()
+            getattr(config, name).update(saved)
+        db_utils.use_database(config.STORAGE.get("BACKEND", "mysql"), db_utils.current_database())
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def insert_signals(self, count):
+        """'count' سیگنال NEW_SIGNAL درج می‌کند."""
+        for i in range(count):
+            db_utils.query_db(
+                "INSERT INTO trade_signals (asset_name, pair, entry_price, exit_price, strategy_name, status) "
+                "VALUES (%s, %s, %s, %s, %s, 'NEW_SIGNAL')",
+                (self.ASSETS[i % len(self.ASSETS)], QUOTE, "1000", "1100", "test"))
+
+    def buy_orders(self):
+        return [order for order in self.exchange.orders.values() if order["side"] == "buy"]
+
+    def statuses(self):
+        rows = db_utils.query_db("SELECT status, COUNT(*) AS count FROM trade_signals GROUP BY status", fetch='all')
+        return {row['status']: row['count'] for row in rows}
@@ -0,0 +1,123 @@
+# tests/test_executor_concurrency.py
+import threading
+from datetime import timedelta
+from unittest import mock
+
+import support
+import config
+import db_utils
+import order_executor
+import order_journal
+import wallex_api
+
+
+class ConcurrentExecutorsTest(support.SimulatedTradingTestCase):
+    """چند اجراکننده همزمان روی یک دیتابیس: برای هر سیگنال دقیقاً یک خرید و یک فروش."""
+
+    WORKERS = 6
+    SIGNALS = 300
+
+    def setUp(self):
+        super().setUp()
+        # دسته‌های کوچک تا برداشت‌های اجراکننده‌ها در هم تنیده شوند
+        config.BOT["CLAIM_BATCH_SIZE"] = 10
+        self.insert_signals(self.SIGNALS)
+
+    def _run_workers(self):
+        errors = []
+        barrier = threading.Barrier(self.WORKERS)
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(200):
+                    order_executor.run_executor_cycle()
+                    if self.statuses() == {"SELL_ORDER_FILLED": self.SIGNALS}:
+                        return
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, name=f"executor-{i}") for i in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def _assert_one_order_per_signal(self):
+        self.assertEqual(self.statuses(), {"SELL_ORDER_FILLED": self.SIGNALS})
+        sides = [order["side"] for order in self.exchange.orders.values()]
+        self.assertEqual(sides.count("buy"), self.SIGNALS)
+        self.assertEqual(sides.count("sell"), self.SIGNALS)
+        rows = db_utils.query_db("SELECT buy_client_order_id, sell_client_order_id FROM trade_signals", fetch='all')
+        self.assertEqual(len({row['buy_client_order_id'] for row in rows}), self.SIGNALS)
+        self.assertEqual(len({row['sell_client_order_id'] for row in rows}), self.SIGNALS)
+
+    def test_one_buy_per_signal(self):
+        self._run_workers()
+        self._assert_one_order_per_signal()
+
+    def test_one_buy_per_signal_with_journal(self):
+        config.JOURNAL["ENABLED"] = True
+        self._run_workers()
+        order_journal.flush()
+        self._assert_one_order_per_signal()
+
+
+class BatchPollingTest(support.SimulatedTradingTestCase):
+    """با سفارش‌های باز بیشتر از CLAIM_BATCH_SIZE، هر چرخه همه آن‌ها را بررسی می‌کند (نه فقط دسته اول)."""
+
+    SIGNALS = 35
+
+    def setUp(self):
+        super().setUp()
+        config.BOT["CLAIM_BATCH_SIZE"] = 10
+        self.exchange.fill_immediately = False
+        self.insert_signals(self.SIGNALS)
+
+    def _fill(self, side):
+        for client_order_id, order in list(self.exchange.orders.items()):
+            if order["side"] == side:
+                self.exchange.fill(client_order_id)
+
+    def test_every_fill_is_picked_up_in_one_cycle(self):
+        order_executor.run_executor_cycle()
+        self.assertEqual(self.statuses(), {"BUY_ORDER_PLACED": self.SIGNALS})
+
+        self._fill("buy")
+        order_executor.run_executor_cycle()
+        self.assertEqual(self.statuses(), {"SELL_ORDER_PLACED": self.SIGNALS})
+
+        self._fill("sell")
+        order_executor.run_executor_cycle()
+        self.assertEqual(self.statuses(), {"SELL_ORDER_FILLED": self.SIGNALS})
+        self.assertEqual(len(self.buy_orders()), self.SIGNALS)
+
+
+class LeaseOwnershipTest(support.SimulatedTradingTestCase):
+    """ردیفی که اجاره‌اش در میانه یک دسته کند به اجراکننده دیگری رسیده نباید سفارش بگیرد."""
+
+    def test_row_taken_over_mid_batch_is_skipped(self):
+        self.insert_signals(2)
+        place_order = wallex_api.place_wallex_order
+
+        def slow_place_order(*args):
+            # اجاره این دسته منقضی شده و اجراکننده دیگری ردیف 2 را برداشته است
+            db_utils.query_db(
+                "UPDATE trade_signals SET lease_owner = %s, lease_expires_at = %s WHERE id = 2",
+                ("other-worker", db_utils.utcnow() + timedelta(minutes=5)))
+            return place_order(*args)
+
+        with mock.patch.object(wallex_api, "place_wallex_order", slow_place_order):
+            order_executor.process_new_signals()
+
+        self.assertEqual(len(self.buy_orders()), 1)
+        row = db_utils.query_db("SELECT status, lease_owner FROM trade_signals WHERE id = 2", fetch='one')
+        self.assertEqual((row['status'], row['lease_owner']), ("NEW_SIGNAL", "other-worker"))
+
+    def test_renewal_extends_the_lease(self):
+        self.insert_signals(1)
+        rows = db_utils.claim_rows('NEW_SIGNAL', lease_seconds=1)
+        self.assertTrue(db_utils.renew_lease(rows[0], lease_seconds=600))
+        row = db_utils.query_db("SELECT lease_expires_at FROM trade_signals WHERE id = %s", (rows[0]['id'],), fetch='one')
+        self.assertGreater(row['lease_expires_at'], db_utils.utcnow() + timedelta(minutes=9))
@@ -0,0 +1,29 @@
+# tests/test_order_executor.py
+from decimal import Decimal
+
+import support
+import config
+import db_utils
+import market_data
+import order_executor
+
+
+class RepriceTest(support.SimulatedTradingTestCase):
+    """قیمت‌گذاری دوباره سیگنال، قیمت سفارش را تغییر می‌دهد نه entry_price سیگنال را."""
+
+    def setUp(self):
+        super().setUp()
+        config.MARKET_DATA["ENABLED"] = True
+        symbol = f"{self.ASSETS[0]}{support.QUOTE}"
+        self.exchange.quotes = {symbol: (Decimal("1010"), Decimal("1020"))}
+        market_data.refresh(force=True)
+
+    def test_reprice_keeps_signal_entry_price(self):
+        self.insert_signals(1)
+        order_executor.process_new_signals()
+
+        row = db_utils.query_db("SELECT status, entry_price, buy_limit_price FROM trade_signals WHERE id = 1", fetch='one')
+        self.assertEqual(row['status'], "BUY_ORDER_PLACED")
+        self.assertEqual(row['entry_price'], Decimal("1000"))
+        self.assertEqual(row['buy_limit_price'], Decimal("1020"))
+        self.assertEqual([order["price"] for order in self.buy_orders()], [Decimal("1020")])
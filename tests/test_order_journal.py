@@ -0,0 +1,145 @@
+# tests/test_order_journal.py
+import json
+import os
+import sqlite3
+from datetime import timedelta
+from unittest import mock
+
+import fcntl
+
+import support
+import config
+import db_utils
+import order_executor
+import order_journal
+
+
+class JournalStallTest(support.SimulatedTradingTestCase):
+    """وقتی تغییرات دفترچه به دیتابیس نمی‌رسند، ردیف‌های در انتظار نباید دوباره پردازش شوند."""
+
+    def setUp(self):
+        super().setUp()
+        config.JOURNAL["ENABLED"] = True
+
+    def test_leases_of_pending_rows_are_extended_after_outage(self):
+        self.insert_signals(1)
+        with mock.patch.object(db_utils, "run_in_transaction", return_value=None), \
+                mock.patch.object(db_utils, "database_available", return_value=False):
+            order_executor.process_new_signals()
+        # قطعی طولانی‌تر از LEASE_SECONDS: اجاره ردیف منقضی شده است
+        db_utils.query_db("UPDATE trade_signals SET lease_expires_at = %s WHERE id = 1", (db_utils.utcnow() - timedelta(minutes=1),))
+
+        # دیتابیس برگشته ولی اعمال ورودی‌ها (مثلاً به خاطر انتظار قفل) هنوز ممکن نیست
+        locked = _error("database is locked", 5)
+        with mock.patch.object(db_utils, "run_in_transaction", return_value=None), \
+                mock.patch.object(db_utils, "execute_statement", side_effect=locked):
+            order_journal.flush()
+        self.assertEqual(order_journal.pending_ids(), (1,))
+
+        # اجراکننده دیگری (بدون اطلاع از دفترچه این پردازه) ردیف را برنمی‌دارد
+        self.assertEqual(db_utils.claim_rows('NEW_SIGNAL'), [])
+        order_journal.flush()
+        self.assertEqual(self.statuses(), {"BUY_ORDER_PLACED": 1})
+        self.assertEqual(len(self.buy_orders()), 1)
+
+    def test_pending_signals_are_not_bought_twice(self):
+        self.insert_signals(3)
+        with mock.patch.object(db_utils, "run_in_transaction", return_value=None), \
+                mock.patch.object(db_utils, "database_available", return_value=False):
+            order_executor.process_new_signals()
+            order_executor.process_new_signals()
+            self.assertEqual(len(order_journal.pending_ids()), 3)
+        self.assertEqual(len(self.buy_orders()), 3)
+
+        order_journal.flush()
+        self.assertEqual(order_journal.pending_ids(), ())
+        self.assertEqual(self.statuses(), {"BUY_ORDER_PLACED": 3})
+        order_executor.process_new_signals()
+        self.assertEqual(len(self.buy_orders()), 3)
+
+
+class JournalRecoveryTest(support.SimulatedTradingTestCase):
+    """ورودی‌های اعمال نشده یک اجرای قبلی نباید بدون اعمال از دفترچه پاک شوند."""
+
+    def setUp(self):
+        super().setUp()
+        config.JOURNAL["ENABLED"] = True
+        self.insert_signals(2)
+        self.path = config.JOURNAL["PATH"]
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # اجرای قبلی: تغییر ردیف 1 ثبت شده ولی پیش از اعمال متوقف شده است
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"seq": 1, "ids": [1], "query": order_executor.MARK_ERROR, "params": ["crashed run", 1]}) + "\n")
+
+    def test_standalone_record_replays_previous_entries(self):
+        order_journal.record(2, order_executor.MARK_ERROR, ("standalone run", 2))
+        rows = db_utils.query_db("SELECT id, status, notes FROM trade_signals ORDER BY id", fetch='all')
+        self.assertEqual([(row['status'], row['notes']) for row in rows], [("ERROR", "crashed run"), ("ERROR", "standalone run")])
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    def test_standalone_stage_replays_previous_entries_before_claiming(self):
+        order_executor.process_new_signals()
+        self.assertEqual(self.statuses(), {"ERROR": 1, "BUY_ORDER_PLACED": 1})
+        self.assertEqual(len(self.buy_orders()), 1)
+
+    def test_journal_locked_by_another_process_is_left_alone(self):
+        with open(self.path, "a+", encoding="utf-8") as other:
+            fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            order_journal.record(2, order_executor.MARK_ERROR, ("direct", 2))
+            self.assertFalse(order_journal.start_journal())
+        self.assertEqual(self.statuses(), {"NEW_SIGNAL": 1, "ERROR": 1})
+        with open(self.path, encoding="utf-8") as f:
+            self.assertIn("crashed run", f.read())
+
+
+class JournalFlushErrorTest(support.SimulatedTradingTestCase):
+    """فقط ورودی‌هایی که با خطای دائمی شکست می‌خورند کنار گذاشته می‌شوند؛ خطای گذرا flush را متوقف می‌کند."""
+
+    def setUp(self):
+        super().setUp()
+        config.JOURNAL["ENABLED"] = True
+        config.STORAGE["SQLITE_TIMEOUT_SECONDS"] = 0.05
+        self.insert_signals(2)
+
+    def _locked(self):
+        """یک اتصال دیگر که قفل نوشتن دیتابیس را تا بسته شدن نگه می‌دارد."""
+        other = sqlite3.connect(config.STORAGE["SQLITE_PATH"], timeout=0)
+        other.execute("BEGIN EXCLUSIVE")
+        return other
+
+    def test_locked_database_keeps_entries(self):
+        other = self._locked()
+        try:
+            order_journal.record(1, order_executor.MARK_ERROR, ("first", 1))
+            order_journal.record(2, order_executor.MARK_ERROR, ("second", 2))
+            self.assertEqual(sorted(order_journal.pending_ids()), [1, 2])
+        finally:
+            other.close()
+        self.assertEqual(self.statuses(), {"NEW_SIGNAL": 2})
+
+        self.assertEqual(order_journal.flush(), 2)
+        self.assertEqual(order_journal.pending_ids(), ())
+        self.assertEqual(self.statuses(), {"ERROR": 2})
+
+    def test_bad_entry_is_dropped_and_rest_applied(self):
+        other = self._locked()
+        try:
+            order_journal.record(1, "UPDATE trade_signals SET no_such_column = %s WHERE id = %s", ("x", 1))
+            order_journal.record(2, order_executor.MARK_ERROR, ("second", 2))
+        finally:
+            other.close()
+
+        order_journal.flush()
+        self.assertEqual(order_journal.pending_ids(), ())
+        rows = db_utils.query_db("SELECT id, status FROM trade_signals ORDER BY id", fetch='all')
+        self.assertEqual([row['status'] for row in rows], ["NEW_SIGNAL", "ERROR"])
+
+    def test_retryable_errors(self):
+        self.assertTrue(db_utils.is_retryable_error(_error("database is locked", 5)))
+        self.assertFalse(db_utils.is_retryable_error(_error("no such column: x", 1)))
+
+
+def _error(message, code):
+    error = sqlite3.OperationalError(message)
+    error.sqlite_errorcode = code
+    return error
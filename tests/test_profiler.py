@@ -0,0 +1,72 @@
+# tests/test_profiler.py
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+import support  # noqa: F401  (مسیر ریشه مخزن)
+import config
+import profiler
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="trade_internal_profiles_")
+        self._saved_config = dict(config.PROFILING)
+        config.PROFILING["OUTPUT_DIR"] = self.directory
+        profiler._pending.clear()
+        profiler._active.clear()
+
+    def tearDown(self):
+        for capture in list(profiler._active.values()):
+            profiler._drop(capture)
+        profiler._pending.clear()
+        config.PROFILING.clear()
+        config.PROFILING.update(self._saved_config)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _outputs(self, loop_name):
+        return sorted(os.path.splitext(name)[1] for name in os.listdir(self.directory) if name.startswith(loop_name + "-"))
+
+    def test_profile_all_uses_cprofile_for_one_loop_only(self):
+        profiler.request_profile("all", 1)
+        with profiler.profile_cycle("executor"):
+            with profiler.profile_cycle("cleanup"):
+                sum(range(1000))
+        self.assertEqual(profiler._active, {})
+        self.assertEqual(self._outputs("executor"), [".collapsed", ".pstats", ".txt"])
+        self.assertEqual(self._outputs("cleanup"), [".collapsed", ".txt"])
+
+    def test_enable_failure_runs_cycle_unprofiled(self):
+        failing = mock.Mock()
+        failing.return_value.enable.side_effect = ValueError("Another profiling tool is already active")
+        ran = []
+        with mock.patch.object(profiler.cProfile, "Profile", failing):
+            profiler.request_profile("executor", 3)
+            with profiler.profile_cycle("executor"):
+                ran.append(1)
+        self.assertEqual(ran, [1])
+        self.assertEqual(profiler._active, {})
+        with profiler.profile_cycle("executor"):
+            ran.append(2)
+        self.assertEqual(ran, [1, 2])
+
+    def test_invalid_cycles_are_rejected(self):
+        self.assertNotIn("OK", profiler.request_profile("executor", "abc"))
+        self.assertNotIn("OK", profiler.request_profile("executor", "-2"))
+        self.assertEqual(profiler._pending, {})
+
+    def test_control_socket_replies_to_invalid_cycles(self):
+        server = profiler.start_control_server("127.0.0.1", 0)
+        try:
+            with socket.create_connection(server.server_address, timeout=5) as client:
+                client.sendall(b"profile executor abc\n")
+                reply = client.makefile(encoding="utf-8").readline()
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn("abc", reply)
+        self.assertEqual(profiler._pending, {})
@@ -0,0 +1,83 @@
+# tests/test_signal_ingestor.py
+import hashlib
+import json
+import os
+from unittest import mock
+
+import support
+import config
+import db_utils
+import signal_ingestor
+import signal_recorder
+
+
+class _Response:
+    def __init__(self, status_code, opportunities=None, etag=None):
+        self.status_code = status_code
+        self.content = json.dumps({"opportunities": opportunities or []}).encode()
+        self.headers = {"ETag": etag or hashlib.md5(self.content).hexdigest()}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ChangeDetectionTest(support.SimulatedTradingTestCase):
+    """فرصتی که به خاطر پوزیشن باز کنار گذاشته شده، با بسته شدن پوزیشن در چرخه بعد ذخیره می‌شود."""
+
+    OPPORTUNITY = {"asset_name": "TS000", "pair": "TS000/TMN", "entry_price": 1000, "exit_price": 1100, "strategy_name": "test"}
+
+    def setUp(self):
+        super().setUp()
+        self._saved_sources = dict(config.STRATEGY_API)
+        self._saved_recording = dict(config.SIGNAL_RECORDING)
+        config.STRATEGY_API.update(SOURCES={"test": "http://source.invalid/opportunities"}, CHANGE_DETECTION=True)
+        config.SIGNAL_RECORDING.update(ENABLED=True, DIR=os.path.join(self.directory, "recordings"))
+        signal_ingestor.reset_change_detection()
+        # پوزیشن باز همان دارایی
+        db_utils.query_db(
+            "INSERT INTO trade_signals (asset_name, pair, entry_price, exit_price, strategy_name, status) "
+            "VALUES ('TS000', 'TS000/TMN', 900, 950, 'test', 'SELL_ORDER_PLACED')")
+
+    def tearDown(self):
+        signal_ingestor.reset_change_detection()
+        with signal_recorder._lock:
+            if signal_recorder._file is not None:
+                signal_recorder._file.close()
+            signal_recorder._file = signal_recorder._file_day = None
+        config.STRATEGY_API.clear()
+        config.STRATEGY_API.update(self._saved_sources)
+        config.SIGNAL_RECORDING.clear()
+        config.SIGNAL_RECORDING.update(self._saved_recording)
+        super().tearDown()
+
+    def _close_position(self):
+        db_utils.query_db("UPDATE trade_signals SET status = 'SELL_ORDER_FILLED' WHERE id = 1")
+
+    def _cycle(self, response):
+        with mock.patch.object(signal_ingestor.requests, "get", return_value=response):
+            return signal_ingestor.ingest_signals(signal_ingestor.fetch_signals())
+
+    def _recorded_lines(self):
+        directory = config.SIGNAL_RECORDING["DIR"]
+        return sum(len(open(os.path.join(directory, name), encoding="utf-8").readlines()) for name in os.listdir(directory))
+
+    def test_deduplicated_opportunity_is_not_cached(self):
+        self.assertEqual(signal_ingestor.ingest_signals([self.OPPORTUNITY]), 0)
+        self._close_position()
+        self.assertEqual(signal_ingestor.ingest_signals([self.OPPORTUNITY]), 1)
+        self.assertEqual(signal_ingestor.ingest_signals([self.OPPORTUNITY]), 0)
+
+    def test_identical_payload_is_reprocessed_after_position_closes(self):
+        self.assertEqual(self._cycle(_Response(200, [self.OPPORTUNITY], etag="fixed")), 0)
+        self._close_position()
+        self.assertEqual(self._cycle(_Response(200, [self.OPPORTUNITY], etag="fixed")), 1)
+        self.assertEqual(self._recorded_lines(), 2)
+
+    def test_not_modified_payload_is_reprocessed_and_recorded(self):
+        self.assertEqual(self._cycle(_Response(200, [self.OPPORTUNITY], etag="v1")), 0)
+        self._close_position()
+        self.assertEqual(self._cycle(_Response(304)), 1)
+        # همه فرصت‌ها ذخیره شده‌اند: پاسخ بدون تغییر بعدی کنار گذاشته می‌شود ولی ضبط می‌شود
+        with mock.patch.object(signal_ingestor.requests, "get", return_value=_Response(304)):
+            self.assertEqual(signal_ingestor.fetch_signals(), [])
+        self.assertEqual(self._recorded_lines(), 3)
@@ -0,0 +1,85 @@
+# user_store.py
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import config
+import db_utils
+import security_utils
+from cache_utils import LRUCache, MISSING
+
+# لایه دسترسی async به جدول bot_users برای ربات تلگرام.
+# کوئری‌های مسدودکننده MySQL و هش کردن پسورد (که عمداً کند است) در استخرهای رشته جداگانه
+# و محدود اجرا می‌شوند تا حلقه رویداد تلگرام هرگز منتظر آن‌ها نماند.
+# استخرها جدا هستند تا چند لاگین همزمان (هش کند) جلوی کوئری‌های سریع را نگیرند.
+
+_db_executor = ThreadPoolExecutor(
+    max_workers=config.TELEGRAM_BOT.get("DB_WORKERS", 4), thread_name_prefix="BotDB")
+_hash_executor = ThreadPoolExecutor(
+    max_workers=config.TELEGRAM_BOT.get("HASH_WORKERS", 2), thread_name_prefix="BotHash")
+
+# کش LRU جستجوهای bot_users (شامل نتایج منفی). با ثبت نام کاربر جدید باطل می‌شود.
+_users = LRUCache(
+    maxsize=config.TELEGRAM_BOT.get("USER_CACHE_SIZE", 1024),
+    ttl_seconds=config.TELEGRAM_BOT.get("USER_CACHE_TTL_SECONDS", 300))
+
+
+async def run_db(func, *args, **kwargs):
+    """یک تابع مسدودکننده دیتابیس را در استخر رشته دیتابیس اجرا می‌کند."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_hash(func, *args, **kwargs):
+    """یک تابع کند رمزنگاری را در استخر رشته هش اجرا می‌کند."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, functools.partial(func, *args, **kwargs))
+
+
+# --- رمزنگاری ---
+
+async def hash_password(plain_password):
+    return await run_hash(security_utils.hash_password, plain_password)
+
+
+async def check_password(plain_password, hashed_password):
+    return await run_hash(security_utils.check_password, plain_password, hashed_password)
+
+
+# --- جدول bot_users ---
+
+async def _cached_lookup(cache_key, query, params):
+    user = _users.get(cache_key)
+    if user is MISSING:
+        user = await run_db(db_utils.query_db, query, params, fetch='one')
+        # خطای دیتابیس (None) با "کاربر وجود ندارد" یکی است؛ فقط برای مدت کوتاه کش می‌شود
+        _users.set(cache_key, user, ttl_seconds=None if user else config.TELEGRAM_BOT.get("USER_NEGATIVE_CACHE_SECONDS", 30))
+    return user
+
+
+async def get_user_by_telegram_id(telegram_user_id):
+    return await _cached_lookup(
+        ("telegram_user_id", telegram_user_id),
+        "SELECT id, username, is_admin FROM bot_users WHERE telegram_user_id = %s", (telegram_user_id,))
+
+
+async def get_user_by_username(username):
+    return await _cached_lookup(
+        ("username", username),
+        "SELECT id, hashed_password, is_admin FROM bot_users WHERE username = %s", (username,))
+
+
+async def count_users():
+    row = await run_db(db_utils.query_db, "SELECT COUNT(*) as count FROM bot_users", fetch='one')
+    return row['count'] if row else None
+
+
+async def create_user(telegram_user_id, username, hashed_password, is_admin):
+    try:
+        return await run_db(
+            db_utils.query_db,
+            "INSERT INTO bot_users (telegram_user_id, username, hashed_password, is_admin) VALUES (%s, %s, %s, %s)",
+            (telegram_user_id, username, hashed_password, is_admin)
+        )
+    finally:
+        # نتایج منفی کش شده برای این کاربر دیگر معتبر نیستند
+        _users.invalidate(("telegram_user_id", telegram_user_id), ("username", username))
@@ -3,13 +3,28 @@ import requests
 import json
 import logging
 import math
+import time
 import config
-from decimal import Decimal
+import metrics
+from decimal import Decimal, InvalidOperation
 
 # دیکشنری برای ذخیره قوانین دقت اعشار
 market_amount_precisions = {}
 market_price_precisions = {}
 
+def _timed_request(endpoint, method, url, **kwargs):
+    """
+    یک درخواست HTTP به والکس ارسال می‌کند و زمان آن را بر اساس endpoint و کد وضعیت ثبت می‌کند.
+    """
+    started = time.perf_counter()
+    status = "error"
+    try:
+        response = requests.request(method, url, **kwargs)
+        status = str(response.status_code)
+        return response
+    finally:
+        metrics.WALLEX_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, status=status)
+
 def load_market_precisions():
     """
     قوانین دقت اعشار (amount_precision و price_precision) را از والکس بارگذاری می‌کند.
@@ -18,7 +33,7 @@ def load_market_precisions():
     logging.info("در حال بارگذاری قوانین دقت اعشار بازارها از والکس...")
     url = config.WALLEX_API["BASE_URL"] + config.WALLEX_API["ENDPOINTS"]["ALL_MARKETS"]
     try:
-        response = requests.get(url, timeout=10)
+        response = _timed_request("markets", "GET", url, timeout=10)
         if response.status_code == 200:
             markets = response.json().get("result", {}).get("markets", [])
             for market in markets:
@@ -42,6 +57,35 @@ def load_market_precisions():
         logging.error(f"خطا در ارتباط برای دریافت قوانین بازار: {e}")
         return False
 
+def get_market_quotes():
+    """
+    بهترین قیمت خرید و فروش (bid/ask) همه بازارها را با یک درخواست دریافت می‌کند.
+    :return: دیکشنری {symbol: (bid, ask)} یا None در صورت خطا
+    """
+    url = config.WALLEX_API["BASE_URL"] + config.WALLEX_API["ENDPOINTS"]["MARKET_STATS"]
+    try:
+        response = _timed_request("market_stats", "GET", url, timeout=10)
+        if response.status_code != 200:
+            logging.warning(f"خطا در دریافت قیمت بازارها. وضعیت: {response.status_code}")
+            return None
+        symbols = response.json().get("result", {}).get("symbols", {})
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.error(f"خطا در ارتباط برای دریافت قیمت بازارها: {e}")
+        return None
+
+    quotes = {}
+    for symbol, market in symbols.items():
+        stats = market.get("stats") or {}
+        try:
+            bid = Decimal(str(stats.get("bidPrice")))
+            ask = Decimal(str(stats.get("askPrice")))
+            # بازار بدون سفارش (یا غیرفعال) قیمت معتبری ندارد
+            if bid > 0 and ask > 0:
+                quotes[symbol] = (bid, ask)
+        except InvalidOperation:
+            continue
+    return quotes
+
 def format_quantity(quantity, precision):
     """
     مقدار (Quantity) را بر اساس دقت اعشار مجاز بازار، به پایین گرد می‌کند (Floor).
@@ -77,7 +121,7 @@ def place_wallex_order(symbol, price, quantity, side):
     logging.info(f"در حال ثبت سفارش: {side.upper()} {quantity} {symbol} @ {price}")
     
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=15)
+        response = _timed_request("place_order", "POST", url, headers=headers, data=json.dumps(payload), timeout=15)
         response_data = response.json()
         
         # 201 Created
@@ -100,7 +144,7 @@ def get_wallex_order_status(client_order_id):
     headers = {"x-api-key": config.WALLEX_API["API_KEY"]}
     
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = _timed_request("get_order", "GET", url, headers=headers, timeout=10)
         response_data = response.json()
         
         if response.status_code == 200 and response_data.get("success"):
@@ -122,7 +166,7 @@ def cancel_wallex_order(client_order_id):
     
     logging.info(f"در حال تلاش برای لغو سفارش {client_order_id} در والکس...")
     try:
-        response = requests.delete(url, headers=headers, data=json.dumps(payload), timeout=15)
+        response = _timed_request("cancel_order", "DELETE", url, headers=headers, data=json.dumps(payload), timeout=15)
         response_data = response.json()
 
         if response.status_code == 200 and response_data.get("success"):